@@ -0,0 +1,192 @@
+"""Scaling benchmark of the main.py stages on synthetic fills
+
+Usage: python benchmarks/bench_pipeline.py --sizes 100000 1000000 10000000
+       python benchmarks/bench_pipeline.py --sizes 100000 --compare baseline.json
+
+Each size runs in a fresh worker process so peak memory is not inherited
+from a previous size. Per stage it records wall time, CPU time, the peak RSS
+increase over the stage's starting RSS and the rows it produced, and writes
+everything to a JSON file for regression comparison.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import FillConfig, write_dataset
+from src.instrumentation import RssSampler, current_rss, row_count
+
+def pipeline_stages(trader_path, sentiment_path):
+    """The in-memory main.py flow as (name, function of the shared state)"""
+    from src.data_loader import DataLoader
+    from src.preprocessor import DataPreprocessor
+    from src.analyzer import TradingAnalyzer
+    from src.visualizer import DataVisualizer
+    from main import describe_merged, generate_summary_report
+
+    loader = DataLoader(trader_path, sentiment_path, cache_dir=None)
+    preprocessor = DataPreprocessor()
+    analyzer = TradingAnalyzer()
+
+    def merge(state):
+        return preprocessor.merge_datasets(state['load_trader_data'], state['load_sentiment_data'])
+
+    def report(state):
+        generate_summary_report(
+            describe_merged(state['merge_datasets']), state['cluster_traders'],
+            state['sentiment_performance_analysis'], state['statistical_tests']
+        )
+
+    return [
+        ('load_trader_data', lambda state: loader.load_trader_data()),
+        ('load_sentiment_data', lambda state: loader.load_sentiment_data()),
+        ('merge_datasets', merge),
+        ('save_merged', lambda state: loader.save_merged(state['merge_datasets'])),
+        ('calculate_trader_metrics', lambda state: analyzer.calculate_trader_metrics(state['merge_datasets'])),
+        ('sentiment_performance_analysis', lambda state: analyzer.sentiment_performance_analysis(state['merge_datasets'])),
+        ('correlation_analysis', lambda state: analyzer.correlation_analysis(state['merge_datasets'])),
+        ('statistical_tests', lambda state: analyzer.statistical_tests(state['merge_datasets'])),
+        ('cluster_traders', lambda state: analyzer.cluster_traders(state['calculate_trader_metrics'].copy())),
+        ('generate_all_visualizations', lambda state: DataVisualizer().generate_all_visualizations(
+            state['merge_datasets'], state['cluster_traders'], state['correlation_analysis'])),
+        ('generate_summary_report', report)
+    ]
+
+def run_size(rows, data_dir, seed):
+    """Generate (or reuse) the dataset for ``rows`` and time every stage"""
+    config = FillConfig(rows=rows, seed=seed)
+    dataset_dir = os.path.join(data_dir, f"fills-{rows}-seed{seed}")
+    trader_path = os.path.join(dataset_dir, 'historical_data.csv')
+    sentiment_path = os.path.join(dataset_dir, 'fear_greed_index.csv')
+    if not (os.path.exists(trader_path) and os.path.exists(sentiment_path)):
+        write_dataset(config, dataset_dir)
+
+    state, stages = {}, []
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    os.chdir(workdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, func in pipeline_stages(trader_path, sentiment_path):
+            wall, cpu = time.perf_counter(), time.process_time()
+            with RssSampler() as rss:
+                state[name] = func(state)
+            stages.append({
+                'stage': name,
+                'wall_s': round(time.perf_counter() - wall, 4),
+                'cpu_s': round(time.process_time() - cpu, 4),
+                'peak_rss_delta_mb': round((rss.peak - rss.start) / 2**20, 1),
+                'rows': row_count(state[name])
+            })
+
+    return {
+        'rows': rows,
+        'dataset': config.as_dict(),
+        'input_mb': round(os.path.getsize(trader_path) / 2**20, 1),
+        'peak_rss_mb': round(current_rss() / 2**20, 1),
+        'total_wall_s': round(sum(s['wall_s'] for s in stages), 4),
+        'stages': stages
+    }
+
+def environment():
+    import numpy as np
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare(results, baseline_path, tolerance, min_seconds=0.05):
+    """Print per-stage wall-time ratios against a baseline; return regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {
+        (run['rows'], stage['stage']): stage['wall_s']
+        for run in baseline['results'] if 'stages' in run for stage in run['stages']
+    }
+
+    rows, regressions = [], []
+    for run in results:
+        for stage in run.get('stages', []):
+            old = before.get((run['rows'], stage['stage']))
+            if old is None:
+                continue
+            ratio = stage['wall_s'] / old if old else float('inf')
+            rows.append({'rows': run['rows'], 'stage': stage['stage'],
+                         'baseline_s': old, 'current_s': stage['wall_s'], 'ratio': round(ratio, 2)})
+            if ratio > tolerance and stage['wall_s'] - old > min_seconds:
+                regressions.append(rows[-1])
+
+    if rows:
+        print(pd.DataFrame(rows).to_markdown(index=False))
+    for r in regressions:
+        print(f"REGRESSION: {r['stage']} at {r['rows']:,} rows is {r['ratio']}x the baseline")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(REPO_ROOT, 'data', 'synthetic'),
+                        help="Where generated datasets are kept between runs")
+    parser.add_argument('--out', default=None, help="JSON results path (default: benchmarks/results/)")
+    parser.add_argument('--compare', metavar='BASELINE', help="Fail on stages slower than a previous results file")
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_size(args.worker, os.path.abspath(args.data_dir), args.seed)
+        with open(args.result_path, 'w') as f:
+            json.dump(result, f)
+        return
+
+    results = []
+    for rows in args.sizes:
+        print(f"Benchmarking {rows:,} rows...")
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            result_path = tmp.name
+        proc = subprocess.run([
+            sys.executable, os.path.abspath(__file__), '--worker', str(rows),
+            '--seed', str(args.seed), '--data-dir', os.path.abspath(args.data_dir),
+            '--result-path', result_path
+        ])
+        if proc.returncode == 0:
+            with open(result_path) as f:
+                result = json.load(f)
+            print(pd.DataFrame(result['stages']).astype({'rows': 'Int64'}).to_markdown(index=False))
+        else:
+            # e.g. killed by the OOM killer at the largest size
+            result = {'rows': rows, 'error': f"worker exited with code {proc.returncode}"}
+            print(result['error'])
+        os.remove(result_path)
+        results.append(result)
+
+    out = args.out or os.path.join(REPO_ROOT, 'benchmarks', 'results', f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Startup-time benchmark: import cost of main.py and the src modules
+
+Usage: python benchmarks/bench_startup.py --repeat 5
+       python benchmarks/bench_startup.py --compare baseline.json
+
+Every measurement runs in a fresh interpreter under ``-X importtime``.
+Per target it records the median wall time and the cumulative import time
+of each top-level package (numpy, pandas, scipy, ...), and it runs
+``main.py --metrics-only`` on a small synthetic dataset to check that no
+plotting or ML library is imported on that path, and a full run with
+``--clusters auto --refit-clusters`` to check that the libraries deferred
+to the clustering path still import where they're used. Results are
+written as JSON for regression comparison.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import FillConfig, write_dataset
+from bench_pipeline import environment
+
+TARGETS = ['main', 'src.analyzer', 'src.visualizer', 'src.service', 'src.data_loader', 'src.preprocessor']
+# Libraries a metrics-only run must never import
+HEAVY_PACKAGES = ['scipy', 'sklearn', 'matplotlib', 'seaborn']
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def parse_importtime(stderr):
+    """(module, self us, cumulative us, depth) for each ``-X importtime`` line"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            rows.append((module, int(own), int(cumulative), len(indent) // 2))
+    return rows
+
+def package_breakdown(rows):
+    """Cumulative import time per top-level package, in milliseconds
+
+    ``-X importtime`` lists a module after everything it imports, so the
+    lines are walked in reverse to see each module's importers first. A
+    module only counts if none of its importers is in the same package,
+    so submodules aren't added on top of the package that pulled them in.
+    """
+    totals, importers = {}, []
+    for module, _, cumulative, depth in reversed(rows):
+        package = module.split('.')[0]
+        del importers[depth:]
+        if package not in importers:
+            totals[package] = totals.get(package, 0) + cumulative / 1000
+        importers.append(package)
+    return totals
+
+def time_import(target, repeat):
+    """Median wall time of a fresh ``import target`` and the package breakdown of one run"""
+    walls, rows = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {target}"],
+                              cwd=REPO_ROOT, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {target} failed:\n{proc.stderr[-2000:]}")
+        rows = parse_importtime(proc.stderr)
+    return {
+        'target': target,
+        'wall_s': round(statistics.median(walls), 4),
+        'modules': len(rows),
+        'packages_ms': {k: round(v, 1) for k, v in sorted(package_breakdown(rows).items(), key=lambda kv: -kv[1])}
+    }
+
+def synthetic_workdir(rows, data_dir, seed=0):
+    """Fresh working directory whose data/raw links to a cached synthetic dataset"""
+    dataset_dir = os.path.join(data_dir, f"fills-{rows}-seed{seed}")
+    if not os.path.exists(os.path.join(dataset_dir, 'historical_data.csv')):
+        write_dataset(FillConfig(rows=rows, seed=seed), dataset_dir)
+
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    os.makedirs(os.path.join(workdir, 'data', 'raw'))
+    for name in ('historical_data.csv', 'fear_greed_index.csv'):
+        os.symlink(os.path.join(dataset_dir, name), os.path.join(workdir, 'data', 'raw', name))
+    return workdir
+
+def metrics_only_run(rows, data_dir, seed=0):
+    """Run ``main.py --metrics-only`` on synthetic fills; wall time and heavy imports seen"""
+    workdir = synthetic_workdir(rows, data_dir, seed)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(REPO_ROOT, 'main.py'),
+                           '--metrics-only', '--no-cache'], cwd=workdir, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0 or not os.path.exists(os.path.join(workdir, 'data', 'outputs', 'trader_metrics.csv')):
+        raise RuntimeError(f"metrics-only run failed:\n{proc.stdout[-2000:]}")
+
+    imported = {module.split('.')[0] for module, *_ in parse_importtime(proc.stderr)}
+    return {
+        'rows': rows,
+        'wall_s': round(wall, 4),
+        'heavy_imports': sorted(imported & set(HEAVY_PACKAGES))
+    }
+
+def auto_clusters_run(rows, data_dir, seed=0, resamples=20):
+    """Run ``main.py --clusters auto --refit-clusters`` on synthetic fills; wall time and chosen k
+
+    Raises if the run doesn't save a cluster model, e.g. because a
+    function-level import is missing from the silhouette sweep.
+    """
+    workdir = synthetic_workdir(rows, data_dir, seed)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'main.py'), '--clusters', 'auto',
+                           '--refit-clusters', '--no-cache', '--resamples', str(resamples)],
+                          cwd=workdir, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    model_path = os.path.join(workdir, 'data', 'processed', 'cluster_model.json')
+    if proc.returncode != 0 or not os.path.exists(model_path):
+        raise RuntimeError(f"--clusters auto run failed:\n{proc.stdout[-2000:]}")
+
+    with open(model_path) as f:
+        model = json.load(f)
+    return {
+        'rows': rows,
+        'wall_s': round(wall, 4),
+        'n_clusters': len(model['centroids'])
+    }
+
+def compare(results, baseline_path, tolerance, min_seconds=0.05):
+    """Print import-time ratios against a baseline; return regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {run['target']: run['wall_s'] for run in baseline['imports']}
+
+    rows, regressions = [], []
+    for run in results['imports']:
+        old = before.get(run['target'])
+        if old is None:
+            continue
+        ratio = run['wall_s'] / old if old else float('inf')
+        rows.append({'target': run['target'], 'baseline_s': old, 'current_s': run['wall_s'], 'ratio': round(ratio, 2)})
+        if ratio > tolerance and run['wall_s'] - old > min_seconds:
+            regressions.append(rows[-1])
+
+    if rows:
+        print(pd.DataFrame(rows).to_markdown(index=False))
+    for r in regressions:
+        print(f"REGRESSION: import {r['target']} is {r['ratio']}x the baseline")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--targets', nargs='+', default=TARGETS, help="Modules to import, relative to the repo root")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per target (median is reported)")
+    parser.add_argument('--rows', type=int, default=20_000, help="Synthetic fills for the metrics-only run")
+    parser.add_argument('--data-dir', default=os.path.join(REPO_ROOT, 'data', 'synthetic'),
+                        help="Where generated datasets are kept between runs")
+    parser.add_argument('--out', default=None, help="JSON results path (default: benchmarks/results/)")
+    parser.add_argument('--compare', metavar='BASELINE', help="Fail on imports slower than a previous results file")
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args()
+
+    imports = []
+    for target in args.targets:
+        result = time_import(target, args.repeat)
+        imports.append(result)
+        top = ', '.join(f"{name} {ms:.0f}ms" for name, ms in list(result['packages_ms'].items())[:5])
+        print(f"import {target}: {result['wall_s'] * 1000:.0f}ms wall, {result['modules']} modules ({top})")
+
+    metrics_only = metrics_only_run(args.rows, os.path.abspath(args.data_dir))
+    print(f"main.py --metrics-only on {metrics_only['rows']:,} fills: {metrics_only['wall_s']:.2f}s, "
+          f"heavy imports: {', '.join(metrics_only['heavy_imports']) or 'none'}")
+
+    auto_clusters = auto_clusters_run(args.rows, os.path.abspath(args.data_dir))
+    print(f"main.py --clusters auto on {auto_clusters['rows']:,} fills: {auto_clusters['wall_s']:.2f}s, "
+          f"k = {auto_clusters['n_clusters']}")
+
+    results = {'environment': environment(), 'imports': imports, 'metrics_only': metrics_only,
+               'auto_clusters': auto_clusters}
+    out = args.out or os.path.join(REPO_ROOT, 'benchmarks', 'results', f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+
+    failed = bool(metrics_only['heavy_imports'])
+    if failed:
+        print(f"FAIL: --metrics-only imported {', '.join(metrics_only['heavy_imports'])}")
+    if args.compare and compare(results, args.compare, args.tolerance):
+        failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark IST timestamp parsing: factorized parser vs per-row pandas path
+
+Usage: python benchmarks/bench_timestamp_parsing.py --rows 1000000 --fills-per-minute 20
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.preprocessor import parse_ist_timestamps, IST_FORMAT
+
+def legacy_parse(values):
+    """The original per-row path: full parse, then tz_localize/tz_convert"""
+    parsed = pd.to_datetime(values, dayfirst=True, format=IST_FORMAT)
+    return parsed.dt.tz_localize('Asia/Kolkata').dt.tz_convert('UTC')
+
+def make_timestamps(rows, days, fills_per_minute, seed=0):
+    """Minute-resolution IST strings, repeated in bursts like real fill exports"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01').value // 60_000_000_000
+    active = rng.integers(start, start + days * 1440, max(1, rows // fills_per_minute))
+    minutes = np.sort(rng.choice(active, rows))
+    stamps = pd.to_datetime(minutes * 60_000_000_000)
+    return pd.Series(stamps.strftime(IST_FORMAT))
+
+def best_of(func, values, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(values)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--fills-per-minute', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    values = make_timestamps(args.rows, args.days, args.fills_per_minute)
+    print(f"{args.rows:,} timestamps, {values.nunique():,} distinct")
+
+    legacy_time, expected = best_of(legacy_parse, values, args.repeats)
+    fast_time, result = best_of(parse_ist_timestamps, values, args.repeats)
+
+    if not result.equals(expected):
+        raise AssertionError("Factorized parser disagrees with the legacy path")
+
+    print(f"legacy (to_datetime + tz_convert): {legacy_time:.3f}s")
+    print(f"factorized fixed-offset parser:    {fast_time:.3f}s")
+    print(f"speedup: {legacy_time / fast_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Deterministic synthetic Hyperliquid-style fills and a matching fear/greed series
+
+Usage: python benchmarks/synthetic.py --rows 1000000 --out data/raw
+
+Fills are written in the raw export schema DataLoader/DataPreprocessor expect
+(historical_data.csv), along with fear_greed_index.csv covering the same span.
+The same arguments always produce byte-identical files.
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+TRADER_COLUMNS = [
+    'Account', 'Coin', 'Execution Price', 'Size Tokens', 'Size USD', 'Side',
+    'Timestamp IST', 'Start Position', 'Direction', 'Closed PnL',
+    'Transaction Hash', 'Order ID', 'Crossed', 'Fee', 'Trade ID', 'Timestamp'
+]
+
+MAJOR_COINS = ['BTC', 'ETH', 'SOL', 'HYPE', 'XRP', 'DOGE', 'SUI', 'AVAX', 'LINK', 'kPEPE']
+
+# Fear & Greed bands as they appear in the real index
+SENTIMENT_BANDS = [(24, 'Extreme Fear'), (44, 'Fear'), (54, 'Neutral'), (74, 'Greed'), (100, 'Extreme Greed')]
+
+IST_OFFSET_S = 19_800
+TAKER_FEE = 0.00035
+MAKER_FEE = 0.0001
+
+class FillConfig:
+    """Scale and shape of a synthetic fill export"""
+
+    def __init__(self, rows=100_000, accounts=32, coins=20, start='2023-05-01', days=365,
+                 fills_per_order=4.0, seed=0):
+        if rows <= 0 or accounts <= 0 or coins <= 0 or days <= 0:
+            raise ValueError("rows, accounts, coins and days must be positive")
+        self.rows = rows
+        self.accounts = accounts
+        self.coins = coins
+        self.start = pd.Timestamp(start)
+        self.days = days
+        self.fills_per_order = fills_per_order
+        self.seed = seed
+
+    def as_dict(self):
+        return {
+            'rows': self.rows, 'accounts': self.accounts, 'coins': self.coins,
+            'start': f"{self.start:%Y-%m-%d}", 'days': self.days,
+            'fills_per_order': self.fills_per_order, 'seed': self.seed
+        }
+
+def account_ids(n, rng):
+    """Hex addresses like the real export's Account column"""
+    digits = rng.integers(0, 16, size=(n, 40))
+    return np.array(['0x' + ''.join('0123456789abcdef'[d] for d in row) for row in digits])
+
+def coin_names(n):
+    """Perp tickers first, then spot pairs named by index ('@107')"""
+    names = MAJOR_COINS[:n]
+    return np.array(names + [f"@{100 + i}" for i in range(n - len(names))])
+
+def zipf_weights(n, exponent, rng):
+    """Heavy-tailed activity shares, shuffled so the busiest id is random"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+def price_paths(config, rng):
+    """Daily close per coin as a geometric random walk, shape (coins, days)"""
+    start = np.exp(rng.uniform(np.log(0.01), np.log(60_000), config.coins))
+    start[:min(config.coins, 2)] = [30_000, 2_000][:min(config.coins, 2)]
+    vol = rng.uniform(0.02, 0.08, config.coins)
+    steps = rng.standard_normal((config.coins, config.days)) * vol[:, None]
+    return start[:, None] * np.exp(np.cumsum(steps, axis=1))
+
+def iter_fills(config, chunk_rows=1_000_000):
+    """Yield the fill export as DataFrames of at most ``chunk_rows`` rows
+
+    Fills are generated per order (a burst of partial fills sharing account,
+    coin, side, minute, hash and order id) in time order. Start Position,
+    Direction and Closed PnL follow a running position per account and coin
+    that is carried across chunks, so the stream is internally consistent.
+    """
+    rng = np.random.default_rng(config.seed)
+    accounts = account_ids(config.accounts, rng)
+    coins = coin_names(config.coins)
+    account_w = zipf_weights(config.accounts, 1.1, rng)
+    coin_w = zipf_weights(config.coins, 1.3, rng)
+    prices = price_paths(config, rng)
+
+    # Every account trades a typical lot size (in USD) of its own
+    lot_usd = np.exp(rng.normal(6, 1.5, config.accounts))
+    position = np.zeros(config.accounts * config.coins)
+    start_s = config.start.value // 10**9
+    span_minutes = config.days * 1440
+
+    # Over-draw orders, then trim so the fill total is exactly config.rows
+    n_orders = int(config.rows / config.fills_per_order * 1.1) + 10
+    order_minutes = np.sort(rng.integers(0, span_minutes, n_orders))
+    fills_per = rng.geometric(1 / config.fills_per_order, n_orders)
+    total = np.cumsum(fills_per)
+    n_orders = min(n_orders, int(np.searchsorted(total, config.rows)) + 1)
+    # Trimming keeps the order times spread over the span
+    order_minutes = np.sort(rng.choice(order_minutes, n_orders, replace=False))
+    fills_per = fills_per[:n_orders]
+    fills_per[-1] += config.rows - int(fills_per.sum())
+    # Each chunk takes a consecutive slice of the time-sorted orders
+    order_end = np.cumsum(fills_per)
+
+    order_start = 0
+    trade_id = 10**14
+    order_id = 10**10
+    while order_start < n_orders:
+        emitted = order_end[order_start - 1] if order_start else 0
+        order_stop = max(order_start + 1, int(np.searchsorted(order_end, emitted + chunk_rows, side='right')))
+        bursts = fills_per[order_start:order_stop]
+        minutes = order_minutes[order_start:order_stop]
+        k = len(bursts)
+
+        # Per-order attributes, expanded to fills
+        acct = rng.choice(config.accounts, k, p=account_w)
+        coin = rng.choice(config.coins, k, p=coin_w)
+        buy = rng.random(k) < 0.5
+        crossed = rng.random(k) < 0.6
+        hashes = np.array(['0x' + h.hex() for h in np.frombuffer(rng.bytes(32 * k), dtype='S32')])
+
+        repeat = lambda values: np.repeat(values, bursts)
+        n = int(bursts.sum())
+        f_acct, f_coin, f_buy, f_crossed = repeat(acct), repeat(coin), repeat(buy), repeat(crossed)
+        f_minute = repeat(minutes)
+        f_day = f_minute // 1440
+        # Partial fills of one order share its timestamp
+        seconds = start_s + f_minute * 60 + repeat(rng.integers(0, 60, k))
+
+        price = prices[f_coin, f_day] * np.exp(rng.normal(0, 0.002, n))
+        notional = lot_usd[f_acct] * rng.lognormal(0, 0.8, n) / repeat(bursts.astype(float))
+        size = np.round(notional / price, 6)
+        size = np.where(size > 0, size, 1e-6)
+        signed = np.where(f_buy, size, -size)
+
+        # Running position per account x coin: a segmented cumsum over a
+        # stable sort, so fills keep their time order within each key
+        key = f_acct * config.coins + f_coin
+        order = np.argsort(key, kind='stable')
+        sorted_key = key[order]
+        cum = np.cumsum(signed[order])
+        seg_first = np.r_[True, sorted_key[1:] != sorted_key[:-1]]
+        seg_last = np.r_[sorted_key[1:] != sorted_key[:-1], True]
+        seg_start = np.maximum.accumulate(np.where(seg_first, np.arange(n), 0))
+        before = np.where(seg_start > 0, cum[seg_start - 1], 0.0)
+        sorted_after = cum - before + position[sorted_key]
+        position[sorted_key[seg_last]] = sorted_after[seg_last]
+        after = np.empty(n)
+        after[order] = sorted_after
+        start_pos = after - signed
+        # Cumsum round-off leaves dust where a position was fully closed
+        start_pos[np.abs(start_pos) < 1e-9] = 0.0
+
+        direction, closed_qty = fill_direction(start_pos, signed)
+        entry_drift = rng.standard_t(3, n) * 0.03
+        closed_pnl = np.round(closed_qty * price * entry_drift, 6) + 0.0
+        fee_rate = np.where(f_crossed, TAKER_FEE, MAKER_FEE)
+        size_usd = np.round(size * price, 2)
+
+        ts_ms = seconds * 1000
+        ist = pd.to_datetime(seconds + IST_OFFSET_S, unit='s')
+        minute_codes, minute_uniques = pd.factorize(ist.floor('min'))
+        ist_strings = np.asarray(minute_uniques.strftime('%d-%m-%Y %H:%M'))[minute_codes]
+
+        yield pd.DataFrame({
+            'Account': accounts[f_acct],
+            'Coin': coins[f_coin],
+            'Execution Price': np.round(price, 6),
+            'Size Tokens': size,
+            'Size USD': size_usd,
+            'Side': np.where(f_buy, 'BUY', 'SELL'),
+            'Timestamp IST': ist_strings,
+            'Start Position': np.round(start_pos, 6) + 0.0,
+            'Direction': direction,
+            'Closed PnL': closed_pnl,
+            'Transaction Hash': repeat(hashes),
+            'Order ID': order_id + repeat(np.arange(k)),
+            'Crossed': f_crossed,
+            'Fee': np.round(size_usd * fee_rate, 6),
+            'Trade ID': (trade_id + np.arange(n)).astype('float64'),
+            'Timestamp': ts_ms.astype('float64')
+        }, columns=TRADER_COLUMNS)
+
+        trade_id += n
+        order_id += k
+        order_start = order_stop
+
+def fill_direction(start_pos, signed):
+    """Direction label and closed quantity of each fill given its start position"""
+    closing = (start_pos != 0) & (np.sign(start_pos) != np.sign(signed))
+    closed_qty = np.where(closing, np.minimum(np.abs(signed), np.abs(start_pos)), 0.0)
+    flips = closing & (np.abs(signed) > np.abs(start_pos))
+    long_side = signed > 0
+
+    direction = np.where(long_side, 'Open Long', 'Open Short')
+    direction = np.where(closing & long_side, 'Close Short', direction)
+    direction = np.where(closing & ~long_side, 'Close Long', direction)
+    direction = np.where(flips & long_side, 'Short > Long', direction)
+    direction = np.where(flips & ~long_side, 'Long > Short', direction)
+    return direction, closed_qty
+
+def sentiment_series(start, days, seed=0, lead_days=365, tail_days=30):
+    """Daily fear/greed readings covering ``days`` from ``start`` with margins
+
+    The value is a bounded, mean-reverting random walk, so regimes persist
+    for days to weeks like the real index. Timestamps are IST midnights.
+    """
+    rng = np.random.default_rng(seed + 1)
+    first = pd.Timestamp(start) - pd.Timedelta(days=lead_days)
+    n = lead_days + days + tail_days
+
+    value = np.empty(n)
+    value[0] = 50
+    shocks = rng.normal(0, 6, n)
+    for i in range(1, n):
+        value[i] = value[i - 1] + 0.08 * (50 - value[i - 1]) + shocks[i]
+    value = np.clip(np.round(value), 5, 95).astype(int)
+
+    bounds = np.array([upper for upper, _ in SENTIMENT_BANDS])
+    labels = np.array([label for _, label in SENTIMENT_BANDS])
+    dates = pd.date_range(first, periods=n, freq='D')
+    return pd.DataFrame({
+        'timestamp': dates.asi8 // 10**9 - IST_OFFSET_S,
+        'value': value,
+        'classification': labels[np.searchsorted(bounds, value)],
+        'date': dates.strftime('%Y-%m-%d')
+    })
+
+def write_dataset(config, out_dir, chunk_rows=1_000_000):
+    """Write historical_data.csv and fear_greed_index.csv to ``out_dir``
+
+    Returns the trader and sentiment paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    trader_path = os.path.join(out_dir, 'historical_data.csv')
+    sentiment_path = os.path.join(out_dir, 'fear_greed_index.csv')
+
+    tmp_path = f"{trader_path}.tmp"
+    for i, chunk in enumerate(iter_fills(config, chunk_rows)):
+        chunk.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    os.replace(tmp_path, trader_path)
+
+    sentiment_series(config.start, config.days, config.seed).to_csv(sentiment_path, index=False)
+    return trader_path, sentiment_path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--accounts', type=int, default=32)
+    parser.add_argument('--coins', type=int, default=20)
+    parser.add_argument('--start', default='2023-05-01')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--fills-per-order', type=float, default=4.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='data/raw')
+    args = parser.parse_args()
+
+    config = FillConfig(args.rows, args.accounts, args.coins, args.start, args.days,
+                        args.fills_per_order, args.seed)
+    trader_path, sentiment_path = write_dataset(config, args.out)
+    print(f"Wrote {config.rows:,} fills to {trader_path}")
+    print(f"Wrote sentiment series to {sentiment_path}")
+
+if __name__ == "__main__":
+    main()
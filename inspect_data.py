@@ -1,72 +1,104 @@
+import time
+import argparse
 import pandas as pd
-import numpy as np
+from src.profiler import profile_trader_data, write_schema, SCHEMA_PATH, SAMPLE_SIZE, PROFILE_CHUNKSIZE
 
-def inspect_data():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the raw trader and sentiment data in one streaming pass")
+    parser.add_argument('--trader-data', default='data/raw/historical_data.csv', help="Trader fills CSV")
+    parser.add_argument('--sentiment-data', default='data/raw/fear_greed_index.csv', help="Fear/greed index CSV")
+    parser.add_argument('--chunksize', type=int, default=PROFILE_CHUNKSIZE, help="Rows parsed per chunk")
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE, help="Rows kept in the uniform sample")
+    parser.add_argument(
+        '--schema-out', default=SCHEMA_PATH,
+        help="Where to write the profile; pass it to main.py --schema to reuse the dtypes"
+    )
+    return parser.parse_args(argv)
+
+def inspect_data(argv=None):
+    args = parse_args(argv)
     print("=== DATA INSPECTION ===\n")
     
     print("TRADER DATA:")
     print("-" * 40)
+    report = None
     try:
-        trader_data = pd.read_csv('data/raw/historical_trader_data.csv')
-        print(f"Shape: {trader_data.shape}")
-        print(f"Columns: {list(trader_data.columns)}")
-        print(f"Data types:\n{trader_data.dtypes}")
-        print(f"\nFirst 3 rows:")
-        print(trader_data.head(3))
-        print(f"\nSample of numeric columns:")
-        numeric_cols = trader_data.select_dtypes(include=[np.number]).columns
-        if len(numeric_cols) > 0:
-            print(trader_data[numeric_cols].describe())
+        start = time.perf_counter()
+        profile, report = profile_trader_data(
+            args.trader_data, args.sentiment_data, chunksize=args.chunksize, sample_size=args.sample_size
+        )
+        print(f"Profiled {report['rows']:,} rows in {time.perf_counter() - start:.2f}s")
+        print(f"Columns: {list(report['columns'])}")
+        
+        columns = pd.DataFrame(report['columns']).T
+        print(f"\nColumn summary (quantiles are approximate, within 1%):")
+        print(columns[[c for c in ('dtype', 'count', 'nulls', 'distinct') if c in columns.columns]].fillna('').to_markdown())
+        
+        numeric = {name: col for name, col in report['columns'].items() if 'quantiles' in col}
+        if numeric:
+            print(f"\nNumeric columns:")
+            print(pd.DataFrame({
+                name: {'min': col['min'], **col['quantiles'], 'max': col['max'], 'mean': col['mean']}
+                for name, col in numeric.items()
+            }).T.to_markdown(floatfmt='.4g'))
+        
+        print(f"\nFirst 3 sampled rows:")
+        print(profile.sample.frame().head(3))
         
         # Check for PnL column variations
-        pnl_columns = [col for col in trader_data.columns if 'pnl' in col.lower() or 'profit' in col.lower()]
+        pnl_columns = [col for col in report['columns'] if 'pnl' in col.lower() or 'profit' in col.lower()]
         print(f"\nPossible PnL columns: {pnl_columns}")
         
         # Check for timestamp columns
-        time_columns = [col for col in trader_data.columns if 'time' in col.lower() or 'date' in col.lower()]
+        time_columns = [col for col in report['columns'] if 'time' in col.lower() or 'date' in col.lower()]
         print(f"Time-related columns: {time_columns}")
-        
-    except FileNotFoundError:
-        print("Trader data file not found. Please ensure the file is in data/raw/historical_trader_data.csv")
+    
+    except FileNotFoundError as e:
+        print(f"Data file not found: {e.filename}. Please ensure the files are in data/raw/")
     except Exception as e:
-        print(f"Error loading trader data: {e}")
+        print(f"Error profiling trader data: {e}")
     
     print("\n" + "="*60 + "\n")
     
-    # Load and inspect sentiment data
+    # The sentiment index is one row per day, small enough to read whole
     print("SENTIMENT DATA:")
     print("-" * 40)
     try:
-        sentiment_data = pd.read_csv('data/raw/fear_greed_index.csv')
+        sentiment_data = pd.read_csv(args.sentiment_data)
         print(f"Shape: {sentiment_data.shape}")
         print(f"Columns: {list(sentiment_data.columns)}")
         print(f"Data types:\n{sentiment_data.dtypes}")
-        print(f"\nFirst 3 rows:")
-        print(sentiment_data.head(3))
         
         classification_cols = [col for col in sentiment_data.columns if 'class' in col.lower() or 'sentiment' in col.lower()]
-        print(f"\nPossible classification columns: {classification_cols}")
-        
         if len(classification_cols) > 0:
             main_class_col = classification_cols[0]
             print(f"\nUnique values in {main_class_col}:")
             print(sentiment_data[main_class_col].value_counts())
         
-        # Check for date columns
-        date_columns = [col for col in sentiment_data.columns if 'date' in col.lower() or 'time' in col.lower()]
-        print(f"Date-related columns: {date_columns}")
-        
+        coverage = (report or {}).get('coverage')
+        if coverage:
+            print(f"\nTrades: {coverage['trade_start']} to {coverage['trade_end']} ({coverage['trade_days']} days)")
+            print(f"Sentiment: {coverage['sentiment_start']} to {coverage['sentiment_end']}")
+            print(f"Fills with a sentiment reading: {coverage['matched_fill_share']:.2%}")
+            if coverage['trade_days_without_sentiment']:
+                print(f"Trade days without sentiment: {coverage['trade_days_without_sentiment']} "
+                      f"({coverage['fills_without_sentiment']:,} fills), e.g. {', '.join(coverage['missing_days'][:5])}")
+    
     except FileNotFoundError:
-        print("Sentiment data file not found. Please ensure the file is in data/raw/fear_greed_index.csv")
+        print(f"Sentiment data file not found. Please ensure the file is in {args.sentiment_data}")
     except Exception as e:
         print(f"Error loading sentiment data: {e}")
     
+    if report is not None:
+        write_schema(report, args.schema_out)
+        print(f"\nProfile and dtype schema written to {args.schema_out}")
+    
     print("\n" + "="*60 + "\n")
     print("RECOMMENDATIONS:")
     print("1. Check if column names match what the code expects")
-    print("2. Verify date formats are consistent between datasets") 
+    print("2. Verify date formats are consistent between datasets")
     print("3. Ensure PnL and classification columns are properly named")
-    print("4. Run this inspection before running main.py")
+    print(f"4. Run main.py --schema {args.schema_out} to parse with the profiled dtypes")
 
 if __name__ == "__main__":
-    inspect_data()
\ No newline at end of file
+    inspect_data()
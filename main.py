@@ -1,102 +1,655 @@
 import sys
 import os
+import glob
+import argparse
+import numpy as np
 import pandas as pd
-from src.data_loader import DataLoader
-from src.preprocessor import DataPreprocessor
+from src.data_loader import DataLoader, DEFAULT_CHUNKSIZE, load_schema
+from src.preprocessor import DataPreprocessor, SentimentLookup, DERIVED_COLUMNS, NS_PER_DAY, compact_dtypes
 from src.analyzer import TradingAnalyzer
-from src.visualizer import DataVisualizer
+from src.visualizer import DataVisualizer, DENSITY_THRESHOLD
+from src.aggregates import MergedAggregates, TraderMetricsState
+from src.cube import CUBE_PATH
+from src.store import STORE_PATH
+from src.event_study import EVENT_WINDOW
+from src.resampling import RESAMPLES
+from src.partitions import process_partitions
+from src.pipeline import Pipeline, file_fingerprint, source_fingerprint
+from src.instrumentation import tracer, peak_rss, worker_peak_rss
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bitcoin Trading Analysis Project")
+    parser.add_argument(
+        '--trader-data', default='data/raw/historical_data.csv',
+        help="Trader fills: a CSV file, a directory of CSV partitions or a glob pattern"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="Worker processes for partitioned input (default: all cores) and resampling tests (default: one)"
+    )
+    parser.add_argument(
+        '--chunksize', type=int, default=None,
+        help="Stream trader data in chunks of this many rows to bound memory use"
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Only update trader metrics from fills appended since the last incremental run"
+    )
+    parser.add_argument(
+        '--metrics-only', action='store_true',
+        help="Only load, merge and compute trader metrics; plotting, statistics and "
+             "clustering libraries are never imported"
+    )
+    parser.add_argument(
+        '--schema', metavar='PATH',
+        help="Parse trader data with the dtypes profiled by inspect_data.py "
+             "(e.g. data/processed/trader_schema.json)"
+    )
+    parser.add_argument(
+        '--csv', action='store_true',
+        help="Write merged data as CSV instead of appending it to the partitioned Parquet store"
+    )
+    parser.add_argument(
+        '--rebuild-store', action='store_true',
+        help="Rewrite the merged store from scratch instead of appending new days"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Always re-parse the raw CSVs instead of using the columnar cache"
+    )
+    parser.add_argument(
+        '--rerun', action='store_true',
+        help="Ignore memoized stage outputs and recompute every stage"
+    )
+    parser.add_argument(
+        '--clusters', type=cluster_count, default=3,
+        help="Number of trader clusters, or 'auto' to pick k by silhouette score"
+    )
+    parser.add_argument(
+        '--refit-clusters', action='store_true',
+        help="Refit the saved cluster model instead of assigning traders to it"
+    )
+    parser.add_argument(
+        '--resamples', type=int, default=RESAMPLES,
+        help=f"Bootstrap and permutation resamples per sentiment class and pair of classes (default: {RESAMPLES}); "
+             "the tests' run time grows with fills x resamples"
+    )
+    parser.add_argument(
+        '--event-window', type=int, default=EVENT_WINDOW,
+        help="Days before and after each sentiment regime transition in the event study"
+    )
+    parser.add_argument(
+        '--density-threshold', type=int, default=DENSITY_THRESHOLD,
+        help="Draw the cluster plot as a binned density image above this many traders"
+    )
+    parser.add_argument(
+        '--memory-budget', type=memory_size, default=None, metavar='SIZE',
+        help="Preprocess compactly (in place, raw columns dropped, derived columns on demand) "
+             "and report peak RSS against SIZE, e.g. 2G or 512M"
+    )
+    parser.add_argument(
+        '--trace', nargs='?', const='data/outputs/trace.jsonl', metavar='PATH',
+        help="Record per-operation wall/CPU time, peak RSS delta and rows as JSON lines"
+    )
+    parser.add_argument(
+        '--profile', metavar='OP',
+        help="Run one operation under cProfile, e.g. cluster_traders or stage.merge"
+    )
+    return parser.parse_args(argv)
+
+def cluster_count(value):
+    if value == 'auto':
+        return value
+    try:
+        k = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a positive integer or 'auto', got {value!r}")
+    if k < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer or 'auto', got {value!r}")
+    return k
+
+MEMORY_UNITS = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+def memory_size(value):
+    """Bytes for sizes like '512M', '2G' or '2GB' (binary units)"""
+    number = value.strip().upper().removesuffix('B').removesuffix('I')
+    unit = number[-1:] if number[-1:] in MEMORY_UNITS else ''
+    try:
+        size = float(number[:len(number) - len(unit)]) * MEMORY_UNITS[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size such as 512M or 2G, got {value!r}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"expected a positive size, got {value!r}")
+    return int(size)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("=== Bitcoin Trading Analysis Project ===\n")
     
+    if args.trace or args.profile:
+        tracer.configure(trace_path=args.trace, profile=args.profile)
+    
     try:
         print("Initializing components...")
         loader = DataLoader(
-            trader_data_path='data/raw/historical_data.csv',
-            sentiment_data_path='data/raw/fear_greed_index.csv'
+            trader_data_path=args.trader_data,
+            sentiment_data_path='data/raw/fear_greed_index.csv',
+            cache_dir=None if args.no_cache else 'data/cache',
+            dtypes=load_schema(args.schema) if args.schema else None
         )
-        preprocessor = DataPreprocessor()
+        preprocessor = DataPreprocessor(compact=args.memory_budget is not None)
         analyzer = TradingAnalyzer()
-        visualizer = DataVisualizer()
+        visualizer = DataVisualizer(density_threshold=args.density_threshold)
         
+        if args.incremental:
+            print("\n1-3. Updating trader performance metrics incrementally...")
+            trader_metrics = update_trader_metrics(
+                loader, preprocessor, analyzer,
+                args.chunksize or DEFAULT_CHUNKSIZE,
+                'data/processed/trader_metrics_state'
+            )
+            os.makedirs('data/outputs', exist_ok=True)
+            trader_metrics.to_csv('data/outputs/trader_metrics.csv', index=False)
+            print(f"Analyzed {len(trader_metrics)} unique traders")
+            print("\n=== Incremental Metrics Update Complete! ===")
+            print("Results saved to:")
+            print("- data/outputs/trader_metrics.csv")
+            return
+        
+        pipeline, merged_output = build_pipeline(args, loader, preprocessor, analyzer, visualizer)
+        pipeline.run(['metrics'] if args.metrics_only else None)
+        
+    except Exception as e:
+        print(f"\nError during analysis: {str(e)}")
+        print("\nTroubleshooting tips:")
+        print("- Verify all input files exist in data/raw/")
+        print("- Check that timestamps are formatted correctly")
+        print("- Ensure all required packages are installed (pandas, matplotlib, seaborn)")
+        print("- Try running: pip install --upgrade matplotlib seaborn")
+        return
+    finally:
+        report_trace(args)
+        report_memory(args)
+
+    print("\n=== Analysis Complete! ===")
+    print("Results saved to:")
+    print(f"- {merged_output}")
+    if args.metrics_only:
+        print("- data/outputs/trader_metrics.csv")
+    else:
+        print("- data/outputs/ (visualizations and metrics)")
+
+def report_trace(args):
+    """Print the per-operation timing summary of a traced run"""
+    if not tracer.enabled:
+        return
+    tracer.close()
+    summary = tracer.summary()
+    if args.trace and not summary.empty:
+        print("\nOperation timings (slowest first):")
+        print(summary.to_markdown())
+        print(f"Trace written to {args.trace}")
+
+def report_memory(args):
+    """Print peak RSS of this process and of pool workers against the memory budget"""
+    if args.memory_budget is None:
+        return
+    budget = args.memory_budget
+    peak, workers = peak_rss(), worker_peak_rss()
+    print(f"\nPeak RSS: {peak / 2**20:,.1f} MiB of {budget / 2**20:,.1f} MiB budget ({peak / budget:.0%})")
+    if workers:
+        print(f"Peak RSS of a worker process: {workers / 2**20:,.1f} MiB ({workers / budget:.0%})")
+    if max(peak, workers) > budget:
+        print("Memory budget exceeded; stream the input with --chunksize to bound memory by chunk size")
+
+def build_pipeline(args, loader, preprocessor, analyzer, visualizer):
+    """Declare the analysis steps as memoized pipeline stages
+    
+    Returns the pipeline and the path of the merged output. Stage outputs
+    are memoized under data/cache/stages, so a rerun only recomputes the
+    stages whose parameters, code or upstream inputs changed.
+    """
+    merged_format = 'csv' if args.csv else 'parquet'
+    partitions = loader.trader_partitions()
+    if args.chunksize:
+        mode = 'stream'
+    elif len(partitions) > 1:
+        mode = 'partitioned'
+    else:
+        mode = 'memory'
+    if merged_format == 'parquet':
+        merged_output = f"{STORE_PATH}/"
+    elif mode == 'partitioned':
+        merged_output = 'data/processed/merged_data/'
+    else:
+        merged_output = 'data/processed/merged_data.csv'
+    sources = [file_fingerprint(path) for path in partitions + [loader.sentiment_data_path]]
+    
+    pipeline = Pipeline(
+        memo_dir='data/cache/stages',
+        code_version=source_fingerprint(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', '*.py'))),
+        force=args.rerun
+    )
+    
+    def load(sources):
         print("\n1. Loading data...")
         trader_data, sentiment_data = loader.load_all_data()
         
         if trader_data is None or sentiment_data is None:
             raise ValueError("Failed to load data files. Check file paths and formats.")
+        return trader_data, sentiment_data
+    
+    def merge(*raw, mode, merged_format, compact=False, dtypes=None, chunksize=None, workers=None, sources=None,
+              rebuild_store=False):
+        if mode == 'stream':
+            print(f"\n1-2. Streaming, preprocessing and merging data in chunks of {chunksize:,} rows...")
+            return {'merged_data': None,
+                    'aggregates': stream_merge(loader, preprocessor, chunksize, merged_format, rebuild_store)}
+        if mode == 'partitioned':
+            print(f"\n1-2. Processing {len(partitions)} trader partitions in parallel...")
+            return {'merged_data': None,
+                    'aggregates': parallel_merge(loader, preprocessor, partitions, workers, merged_format, rebuild_store)}
         
+        trader_data, sentiment_data = raw[0]
         print("\n2. Preprocessing and merging data...")
         merged_data = preprocessor.merge_datasets(trader_data, sentiment_data)
         
-        os.makedirs('data/processed', exist_ok=True)
-        merged_data.to_csv('data/processed/merged_data.csv', index=False)
-        print(f"\nMerged data saved. Shape: {merged_data.shape}")
+        if merged_format == 'parquet':
+            store = loader.append_merged(merged_data, rebuild=rebuild_store)
+            report_store(store)
+        else:
+            loader.save_merged(merged_data, fmt=merged_format)
+        print(f"\nMerged data saved to {merged_output}. Shape: {merged_data.shape}")
+        return {'merged_data': merged_data, 'aggregates': None}
+    
+    def merged_to_memo(merged):
+        """Memoize an in-memory merge as a reference to the rows it appended to the store
         
+        The store only appends, so it can hold other days as well; the day
+        range and row count pick out (and check) the merged frame's rows.
+        The store returns rows in partition order, so the memo also keeps
+        each row's rank in account/day order, which restores the merged
+        order (and so seeded resampling results). Merges the store doesn't
+        reproduce are pickled as they are.
+        """
+        merged_data = merged['merged_data']
+        if merged_data is None or merged_format != 'parquet' or merged_data.empty:
+            return merged
+        start, end = int(merged_data['day'].min()), int(merged_data['day'].max())
+        if len(loader.load_merged(STORE_PATH, columns=['day'], start=start, end=end)) != len(merged_data):
+            return merged
+        return {'merged_store': STORE_PATH, 'start': start, 'end': end, 'rows': len(merged_data),
+                'order': np.argsort(account_day_order(merged_data)).astype('int32')}
+    
+    def merged_from_memo(memo):
+        if 'merged_store' not in memo:
+            return memo
+        merged_data = loader.load_merged(memo['merged_store'], start=memo['start'], end=memo['end'])
+        if len(merged_data) != memo['rows']:
+            raise ValueError("Merged store changed since the merge was memoized; rerun with --rerun")
+        merged_data = merged_data.take(account_day_order(merged_data)[memo['order']]).reset_index(drop=True)
+        if preprocessor.compact:
+            # The store holds full-width dtypes; compact them as preprocessing would have
+            merged_data.drop(columns=[col for col in DERIVED_COLUMNS if col in merged_data.columns], inplace=True)
+            compact_dtypes(merged_data)
+        return {'merged_data': merged_data, 'aggregates': None}
+    
+    def overview(merged):
+        if merged['aggregates'] is not None:
+            return merged['aggregates'].overview()
+        return describe_merged(merged['merged_data'])
+    
+    def sentiment_counts(merged):
+        if merged['aggregates'] is not None:
+            return merged['aggregates'].sentiment_moments.counts()
+        if 'Classification' not in merged['merged_data'].columns:
+            return None
+        counts = merged['merged_data']['Classification'].value_counts()
+        return counts[counts > 0]
+    
+    def metrics(merged):
         print("\n3. Calculating trader performance metrics...")
-        trader_metrics = analyzer.calculate_trader_metrics(merged_data)
+        if merged['aggregates'] is not None:
+            aggregates = merged['aggregates']
+            trader_metrics = analyzer.trader_metrics_from_moments(
+                aggregates.account_moments, aggregates.account_quantiles,
+                merged_risk_metrics(loader, analyzer, merged_output, aggregates)
+            )
+        else:
+            trader_metrics = analyzer.calculate_trader_metrics(merged['merged_data'])
         
         os.makedirs('data/outputs', exist_ok=True)
         trader_metrics.to_csv('data/outputs/trader_metrics.csv', index=False)
         print(f"Analyzed {len(trader_metrics)} unique traders")
-        
+        return trader_metrics
+    
+    def positions(merged):
+        print("\n3b. Reconstructing positions and exposure...")
+        if merged['aggregates'] is not None:
+            print("Warning: position reconstruction needs the full merged frame; skipped for streamed or "
+                  "partitioned input, so positions.csv is not written")
+            return None
+        try:
+            book = analyzer.reconstruct_positions(merged['merged_data'])
+        except ValueError as e:
+            print(f"Position reconstruction skipped: {e}")
+            return None
+        summary = book.segments()
+        os.makedirs('data/outputs', exist_ok=True)
+        summary.to_csv('data/outputs/positions.csv', index=False)
+        print(f"Reconstructed {len(book):,} fills into {len(summary):,} account/coin positions")
+        return summary
+    
+    def cube(merged):
+        if merged['aggregates'] is not None:
+            sentiment_cube = merged['aggregates'].cube
+        else:
+            sentiment_cube = analyzer.build_sentiment_cube(merged['merged_data'])
+        sentiment_cube.save(CUBE_PATH)
+        print(f"\nSentiment cube saved to {CUBE_PATH} ({len(sentiment_cube):,} cells)")
+        return sentiment_cube
+    
+    def sentiment(sentiment_cube):
         print("\n4. Analyzing performance by sentiment...")
-        sentiment_performance = analyzer.sentiment_performance_analysis(merged_data)
+        sentiment_performance = analyzer.sentiment_performance_from_cube(sentiment_cube)
         if not sentiment_performance.empty:
             print("\nPerformance by Sentiment:")
             print(sentiment_performance.to_markdown())
         else:
             print("No valid sentiment classification data available")
-        
+        return sentiment_performance
+    
+    def tail_risk(merged):
+        print("\n4b. Estimating tail risk by sentiment...")
+        if merged['aggregates'] is not None:
+            tail_metrics = analyzer.tail_risk_from_quantiles(merged['aggregates'].sentiment_quantiles)
+        else:
+            tail_metrics = analyzer.tail_risk_analysis(merged['merged_data'], 'Classification')
+        if not tail_metrics.empty:
+            print("\nTail Risk by Sentiment:")
+            print(tail_metrics.to_markdown())
+        return tail_metrics
+    
+    def events(sentiment_cube, window, sentiment_source):
+        print(f"\n4c. Studying trading around sentiment regime transitions ({window} days either side)...")
+        sentiment_data = preprocessor.preprocess_sentiment_data(loader.load_sentiment_data())
+        study = analyzer.event_study(sentiment_cube, sentiment_data, window)
+        os.makedirs('data/outputs', exist_ok=True)
+        study['profile'].to_csv('data/outputs/event_study.csv')
+        print(f"{len(study['events']):,} transitions within {window} days of the trade data")
+        if not study['summary'].empty:
+            print("\nBefore vs After Sentiment Transitions:")
+            print(study['summary'].filter(EVENT_SUMMARY_COLUMNS).round(4).to_markdown())
+        return study
+    
+    def correlation(merged):
         print("\n5. Performing correlation analysis...")
-        correlation_matrix = analyzer.correlation_analysis(merged_data)
-        if correlation_matrix is not None:
+        if merged['aggregates'] is not None:
+            moments = merged['aggregates'].correlation_moments
+        else:
+            moments = analyzer.correlation_moments(merged['merged_data'])
+        correlation_matrix = analyzer.correlation_from_moments(moments)
+        if not correlation_matrix.empty:
             print("\nTop Correlations:")
             print(correlation_matrix.unstack().sort_values(ascending=False).drop_duplicates().head(10))
-        
+        return {'matrix': correlation_matrix, 'by_sentiment': analyzer.sentiment_correlations(moments)}
+    
+    def tests(merged, n_resamples, workers):
         print("\n6. Running statistical tests...")
-        test_results = analyzer.statistical_tests(merged_data)
+        if merged['aggregates'] is not None:
+            print("Warning: Kruskal-Wallis and the bootstrap/permutation tests need the individual fills; "
+                  "streamed and partitioned input only gets the t-test and ANOVA")
+            test_results = analyzer.statistical_tests_from_moments(merged['aggregates'].sentiment_moments)
+        else:
+            test_results = analyzer.statistical_tests(merged['merged_data'], n_resamples, workers)
         if test_results:
             print("\nStatistical Test Results:")
             for test, result in test_results.items():
-                print(f"{test}: {result}")
-        
+                print(f"{test}: {format_test_result(result)}")
+        return test_results
+    
+    def clustering(trader_metrics, n_clusters, model_path, refit):
         print("\n7. Clustering traders...")
-        trader_metrics = analyzer.cluster_traders(trader_metrics)
-        if 'cluster' in trader_metrics.columns:
-            print(f"Created {trader_metrics['cluster'].nunique()} trader clusters")
-        
+        try:
+            trader_metrics = analyzer.cluster_traders(
+                trader_metrics.copy(), n_clusters=n_clusters, model_path=model_path, refit=refit
+            )
+        except ValueError as e:
+            print(f"Clustering skipped: {e}")
+            return trader_metrics
+        print(f"Created {trader_metrics['cluster'].nunique()} trader clusters")
+        return trader_metrics
+    
+    def plots(counts, trader_metrics, correlations):
         print("\n8. Generating visualizations...")
         try:
             visualization_success = visualizer.generate_all_visualizations(
-                merged_data=merged_data,
+                merged_data=None,
                 trader_metrics=trader_metrics,
-                correlation_matrix=correlation_matrix if 'correlation_matrix' in locals() else None
+                correlation_matrix=correlations['matrix'],
+                sentiment_counts=counts
             )
             if visualization_success:
                 print("Visualizations successfully saved to data/outputs/")
             else:
                 print("Some visualizations failed to generate")
+            return visualization_success
         except Exception as e:
             print(f"Visualization system error: {str(e)}")
-        
+            return False
+    
+    def report(data_overview, trader_metrics, sentiment_performance, test_results, correlations, tail_risk, events):
         print("\n9. Generating summary report...")
-        generate_summary_report(merged_data, trader_metrics, sentiment_performance, test_results)
-        
-    except Exception as e:
-        print(f"\nError during analysis: {str(e)}")
-        print("\nTroubleshooting tips:")
-        print("- Verify all input files exist in data/raw/")
-        print("- Check that timestamps are formatted correctly")
-        print("- Ensure all required packages are installed (pandas, matplotlib, seaborn)")
-        print("- Try running: pip install --upgrade matplotlib seaborn")
-        return
+        generate_summary_report(data_overview, trader_metrics, sentiment_performance, test_results, correlations,
+                                tail_risk, events)
+    
+    merge_params = {'mode': mode, 'merged_format': merged_format, 'compact': preprocessor.compact}
+    if args.rebuild_store:
+        merge_params['rebuild_store'] = True
+    if args.schema:
+        merge_params['dtypes'] = loader.dtypes
+    if mode == 'memory':
+        pipeline.add('load', load, params={'sources': sources}, memoize=False)
+        pipeline.add('merge', merge, inputs=['load'], params=merge_params, outputs=[merged_output], code=[report_store],
+                     codec=(merged_to_memo, merged_from_memo))
+    else:
+        merge_params.update(sources=sources, chunksize=args.chunksize, workers=args.workers)
+        pipeline.add('merge', merge, params=merge_params, outputs=[merged_output],
+                     code=[stream_merge, parallel_merge, report_merge, report_store])
+    
+    pipeline.add('overview', overview, inputs=['merge'], code=[describe_merged])
+    pipeline.add('sentiment_counts', sentiment_counts, inputs=['merge'])
+    pipeline.add('metrics', metrics, inputs=['merge'], outputs=['data/outputs/trader_metrics.csv'])
+    pipeline.add('positions', positions, inputs=['merge'])
+    pipeline.add('cube', cube, inputs=['merge'], outputs=[CUBE_PATH])
+    pipeline.add('sentiment', sentiment, inputs=['cube'])
+    pipeline.add('tail_risk', tail_risk, inputs=['merge'])
+    pipeline.add('events', events, inputs=['cube'], outputs=['data/outputs/event_study.csv'], params={
+        'window': args.event_window, 'sentiment_source': file_fingerprint(loader.sentiment_data_path)
+    })
+    pipeline.add('correlation', correlation, inputs=['merge'])
+    pipeline.add('tests', tests, inputs=['merge'], code=[format_test_result],
+                 params={'n_resamples': args.resamples, 'workers': args.workers})
+    cluster_model = 'data/processed/cluster_model.json'
+    pipeline.add('clustering', clustering, inputs=['metrics'], outputs=[cluster_model], params={
+        'n_clusters': args.clusters, 'model_path': cluster_model, 'refit': args.refit_clusters
+    })
+    pipeline.add('plots', plots, inputs=['sentiment_counts', 'clustering', 'correlation'])
+    pipeline.add('report', report, inputs=['overview', 'clustering', 'sentiment', 'tests', 'correlation', 'tail_risk',
+                                           'events'],
+                 outputs=['data/outputs/analysis_report.txt'],
+                 code=[generate_summary_report, format_test_result])
+    return pipeline, merged_output
 
-    print("\n=== Analysis Complete! ===")
-    print("Results saved to:")
-    print("- data/processed/merged_data.csv")
-    print("- data/outputs/ (visualizations and metrics)")
+def account_day_order(df):
+    """Stable sort order of merged rows by account name, then day
+    
+    A day's fills for an account are stored in one file in their merged
+    order, so this order is the same for a merged frame and for its rows
+    read back from the store.
+    """
+    accounts = df['account'].astype('category')
+    names = accounts.cat.categories.astype(str)
+    rank = np.empty(len(names), dtype='int64')
+    rank[np.argsort(names)] = np.arange(len(names))
+    return np.lexsort((df['day'].to_numpy(), rank[accounts.cat.codes.to_numpy()]))
+
+def stream_merge(loader, preprocessor, chunksize, merged_format, rebuild_store=False):
+    """Preprocess, merge and aggregate trader data chunk by chunk
+    
+    Only the per-account and per-sentiment partial aggregates are kept in
+    memory; merged chunks are appended to the merged output as they are produced.
+    """
+    print("\nPreprocessing sentiment data...")
+    sentiment_df = preprocessor.preprocess_sentiment_data(loader.load_sentiment_data())
+    sentiment_lookup = SentimentLookup(sentiment_df)
+    
+    aggregates = MergedAggregates()
+    with loader.merged_writer(fmt=merged_format, rebuild=rebuild_store) as writer:
+        for i, chunk in enumerate(loader.iter_trader_chunks(chunksize)):
+            chunk = preprocessor.preprocess_trader_data(chunk, verbose=False)
+            merged_chunk, chunk_stats = preprocessor.join_sentiment(chunk, sentiment_lookup)
+            aggregates.update(merged_chunk, chunk_stats)
+            
+            writer.write(merged_chunk)
+            print(f"  chunk {i + 1}: {len(merged_chunk):,} rows ({aggregates.rows:,} total)")
+    
+    report_merge(aggregates)
+    if merged_format == 'parquet':
+        report_store(writer)
+    print(f"Merged data saved to {writer.path}. Rows: {aggregates.rows:,}")
+    return aggregates
+
+def parallel_merge(loader, preprocessor, partitions, workers, merged_format, rebuild_store=False):
+    """Preprocess, merge and aggregate trader partitions across a process pool
+    
+    Each worker handles whole partitions and returns partial aggregates,
+    which are combined here instead of concatenating the partitions.
+    Workers append their merged rows to the store themselves.
+    """
+    print("\nPreprocessing sentiment data...")
+    sentiment_df = preprocessor.preprocess_sentiment_data(loader.load_sentiment_data())
+    
+    if merged_format == 'parquet':
+        store, output_dir = loader.merged_writer(rebuild=rebuild_store), STORE_PATH
+    else:
+        store, output_dir = None, 'data/processed/merged_data'
+    aggregates = process_partitions(
+        partitions,
+        SentimentLookup(sentiment_df),
+        workers=workers,
+        cache_dir=loader.cache_dir,
+        output_dir=None if store else output_dir,
+        fmt=merged_format,
+        compact=preprocessor.compact,
+        dtypes=loader.dtypes,
+        store=store
+    )
+    if store:
+        store.close()
+        report_store(store)
+    
+    report_merge(aggregates)
+    print(f"Merged partitions saved to {output_dir}/. Rows: {aggregates.rows:,}")
+    return aggregates
+
+def report_store(writer):
+    """Print how many rows an append session added to the merged store"""
+    if writer.rebuild:
+        print(f"Rebuilt the merged store at {writer.path} ({writer.appended:,} rows)")
+    else:
+        print(f"Appended {writer.appended:,} new rows to the merged store at {writer.path}")
+
+def report_merge(aggregates):
+    print("\nMerge results:")
+    print(aggregates.merge_stats)
+    
+    if aggregates.merge_stats.get('both', 0) == 0:
+        raise ValueError("No dates matched between datasets")
+    
+    print(f"\nTrader date range: {aggregates.start:%Y-%m-%d} to {aggregates.end:%Y-%m-%d}")
+
+# Accounts whose fills are read back at once for the risk metrics
+RISK_ACCOUNT_BATCH = 1_000
+RISK_COLUMNS = ['account', 'timestamp', 'day', 'closedPnL']
 
-def generate_summary_report(merged_data, trader_metrics, sentiment_performance, test_results):
+def merged_risk_metrics(loader, analyzer, merged_path, aggregates, batch=RISK_ACCOUNT_BATCH):
+    """Risk metrics of streamed or partitioned input, read back from its merged output
+    
+    Drawdowns, rolling PnL and streaks need each account's fills in time
+    order, which the chunk aggregates don't keep. Only the columns they use
+    are read, ``batch`` accounts at a time, so memory is bounded by a batch
+    rather than the input. Rolling PnL ends on the last merged day, as it
+    does for a merged frame.
+    """
+    moments = aggregates.account_moments
+    if moments.state is None or 'closedPnL' not in moments.columns:
+        return None
+    print("Reading fills back from the merged output for drawdown, rolling PnL and streak metrics...")
+    # The store sorts files by account, so consecutive accounts share row groups
+    accounts = sorted(map(str, moments.state.index))
+    as_of_day = pd.Timestamp(aggregates.end).value // NS_PER_DAY
+    frames = []
+    for lo in range(0, len(accounts), batch):
+        fills = loader.load_merged(merged_path, columns=RISK_COLUMNS, start=aggregates.start, end=aggregates.end,
+                                   accounts=accounts[lo:lo + batch])
+        if not fills.empty:
+            frames.append(analyzer.risk_metrics(fills, as_of_day))
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+def update_trader_metrics(loader, preprocessor, analyzer, chunksize, state_path):
+    """Fold fills appended since the last run into the saved per-account state
+    
+    Work is proportional to the new fills only: the export is read from the
+    byte offset recorded in the state. Trader metrics do not depend on
+    sentiment, so the sentiment join is skipped entirely.
+    """
+    partitions = loader.trader_partitions()
+    if len(partitions) > 1:
+        raise ValueError("Incremental updates require a single append-only trader export")
+    
+    state = TraderMetricsState.load(state_path)
+    path = partitions[0]
+    offset = state.resume_offset(path)
+    if offset == 0 and state.state is not None:
+        print("Trader export no longer extends the saved state; rebuilding from scratch")
+        state.reset()
+    
+    end = os.path.getsize(path)
+    print(f"Reading {end - offset:,} new bytes of trader data (resuming at byte {offset:,})")
+    
+    new_rows = 0
+    for chunk in loader.iter_trader_chunks(chunksize, offset=offset):
+        chunk = preprocessor.preprocess_trader_data(chunk, verbose=False)
+        state.update(chunk)
+        new_rows += len(chunk)
+    
+    state.mark_consumed(path, end)
+    state.save(state_path)
+    print(f"Folded {new_rows:,} new fills into {state_path}")
+    
+    return analyzer.trader_metrics_from_moments(state)
+
+def describe_merged(merged_data):
+    """Date range and row count used in the report overview"""
+    return {
+        'start': merged_data['date'].min(),
+        'end': merged_data['date'].max(),
+        'rows': len(merged_data)
+    }
+
+def format_test_result(result):
+    """Test results as text; result tables go on their own lines"""
+    if isinstance(result, pd.DataFrame):
+        return "\n" + result.round(4).to_string()
+    return str(result)
+
+# Event study summary columns shown in the console and the report
+EVENT_SUMMARY_COLUMNS = ['events', 'pnl_pre', 'pnl_post', 'win_rate_pre', 'win_rate_post',
+                         'account_pnl_change', 'account_pnl_change_t', 'accounts_improved']
+
+def generate_summary_report(data_overview, trader_metrics, sentiment_performance, test_results, correlations=None,
+                            tail_risk=None, events=None):
     """Generate comprehensive analysis report"""
     try:
         report_path = 'data/outputs/analysis_report.txt'
@@ -108,8 +661,8 @@ def generate_summary_report(merged_data, trader_metrics, sentiment_performance,
             
             f.write("1. DATA OVERVIEW\n")
             f.write("-"*50 + "\n")
-            f.write(f"Analysis Period: {merged_data['date'].min()} to {merged_data['date'].max()}\n")
-            f.write(f"Total Trades Analyzed: {len(merged_data):,}\n")
+            f.write(f"Analysis Period: {data_overview['start']:%Y-%m-%d} to {data_overview['end']:%Y-%m-%d}\n")
+            f.write(f"Total Trades Analyzed: {data_overview['rows']:,}\n")
             f.write(f"Unique Traders: {len(trader_metrics):,}\n\n")
             
             f.write("2. MARKET SENTIMENT ANALYSIS\n")
@@ -122,6 +675,19 @@ def generate_summary_report(merged_data, trader_metrics, sentiment_performance,
                 f.write(f"Worst Performing Sentiment: {sentiment_performance['closedPnL']['mean'].idxmin()}\n")
             else:
                 f.write("No sentiment data available\n")
+            if tail_risk is not None and not tail_risk.empty:
+                f.write("\nTail Risk by Sentiment Class (VaR/CVaR are losses; quantiles within 1%):\n\n")
+                f.write(tail_risk.to_string())
+                f.write("\n")
+            if events is not None and not events['summary'].empty:
+                f.write("\nAround Sentiment Transitions (daily means in the window before vs from the transition;\n"
+                        "account columns compare each account's mean daily PnL across the two windows):\n\n")
+                f.write(events['summary'].filter(EVENT_SUMMARY_COLUMNS).round(4).to_string())
+                f.write("\n")
+                if not events['lag_correlations'].empty:
+                    f.write("\nCorrelation of Daily Totals with Lagged Sentiment:\n\n")
+                    f.write(events['lag_correlations'].round(4).to_string())
+                    f.write("\n")
             f.write("\n")
             
             f.write("3. TRADER PERFORMANCE\n")
@@ -147,10 +713,21 @@ def generate_summary_report(merged_data, trader_metrics, sentiment_performance,
             if test_results:
                 for test, result in test_results.items():
                     f.write(f"{test.upper()}:\n")
-                    f.write(f"  - {result}\n")
+                    f.write(f"  - {format_test_result(result)}\n")
             else:
                 f.write("No statistical test results available\n")
             
+            if correlations is not None and not correlations['matrix'].empty:
+                matrix = correlations['matrix']
+                pairs = matrix.where(np.triu(np.ones(matrix.shape, dtype=bool), k=1)).stack()
+                f.write("\nStrongest Correlations:\n")
+                for (a, b), value in pairs.reindex(pairs.abs().sort_values(ascending=False).index).head(5).items():
+                    f.write(f"  - {a} vs {b}: {value:.4f}\n")
+                if not correlations['by_sentiment'].empty:
+                    f.write("\nCorrelation with closedPnL by Sentiment Class:\n")
+                    f.write(correlations['by_sentiment'].round(4).to_string())
+                    f.write("\n")
+            
             f.write("\n5. RECOMMENDATIONS & INSIGHTS\n")
             f.write("-"*50 + "\n")
             if not sentiment_performance.empty:
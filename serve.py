@@ -0,0 +1,43 @@
+import os
+import argparse
+from src.service import AnalyticsService, make_server, DEFAULT_CACHE_SIZE
+from src.store import MergedStore, STORE_PATH
+
+def default_merged_path():
+    """Merged output of the last main.py run: the Parquet store, CSV or partition directory"""
+    if MergedStore.exists(STORE_PATH):
+        return STORE_PATH
+    for path in ('data/processed/merged_data.parquet', 'data/processed/merged_data.csv', 'data/processed/merged_data/'):
+        if os.path.exists(path):
+            return path
+    return STORE_PATH
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve trader and sentiment queries over the processed data")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=8050, help="Port to listen on")
+    parser.add_argument(
+        '--merged', default=None,
+        help="Merged data written by main.py (default: data/processed/merged_store)"
+    )
+    parser.add_argument(
+        '--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+        help="Query results kept in the LRU cache"
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=== Bitcoin Trading Analysis Service ===\n")
+    service = AnalyticsService(args.merged or default_merged_path(), cache_size=args.cache_size)
+    server = make_server(service, args.host, args.port)
+    print(f"\nServing on http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
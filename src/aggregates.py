@@ -0,0 +1,410 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+try:
+    from src.cube import SentimentCube
+    from src.preprocessor import with_derived
+    from src.sketches import QuantileSketch
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from cube import SentimentCube
+    from preprocessor import with_derived
+    from sketches import QuantileSketch
+
+class GroupedMoments:
+    """Mergeable per-group count/sum/M2 partials for chunked aggregation
+
+    Each chunk is reduced with a single groupby and folded into the running
+    state with the parallel variance formula (Chan et al.), so sum, mean,
+    std and count match a groupby over the concatenated data.
+    """
+
+    TRACKED_COLUMNS = ['closedPnL', 'trade_value', 'is_profitable']
+
+    def __init__(self, by):
+        self.by = by
+        self.columns = []
+        self.state = None
+
+    def update(self, df):
+        """Fold one chunk of merged trade data into the running state"""
+        df = with_derived(df, self.TRACKED_COLUMNS)
+        columns = [col for col in self.TRACKED_COLUMNS if col in df.columns]
+        if self.by not in df.columns or not columns:
+            return self
+
+        values = df[columns].astype('float64')
+        grouped = values.groupby(df[self.by], observed=True)
+        count = grouped.count()
+        partial = pd.concat({
+            'count': count,
+            'sum': grouped.sum(),
+            'm2': (grouped.var(ddof=0) * count).fillna(0)
+        }, axis=1)
+        # Chunks intern keys with different category sets; the per-group
+        # state is small, so key it by the plain values instead
+        partial.index = partial.index.astype(object)
+        return self.merge_state(partial, columns)
+
+    def merge(self, other):
+        """Combine another GroupedMoments over the same key into this one"""
+        if other.state is not None:
+            self.merge_state(other.state, other.columns)
+        return self
+
+    def merge_state(self, partial, columns):
+        for col in columns:
+            if col not in self.columns:
+                self.columns.append(col)
+
+        if self.state is None:
+            self.state = partial.sort_index()
+            return self
+
+        left, right = self.state.align(partial, fill_value=0)
+        n_a, n_b = left['count'], right['count']
+        n = n_a + n_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = right['sum'] / n_b - left['sum'] / n_a
+            correction = (delta ** 2 * n_a * n_b / n).fillna(0)
+
+        self.state = pd.concat({
+            'count': n,
+            'sum': left['sum'] + right['sum'],
+            'm2': left['m2'] + right['m2'] + correction
+        }, axis=1).sort_index()
+        return self
+
+    def aggregate(self, spec):
+        """Equivalent of ``df.groupby(by).agg(spec)`` for sum/mean/std/count"""
+        if self.state is None:
+            return pd.DataFrame()
+
+        count, total, m2 = self.state['count'], self.state['sum'], self.state['m2']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results = {
+                'count': count.astype('int64'),
+                'sum': total,
+                'mean': total / count,
+                'std': np.sqrt(m2 / (count - 1)).where(count > 1)
+            }
+
+        columns = {}
+        for col, aggs in spec.items():
+            for agg in ([aggs] if isinstance(aggs, str) else aggs):
+                columns[(col, agg)] = results[agg][col]
+
+        result = pd.DataFrame(columns)
+        result.columns = pd.MultiIndex.from_tuples(columns.keys())
+        result.index.name = self.by
+        return result
+
+    def counts(self):
+        """Row count per group, highest first"""
+        if self.state is None:
+            return pd.Series(dtype='int64')
+        return self.state['count'].max(axis=1).astype('int64').sort_values(ascending=False)
+
+class GroupedQuantiles:
+    """Mergeable per-group quantile sketches for chunked tail statistics
+
+    Keeps a QuantileSketch of each tracked column per group. Sketches
+    merge exactly, so quantiles and tail means don't depend on how the
+    fills were chunked or partitioned, and memory grows with the number of
+    groups rather than the number of fills.
+    """
+
+    TRACKED_COLUMNS = ['closedPnL', 'trade_value']
+
+    def __init__(self, by, accuracy=0.01):
+        self.by = by
+        self.accuracy = accuracy
+        self.groups = {}
+
+    def update(self, df):
+        """Fold one chunk of merged trade data into the group sketches"""
+        df = with_derived(df, self.TRACKED_COLUMNS)
+        columns = [col for col in self.TRACKED_COLUMNS if col in df.columns]
+        if self.by not in df.columns or not columns or df.empty:
+            return self
+
+        # Sort once by group and hand each sketch a contiguous slice
+        codes, keys = pd.factorize(df[self.by])
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+        values = {col: df[col].to_numpy(dtype='float64', na_value=np.nan)[order] for col in columns}
+        for i, key in enumerate(keys):
+            sketches = self.groups.setdefault(key, {})
+            for col in columns:
+                sketch = sketches.setdefault(col, QuantileSketch(self.accuracy))
+                sketch.update(values[col][bounds[i]:bounds[i + 1]])
+        return self
+
+    def merge(self, other):
+        """Combine sketches built from another chunk or partition"""
+        for key, sketches in other.groups.items():
+            mine = self.groups.setdefault(key, {})
+            for col, sketch in sketches.items():
+                mine.setdefault(col, QuantileSketch(self.accuracy)).merge(sketch)
+        return self
+
+    def items(self):
+        """(group, {column: QuantileSketch}) pairs in group order"""
+        return [(key, self.groups[key]) for key in sorted(self.groups)]
+
+class CoMoments:
+    """Mergeable pairwise co-moments for a streaming correlation matrix
+
+    Like ``DataFrame.corr()``, every pair of columns uses the rows where
+    both are present, so each pair keeps its own count, means and centered
+    sums of squares and cross-products. Chunks are folded in with the
+    pairwise form of the parallel covariance update, after centering each
+    chunk on its column means to keep the sums well conditioned.
+    """
+
+    TRACKED_COLUMNS = ['closedPnL', 'size', 'size_usd', 'sentiment_score', 'trade_value', 'fee']
+
+    def __init__(self):
+        self.columns = []
+        # p x p arrays; mean[i, j] and m2[i, j] are over rows where i and j are both present
+        self.count = self.mean = self.m2 = self.cross = None
+
+    def update(self, df):
+        """Fold one chunk of merged trade data into the running co-moments"""
+        df = with_derived(df, self.TRACKED_COLUMNS)
+        columns = [col for col in self.TRACKED_COLUMNS if col in df.columns]
+        if not columns or df.empty:
+            return self
+
+        values = df[columns].to_numpy(dtype='float64')
+        present = ~np.isnan(values)
+        with np.errstate(invalid='ignore'):
+            shift = np.nanmean(values, axis=0)
+        centered = np.where(present, values - np.nan_to_num(shift), 0.0)
+        mask = present.astype('float64')
+
+        count = mask.T @ mask
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # sums[i, j]: sum of column i over rows where j is also present
+            sums = centered.T @ mask
+            mean = np.where(count > 0, sums / count, 0.0)
+            m2 = (centered ** 2).T @ mask - np.where(count > 0, sums ** 2 / count, 0.0)
+            cross = centered.T @ centered - np.where(count > 0, sums * sums.T / count, 0.0)
+        return self.merge_state(columns, count, mean + np.nan_to_num(shift)[:, None], m2, cross)
+
+    def merge(self, other):
+        """Combine co-moments accumulated from another chunk or worker"""
+        if other.count is not None:
+            self.merge_state(other.columns, other.count, other.mean, other.m2, other.cross)
+        return self
+
+    def merge_state(self, columns, count, mean, m2, cross):
+        if self.count is None:
+            self.columns = list(columns)
+            self.count, self.mean, self.m2, self.cross = count, mean, m2, cross
+            return self
+
+        union = self.columns + [col for col in columns if col not in self.columns]
+        left = [self._expand(a, self.columns, union) for a in (self.count, self.mean, self.m2, self.cross)]
+        right = [self._expand(a, columns, union) for a in (count, mean, m2, cross)]
+        self.columns = union
+        (n_a, mean_a, m2_a, cross_a), (n_b, mean_b, m2_b, cross_b) = left, right
+
+        n = n_a + n_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(n > 0, n_a * n_b / n, 0.0)
+            delta = mean_b - mean_a
+            self.mean = np.where(n > 0, mean_a + delta * np.where(n > 0, n_b / n, 0.0), 0.0)
+        self.count = n
+        self.m2 = m2_a + m2_b + delta ** 2 * weight
+        self.cross = cross_a + cross_b + delta * delta.T * weight
+        return self
+
+    @staticmethod
+    def _expand(array, source, columns):
+        """A p x p ``array`` over ``source`` columns, laid out on ``columns``"""
+        if list(source) == columns:
+            return array
+        index = [columns.index(col) for col in source]
+        expanded = np.zeros((len(columns), len(columns)))
+        expanded[np.ix_(index, index)] = array
+        return expanded
+
+    def correlation(self):
+        """Pearson correlation matrix, NaN where a pair has no variance"""
+        if self.count is None:
+            return pd.DataFrame()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.sqrt(self.m2 * self.m2.T)
+            corr = np.where(scale > 0, self.cross / scale, np.nan)
+        corr = np.clip((corr + corr.T) / 2, -1, 1)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+class CorrelationMoments:
+    """Overall and per-group CoMoments, fed and merged together"""
+
+    def __init__(self, by='Classification'):
+        self.by = by
+        self.overall = CoMoments()
+        self.groups = {}
+
+    def update(self, df):
+        df = with_derived(df, CoMoments.TRACKED_COLUMNS)
+        self.overall.update(df)
+        if self.by in df.columns:
+            for key, group in df.groupby(self.by, observed=True, sort=False):
+                self.groups.setdefault(key, CoMoments()).update(group)
+        return self
+
+    def merge(self, other):
+        self.overall.merge(other.overall)
+        for key, moments in other.groups.items():
+            self.groups.setdefault(key, CoMoments()).merge(moments)
+        return self
+
+    def matrix(self):
+        return self.overall.correlation()
+
+    def by_group(self):
+        """Correlation matrix per group, in group order"""
+        return {key: self.groups[key].correlation() for key in sorted(self.groups)}
+
+class MergedAggregates:
+    """Everything the report needs from merged trades, without the trades
+
+    Holds per-account and per-sentiment moments and quantile sketches,
+    overall and per-sentiment correlation co-moments, the day x sentiment x
+    account cube, sentiment join statistics and the overview
+    (date range, row count). Built per chunk or per partition and combined
+    with ``merge``.
+    """
+
+    def __init__(self):
+        self.account_moments = GroupedMoments('account')
+        self.sentiment_moments = GroupedMoments('Classification')
+        self.account_quantiles = GroupedQuantiles('account')
+        self.sentiment_quantiles = GroupedQuantiles('Classification')
+        self.correlation_moments = CorrelationMoments('Classification')
+        self.cube = SentimentCube()
+        self.merge_stats = pd.Series(dtype='int64')
+        self.start = None
+        self.end = None
+        self.rows = 0
+
+    def update(self, merged_df, merge_stats):
+        """Fold one merged chunk and its join statistics"""
+        self.account_moments.update(merged_df)
+        self.sentiment_moments.update(merged_df)
+        self.account_quantiles.update(merged_df)
+        self.sentiment_quantiles.update(merged_df)
+        self.correlation_moments.update(merged_df)
+        self.cube.update(merged_df)
+        self._add_overview(merge_stats, merged_df['date'].min(), merged_df['date'].max(), len(merged_df))
+        return self
+
+    def merge(self, other):
+        """Combine aggregates built from another chunk or partition"""
+        self.account_moments.merge(other.account_moments)
+        self.sentiment_moments.merge(other.sentiment_moments)
+        self.account_quantiles.merge(other.account_quantiles)
+        self.sentiment_quantiles.merge(other.sentiment_quantiles)
+        self.correlation_moments.merge(other.correlation_moments)
+        self.cube.merge(other.cube)
+        self._add_overview(other.merge_stats, other.start, other.end, other.rows)
+        return self
+
+    def _add_overview(self, merge_stats, start, end, rows):
+        self.merge_stats = self.merge_stats.add(merge_stats, fill_value=0).astype('int64')
+        if rows:
+            self.start = start if self.start is None else min(self.start, start)
+            self.end = end if self.end is None else max(self.end, end)
+            self.rows += rows
+
+    def overview(self):
+        return {'start': self.start, 'end': self.end, 'rows': self.rows}
+
+class TraderMetricsState(GroupedMoments):
+    """Persistent per-account moments that can be extended with new fills only
+
+    Besides the moments, the state remembers how many bytes of the
+    append-only trader export it has consumed, plus a checksum of the bytes
+    just before that point, so the next run can seek past already counted
+    fills. If the export was rewritten rather than appended to, the resume
+    offset falls back to 0 and the state is rebuilt from scratch.
+    """
+
+    CHECKSUM_BYTES = 1 << 16
+
+    def __init__(self):
+        super().__init__('account')
+        self.source = None
+        self.offset = 0
+        self.checksum = None
+
+    def resume_offset(self, path):
+        """Byte offset to resume reading ``path`` from (0 means start over)"""
+        path = os.path.abspath(path)
+        if self.source != path or not self.offset:
+            return 0
+        if os.path.getsize(path) < self.offset or self._tail_checksum(path, self.offset) != self.checksum:
+            return 0
+        return self.offset
+
+    def reset(self):
+        self.columns = []
+        self.state = None
+        self.offset = 0
+        self.checksum = None
+        return self
+
+    def mark_consumed(self, path, offset):
+        """Record that ``path`` has been folded into the state up to ``offset``"""
+        self.source = os.path.abspath(path)
+        self.offset = offset
+        self.checksum = self._tail_checksum(path, offset)
+        return self
+
+    def _tail_checksum(self, path, offset):
+        start = max(0, offset - self.CHECKSUM_BYTES)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def save(self, base_path):
+        """Write the moments as Parquet and the resume metadata as JSON"""
+        os.makedirs(os.path.dirname(base_path) or '.', exist_ok=True)
+        if self.state is not None:
+            state = self.state.copy()
+            state.columns = [f"{stat}__{col}" for stat, col in state.columns]
+            state.reset_index().to_parquet(f"{base_path}.parquet", index=False)
+        with open(f"{base_path}.json", 'w') as f:
+            json.dump({
+                'by': self.by,
+                'columns': self.columns,
+                'source': self.source,
+                'offset': self.offset,
+                'checksum': self.checksum
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, base_path):
+        """Load a saved state, or return an empty one if none exists yet"""
+        state = cls()
+        if not os.path.exists(f"{base_path}.json"):
+            return state
+
+        with open(f"{base_path}.json") as f:
+            meta = json.load(f)
+        state.columns = meta['columns']
+        state.source = meta['source']
+        state.offset = meta['offset']
+        state.checksum = meta['checksum']
+
+        if os.path.exists(f"{base_path}.parquet"):
+            frame = pd.read_parquet(f"{base_path}.parquet").set_index(meta['by'])
+            frame.columns = pd.MultiIndex.from_tuples([tuple(c.split('__', 1)) for c in frame.columns])
+            state.state = frame
+        return state
@@ -1,32 +1,102 @@
+import os
 import pandas as pd
 import numpy as np
-from scipy import stats
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+
+try:
+    from src.instrumentation import traced
+    from src.aggregates import CorrelationMoments, GroupedQuantiles
+    from src.cube import SentimentCube
+    from src.preprocessor import with_derived
+    from src.clustering import ClusterModel
+    from src.risk import trader_risk_metrics
+    from src.positions import build_position_book
+    from src.event_study import sentiment_event_study, EVENT_WINDOW
+    from src.resampling import RESAMPLES, sentiment_resampling_tests, anova_from_stats, test_result
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from instrumentation import traced
+    from aggregates import CorrelationMoments, GroupedQuantiles
+    from cube import SentimentCube
+    from preprocessor import with_derived
+    from clustering import ClusterModel
+    from risk import trader_risk_metrics
+    from positions import build_position_book
+    from event_study import sentiment_event_study, EVENT_WINDOW
+    from resampling import RESAMPLES, sentiment_resampling_tests, anova_from_stats, test_result
 
 class TradingAnalyzer:
     def __init__(self):
-        self.scaler = StandardScaler()
+        self.cluster_model = None
+    
+    TRADER_METRICS = {
+        'closedPnL': ['sum', 'mean', 'std', 'count'],
+        'trade_value': ['sum', 'mean'],
+        'is_profitable': 'mean'
+    }
+    
+    SENTIMENT_METRICS = {
+        'closedPnL': ['mean', 'sum', 'std'],
+        'trade_value': 'mean',
+        'is_profitable': 'mean'
+    }
     
+    @traced
     def calculate_trader_metrics(self, df):
         """Calculate key trader performance metrics"""
+        df = with_derived(df, self.TRADER_METRICS)
         # Check which columns are actually available
-        available_metrics = {
-            'closedPnL': ['sum', 'mean', 'std', 'count'],
-            'trade_value': ['sum', 'mean'],
-            'is_profitable': 'mean'
-        }
-        
         metrics_to_calculate = {
-            col: agg for col, agg in available_metrics.items()
+            col: agg for col, agg in self.TRADER_METRICS.items()
             if col in df.columns
         }
         
         if not metrics_to_calculate:
             raise ValueError("No valid columns found for metric calculation")
             
-        trader_metrics = df.groupby('account').agg(metrics_to_calculate).round(4)
+        trader_metrics = df.groupby('account', observed=True).agg(metrics_to_calculate).round(4)
+        trader_metrics = self._finalize_trader_metrics(trader_metrics)
+        
+        if {'closedPnL', 'day'} <= set(df.columns):
+            trader_metrics = trader_metrics.merge(self.risk_metrics(df), on='account', how='left')
+        return self._add_tail_risk(trader_metrics, self.tail_quantiles(df, 'account'))
+    
+    @traced
+    def risk_metrics(self, df, as_of_day=None):
+        """Drawdown, rolling PnL, streak and daily Sharpe metrics per account"""
+        return trader_risk_metrics(df, as_of_day)
+    
+    @traced
+    def trader_metrics_from_moments(self, moments, quantiles=None, risk_metrics=None):
+        """Trader metrics from per-account GroupedMoments built chunk by chunk
+        
+        With per-account GroupedQuantiles, the tail-risk metrics are added
+        too, and ``risk_metrics`` (from ``risk_metrics``) are merged in
+        before them, giving the columns of ``calculate_trader_metrics``.
+        """
+        metrics_to_calculate = {
+            col: agg for col, agg in self.TRADER_METRICS.items()
+            if col in moments.columns
+        }
         
+        if not metrics_to_calculate:
+            raise ValueError("No valid columns found for metric calculation")
+        
+        trader_metrics = moments.aggregate(metrics_to_calculate).round(4)
+        trader_metrics = self._finalize_trader_metrics(trader_metrics)
+        if risk_metrics is not None:
+            trader_metrics = trader_metrics.merge(risk_metrics, on='account', how='left')
+        if quantiles is not None:
+            trader_metrics = self._add_tail_risk(trader_metrics, quantiles)
+        return trader_metrics
+    
+    def _add_tail_risk(self, trader_metrics, quantiles):
+        tail_risk = self.tail_risk_from_quantiles(quantiles)
+        if tail_risk.empty:
+            return trader_metrics
+        return trader_metrics.merge(tail_risk.reset_index(), on='account', how='left')
+    
+    def _finalize_trader_metrics(self, trader_metrics):
+        """Flatten aggregated columns and derive ratio metrics"""
         # Flatten column names
         trader_metrics.columns = ['_'.join(col).strip() for col in trader_metrics.columns]
         trader_metrics = trader_metrics.reset_index()
@@ -49,69 +119,208 @@ class TradingAnalyzer:
         
         return trader_metrics
     
+    @traced
+    def reconstruct_positions(self, df, as_of=None):
+        """Position paths, exposure, holding periods and PnL/fee split per account x coin
+        
+        Returns a PositionBook of per-fill arrays; its ``segments()``,
+        ``by_account()`` and ``daily_exposure()`` give compact summaries.
+        """
+        return build_position_book(df, as_of)
+    
+    @traced
     def sentiment_performance_analysis(self, df):
         """Analyze performance by market sentiment"""
         if 'Classification' not in df.columns:
             raise ValueError("Classification column not found for sentiment analysis")
-            
-        available_metrics = {
-            'closedPnL': ['mean', 'sum', 'std'],
-            'trade_value': 'mean',
-            'is_profitable': 'mean'
-        }
         
+        df = with_derived(df, self.SENTIMENT_METRICS)
         # Only include columns that exist in the dataframe
         metrics_to_calculate = {
-            col: agg for col, agg in available_metrics.items()
+            col: agg for col, agg in self.SENTIMENT_METRICS.items()
             if col in df.columns
         }
         
         if not metrics_to_calculate:
             raise ValueError("No valid columns found for sentiment analysis")
             
-        sentiment_analysis = df.groupby('Classification').agg(metrics_to_calculate).round(4)
+        sentiment_analysis = df.groupby('Classification', observed=True).agg(metrics_to_calculate).round(4)
         
         return sentiment_analysis
     
+    @traced
+    def sentiment_performance_from_moments(self, moments):
+        """Sentiment performance from per-class GroupedMoments"""
+        metrics_to_calculate = {
+            col: agg for col, agg in self.SENTIMENT_METRICS.items()
+            if col in moments.columns
+        }
+        
+        if not metrics_to_calculate:
+            raise ValueError("No valid columns found for sentiment analysis")
+        
+        return moments.aggregate(metrics_to_calculate).round(4)
+    
+    # Confidence levels of the VaR / CVaR columns
+    TAIL_LEVELS = (0.95, 0.99)
+    
+    @traced
+    def tail_quantiles(self, df, by='Classification'):
+        """Per-group quantile sketches of PnL and trade value
+        
+        Equivalent to feeding ``df`` as a single chunk of a streamed run.
+        """
+        return GroupedQuantiles(by).update(df)
+    
+    @traced
+    def tail_risk_analysis(self, df, by='Classification'):
+        """Tail-risk metrics per sentiment class (or per ``by`` group)"""
+        return self.tail_risk_from_quantiles(self.tail_quantiles(df, by))
+    
+    @traced
+    def tail_risk_from_quantiles(self, quantiles):
+        """PnL percentiles, VaR, CVaR and median trade size from GroupedQuantiles
+        
+        VaR at level L is the loss at the (1 - L) PnL quantile and CVaR the
+        mean loss beyond it, both as positive numbers for losses. The
+        quantiles come from the sketches and are within 1% of the exact ones.
+        """
+        rows = {}
+        for key, sketches in quantiles.items():
+            row = {}
+            pnl = sketches.get('closedPnL')
+            if pnl is not None and pnl.count:
+                row['pnl_p05'], row['pnl_median'], row['pnl_p95'] = pnl.quantile([0.05, 0.5, 0.95])
+                for level in self.TAIL_LEVELS:
+                    row[f"var_{level * 100:.0f}"] = -pnl.quantile(1 - level)
+                    row[f"cvar_{level * 100:.0f}"] = -pnl.tail_mean(1 - level)
+            size = sketches.get('trade_value')
+            if size is not None and size.count:
+                row['median_trade_size'] = size.quantile(0.5)
+            rows[key] = row
+        
+        tail_risk = pd.DataFrame.from_dict(rows, orient='index').round(4)
+        tail_risk.index.name = quantiles.by
+        return tail_risk
+    
+    @traced
+    def build_sentiment_cube(self, df):
+        """Day x sentiment x account cube of PnL, trade value and win statistics"""
+        return SentimentCube.from_frame(df)
+    
+    @traced
+    def sentiment_performance_from_cube(self, cube, **filters):
+        """Sentiment performance rolled up from a SentimentCube
+        
+        ``filters`` are passed to ``SentimentCube.select``, e.g. ``start``
+        and ``end`` dates to restrict the table to a date range.
+        """
+        metrics_to_calculate = {
+            col: agg for col, agg in self.SENTIMENT_METRICS.items()
+            if col in cube.measures
+        }
+        
+        if not metrics_to_calculate:
+            raise ValueError("No valid columns found for sentiment analysis")
+        
+        return cube.aggregate(metrics_to_calculate, by='Classification', **filters).round(4)
+    
+    @traced
+    def event_study(self, cube, sentiment_df, window=EVENT_WINDOW):
+        """PnL, volume and win rate around fear/greed regime transitions
+        
+        Transitions are changes of sentiment class and crossings of 50 in
+        the index value. Returns the events, the mean daily totals at each
+        offset within ``window`` days, a before/after summary per
+        transition and the correlation of daily totals with lagged sentiment.
+        """
+        return sentiment_event_study(cube, sentiment_df, window)
+    
+    @traced
     def correlation_analysis(self, df):
         """Perform correlation analysis"""
-        potential_cols = ['closedPnL', 'size', 'size_usd', 'sentiment_score', 'trade_value', 'fee']
-        available_cols = [col for col in potential_cols if col in df.columns]
+        return self.correlation_from_moments(self.correlation_moments(df))
+    
+    @traced
+    def correlation_moments(self, df):
+        """Overall and per-sentiment co-moments of the numeric trade columns
         
-        if len(available_cols) < 2:
+        Equivalent to feeding ``df`` as a single chunk of a streamed run.
+        """
+        return CorrelationMoments('Classification').update(df)
+    
+    @traced
+    def correlation_from_moments(self, moments):
+        """Correlation matrix from co-moments built chunk by chunk"""
+        correlation_matrix = moments.matrix()
+        if len(correlation_matrix.columns) < 2:
             print("Not enough numeric columns for correlation analysis")
             return pd.DataFrame()
-            
-        correlation_matrix = df[available_cols].corr()
         return correlation_matrix
     
-    def cluster_traders(self, trader_metrics, n_clusters=3):
-        """Cluster traders based on performance metrics"""
+    @traced
+    def sentiment_correlations(self, moments, target='closedPnL'):
+        """Correlation of ``target`` with the other columns, one row per sentiment class"""
+        rows = {
+            sentiment: matrix[target].drop(target)
+            for sentiment, matrix in moments.by_group().items()
+            if target in matrix.columns and len(matrix.columns) > 1
+        }
+        if not rows:
+            return pd.DataFrame()
+        # Columns constant within every class (e.g. sentiment_score) have no correlation
+        correlations = pd.DataFrame(rows).T.dropna(axis=1, how='all')
+        correlations.index.name = 'Classification'
+        return correlations
+    
+    CLUSTER_FEATURES = ['total_pnl', 'win_rate', 'trade_count', 'avg_pnl', 'closedPnL_sum', 'closedPnL_mean']
+    
+    @traced
+    def cluster_traders(self, trader_metrics, n_clusters=3, model_path=None, refit=False):
+        """Cluster traders based on performance metrics
+        
+        ``n_clusters='auto'`` picks k by a silhouette sweep. With
+        ``model_path``, a saved model with matching features (and k, unless
+        'auto') is reused to assign traders without refitting; otherwise the
+        model is fitted and saved there.
+        """
         if not isinstance(trader_metrics, pd.DataFrame) or trader_metrics.empty:
             raise ValueError("Invalid input data for clustering")
             
-        potential_features = ['total_pnl', 'win_rate', 'trade_count', 'avg_pnl', 'closedPnL_sum', 'closedPnL_mean']
-        available_features = [col for col in potential_features if col in trader_metrics.columns]
+        available_features = [col for col in self.CLUSTER_FEATURES if col in trader_metrics.columns]
         
         if len(available_features) < 2:
-            print(f"Not enough features for clustering (available: {available_features})")
-            trader_metrics['cluster'] = 0  
-            return trader_metrics
+            raise ValueError(f"Not enough features for clustering (available: {available_features})")
         
-        try:
-            X = self.scaler.fit_transform(trader_metrics[available_features])
-            
-            # Perform clustering
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-            trader_metrics['cluster'] = kmeans.fit_predict(X)
-        except Exception as e:
-            print(f"Clustering failed: {str(e)}")
-            trader_metrics['cluster'] = 0 
-            
+        model = None
+        if model_path and not refit and os.path.exists(model_path):
+            model = ClusterModel.load(model_path)
+            if model.features != available_features or n_clusters not in ('auto', model.n_clusters):
+                print("Saved cluster model does not match the requested features or clusters; refitting")
+                model = None
+        
+        if model is not None:
+            trader_metrics['cluster'] = model.assign(trader_metrics)
+            print(f"Assigned traders to {model.n_clusters} saved clusters from {model_path}")
+        else:
+            model = ClusterModel.fit(trader_metrics, available_features, n_clusters)
+            trader_metrics['cluster'] = model.labels
+            if model_path:
+                model.save(model_path)
+        
+        self.cluster_model = model
         return trader_metrics
     
-    def statistical_tests(self, df):
-        """Perform statistical tests"""
+    @traced
+    def statistical_tests(self, df, n_resamples=RESAMPLES, workers=None):
+        """Perform statistical tests
+        
+        A Welch t-test of Fear vs Greed PnL, an ANOVA/Kruskal-Wallis overview
+        across all sentiment classes, bootstrap confidence intervals per class
+        and permutation tests for every pair of classes, on mean PnL and win
+        rate. ``workers`` spreads the resamples over a process pool.
+        """
+        from scipy import stats
         results = {}
         
         if 'Classification' not in df.columns or 'closedPnL' not in df.columns:
@@ -123,13 +332,47 @@ class TradingAnalyzer:
             greed_pnl = df[df['Classification'] == 'Greed']['closedPnL'].dropna()
             
             if len(fear_pnl) > 1 and len(greed_pnl) > 1:
-                t_stat, p_value = stats.ttest_ind(fear_pnl, greed_pnl)
-                results['pnl_ttest'] = {
-                    't_statistic': t_stat,
-                    'p_value': p_value,
-                    'significant': p_value < 0.05
-                }
+                t_stat, p_value = stats.ttest_ind(fear_pnl, greed_pnl, equal_var=False)
+                results['pnl_ttest'] = test_result('t_statistic', t_stat, p_value)
+        except Exception as e:
+            print(f"Statistical test failed: {str(e)}")
+        
+        try:
+            results.update(sentiment_resampling_tests(df, n_resamples=n_resamples, workers=workers))
+        except Exception as e:
+            print(f"Resampling tests failed: {str(e)}")
+        
+        return results
+    
+    @traced
+    def statistical_tests_from_moments(self, moments):
+        """Fear vs Greed Welch t-test and ANOVA from per-class summary statistics
+        
+        Kruskal-Wallis and the resampling tests need the individual fills,
+        so streamed and partitioned runs skip them.
+        """
+        from scipy import stats
+        results = {}
+        
+        if moments.state is None or 'closedPnL' not in moments.columns:
+            return results
+        
+        try:
+            summary = moments.aggregate({'closedPnL': ['mean', 'std', 'count']})['closedPnL']
+            if {'Fear', 'Greed'} <= set(summary.index):
+                fear, greed = summary.loc['Fear'], summary.loc['Greed']
+                if fear['count'] > 1 and greed['count'] > 1:
+                    t_stat, p_value = stats.ttest_ind_from_stats(
+                        fear['mean'], fear['std'], fear['count'],
+                        greed['mean'], greed['std'], greed['count'],
+                        equal_var=False
+                    )
+                    results['pnl_ttest'] = test_result('t_statistic', t_stat, p_value)
+            
+            groups = summary[summary['count'] > 1]
+            if len(groups) > 1:
+                results['anova'] = test_result('f_statistic', *anova_from_stats(groups['count'], groups['mean'], groups['std']))
         except Exception as e:
             print(f"Statistical test failed: {str(e)}")
         
-        return results
\ No newline at end of file
+        return results
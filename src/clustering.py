@@ -0,0 +1,122 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+# scikit-learn is imported where a model is fitted: assigning traders to a
+# saved model only needs numpy, and the import costs more than that
+
+# Above this many traders fits switch to mini-batch k-means
+MINIBATCH_THRESHOLD = 10_000
+MINIBATCH_SIZE = 4096
+
+def fit_kmeans(X, n_clusters, random_state=42):
+    """Full-batch KMeans for small inputs, MiniBatchKMeans for large ones"""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    if len(X) > MINIBATCH_THRESHOLD:
+        model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state,
+                                batch_size=MINIBATCH_SIZE, n_init=3)
+    else:
+        model = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+    return model.fit(X)
+
+def select_n_clusters(X, k_values=range(2, 9), sample_size=5000, max_workers=None, random_state=42):
+    """Pick k by silhouette score on a sample, fitting the candidates in parallel
+
+    ``X`` is the standardized feature matrix. Silhouette is quadratic in the
+    number of points, so every candidate is scored on the same random sample
+    of at most ``sample_size`` rows. Returns the best k and a frame of
+    inertia and silhouette per candidate.
+    """
+    from sklearn.metrics import silhouette_score
+    if len(X) > sample_size:
+        rng = np.random.default_rng(random_state)
+        X = X[rng.choice(len(X), sample_size, replace=False)]
+    k_values = [k for k in k_values if 2 <= k < len(X)]
+    if not k_values:
+        raise ValueError(f"Too few traders ({len(X)}) to choose a number of clusters")
+
+    def score(k):
+        model = fit_kmeans(X, k, random_state)
+        labels = model.labels_
+        silhouette = silhouette_score(X, labels) if len(np.unique(labels)) > 1 else -1.0
+        return {'k': k, 'inertia': model.inertia_, 'silhouette': silhouette}
+
+    # KMeans releases the GIL in its compiled loops, so threads overlap
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        scores = pd.DataFrame(list(pool.map(score, k_values))).set_index('k')
+    return int(scores['silhouette'].idxmax()), scores
+
+class ClusterModel:
+    """Fitted standardization and centroids for assigning traders to clusters
+
+    Small enough to persist as JSON, so later runs can assign new or updated
+    accounts to the saved centroids without refitting.
+    """
+
+    VERSION = 1
+
+    def __init__(self, features, mean, scale, centroids, k_scores=None):
+        self.features = list(features)
+        self.mean = np.asarray(mean, dtype='float64')
+        self.scale = np.asarray(scale, dtype='float64')
+        self.centroids = np.asarray(centroids, dtype='float64')
+        self.k_scores = k_scores
+        self.labels = None
+
+    @property
+    def n_clusters(self):
+        return len(self.centroids)
+
+    @classmethod
+    def fit(cls, frame, features, n_clusters=3, random_state=42):
+        """Fit scaler and centroids on ``frame``; ``n_clusters='auto'`` sweeps k"""
+        from sklearn.preprocessing import StandardScaler
+        scaler = StandardScaler()
+        X = scaler.fit_transform(frame[features])
+
+        k_scores = None
+        if n_clusters == 'auto':
+            n_clusters, k_scores = select_n_clusters(X, random_state=random_state)
+            print(f"Selected {n_clusters} clusters by silhouette score")
+        elif n_clusters > len(X):
+            print(f"Only {len(X)} traders; reducing clusters from {n_clusters} to {len(X)}")
+            n_clusters = len(X)
+
+        kmeans = fit_kmeans(X, n_clusters, random_state)
+        model = cls(features, scaler.mean_, scaler.scale_, kmeans.cluster_centers_, k_scores)
+        model.labels = kmeans.labels_
+        return model
+
+    def transform(self, frame):
+        return (frame[self.features].to_numpy(dtype='float64') - self.mean) / self.scale
+
+    def assign(self, frame):
+        """Index of the nearest centroid for every row of ``frame``"""
+        X = self.transform(frame)
+        # |x - c|^2 without the per-row |x|^2 term, which doesn't change the argmin
+        distances = (self.centroids ** 2).sum(axis=1) - 2 * X @ self.centroids.T
+        return distances.argmin(axis=1).astype('int32')
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        state = {
+            'version': self.VERSION,
+            'features': self.features,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'centroids': self.centroids.tolist(),
+            'k_scores': None if self.k_scores is None else self.k_scores.reset_index().to_dict(orient='records')
+        }
+        with open(path, 'w') as f:
+            json.dump(state, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported cluster model version in {path}")
+        k_scores = pd.DataFrame(state['k_scores']).set_index('k') if state.get('k_scores') else None
+        return cls(state['features'], state['mean'], state['scale'], state['centroids'], k_scores)
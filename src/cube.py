@@ -0,0 +1,267 @@
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    from src.preprocessor import NS_PER_DAY, with_derived
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from preprocessor import NS_PER_DAY, with_derived
+
+CUBE_PATH = 'data/processed/sentiment_cube.npz'
+
+def merge_moments(groups, n_groups, count, total, m2):
+    """Count, sum and M2 per group from per-row partials
+
+    The many-way form of the parallel variance formula (Chan et al.) used
+    by ``GroupedMoments``: the groups' M2 is the rows' M2 plus each row's
+    count times the squared distance of its mean from the group mean, so
+    no sums of squares of large values are subtracted.
+    """
+    n = np.bincount(groups, count, minlength=n_groups)
+    value_sum = np.bincount(groups, total, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        row_mean = np.where(count > 0, total / count, 0.0)
+        group_mean = np.where(n > 0, value_sum / n, 0.0)
+    spread = m2 + count * (row_mean - group_mean[groups]) ** 2
+    return n, value_sum, np.bincount(groups, spread, minlength=n_groups)
+
+class SentimentCube:
+    """Pre-aggregated day x sentiment x account cube of fill statistics
+
+    Every non-empty (day, sentiment, account) cell keeps the fill count
+    and, per measure, the non-null count, sum and sum of squared deviations
+    from the mean (M2), in flat
+    arrays sorted by day, sentiment and account. Each day carries a single
+    sentiment, so there are at most as many cells as active account-days.
+    Slices and roll-ups are answered from the cells: a date range is a
+    binary search, and grouping is one ``np.unique`` plus a ``bincount``
+    per statistic, instead of a groupby over the raw fills.
+
+    Sentiment code 0 holds fills without a sentiment reading; like
+    ``groupby``, results grouped by Classification leave them out.
+    """
+
+    MEASURES = ['closedPnL', 'trade_value', 'is_profitable', 'size']
+    DIMENSIONS = {'date': 'day', 'Classification': 'sentiment', 'account': 'account'}
+    STATS = ('count', 'sum', 'm2')
+    VERSION = 2
+
+    def __init__(self, day=None, sentiment=None, account=None, sentiments=(), accounts=(), fills=None,
+                 stats=None, measures=None):
+        empty = np.array([], dtype='int64')
+        self.day = empty if day is None else day
+        self.sentiment = empty if sentiment is None else sentiment
+        self.account = empty if account is None else account
+        self.sentiments = pd.Index(sentiments)
+        self.accounts = pd.Index(accounts)
+        self.fills = empty if fills is None else fills
+        self.measures = list(measures or [])
+        # (measure, stat) -> per-cell array
+        self.stats = stats or {}
+
+    def __len__(self):
+        return len(self.day)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Aggregate merged fills (needs ``day`` and ``account``) into a cube"""
+        missing = [col for col in ('day', 'account') if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns for the sentiment cube: {missing}")
+
+        df = with_derived(df, cls.MEASURES)
+        sentiment = df['Classification'] if 'Classification' in df.columns else pd.Series(np.nan, index=df.index)
+        sentiment = sentiment.astype('category')
+        account = df['account'].astype('category')
+        measures = [col for col in cls.MEASURES if col in df.columns]
+        values = {col: df[col].to_numpy(dtype='float64', na_value=np.nan) for col in measures}
+        return cls._reduce(
+            df['day'].to_numpy(dtype='int64'),
+            sentiment.cat.codes.to_numpy().astype('int64') + 1,
+            account.cat.codes.to_numpy().astype('int64'),
+            sentiment.cat.categories, account.cat.categories,
+            np.ones(len(df)), values, raw=True
+        )
+
+    @classmethod
+    def _reduce(cls, day, sentiment, account, sentiments, accounts, fills, values, raw=False):
+        """Sum rows with equal (day, sentiment, account) into sorted cells
+
+        With ``raw``, ``values`` maps measures to per-fill values; otherwise
+        to dicts of per-row partial statistics.
+        """
+        cube = cls(sentiments=sentiments, accounts=accounts, measures=list(values))
+        if len(day) == 0:
+            return cube
+
+        n_sentiments, n_accounts = len(cube.sentiments) + 1, max(len(cube.accounts), 1)
+        first_day = int(day.min())
+        key = ((day - first_day) * n_sentiments + sentiment) * n_accounts + account
+        cells, inverse = np.unique(key, return_inverse=True)
+        cube.account = cells % n_accounts
+        cube.sentiment = cells // n_accounts % n_sentiments
+        cube.day = cells // (n_accounts * n_sentiments) + first_day
+
+        cube.fills = np.bincount(inverse, fills, minlength=len(cells))
+        for col, value in values.items():
+            if raw:
+                present = ~np.isnan(value)
+                value = np.where(present, value, 0.0)
+                partial = {'count': present.astype('float64'), 'sum': value, 'm2': np.zeros(len(value))}
+            else:
+                partial = value
+            merged = merge_moments(inverse, len(cells), partial['count'], partial['sum'], partial['m2'])
+            for stat, result in zip(cls.STATS, merged):
+                cube.stats[(col, stat)] = result
+        return cube
+
+    def update(self, df):
+        """Fold one chunk of merged fills into the cube"""
+        return self.merge(SentimentCube.from_frame(df))
+
+    def merge(self, other):
+        """Combine a cube built from another chunk or partition into this one"""
+        if len(other) == 0:
+            return self
+        if len(self) == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+
+        sentiments = self.sentiments.union(other.sentiments, sort=False)
+        accounts = self.accounts.union(other.accounts, sort=False)
+        measures = self.measures + [col for col in other.measures if col not in self.measures]
+        remap = lambda codes, labels, union: union.get_indexer(labels)[codes] if len(labels) else codes
+        sentiment = np.concatenate([
+            np.where(cube.sentiment > 0, remap(cube.sentiment - 1, cube.sentiments, sentiments) + 1, 0)
+            for cube in (self, other)
+        ])
+        account = np.concatenate([remap(cube.account, cube.accounts, accounts) for cube in (self, other)])
+        zeros = lambda cube: np.zeros(len(cube))
+        values = {
+            col: {stat: np.concatenate([cube.stats.get((col, stat), zeros(cube)) for cube in (self, other)])
+                  for stat in self.STATS}
+            for col in measures
+        }
+        merged = SentimentCube._reduce(
+            np.concatenate((self.day, other.day)), sentiment, account, sentiments, accounts,
+            np.concatenate((self.fills, other.fills)), values
+        )
+        self.__dict__.update(merged.__dict__)
+        return self
+
+    def select(self, start=None, end=None, sentiments=None, accounts=None):
+        """Indices of the cells between ``start`` and ``end`` (inclusive dates)
+        for the given sentiment classes and accounts"""
+        lo = 0 if start is None else np.searchsorted(self.day, self._day(start), side='left')
+        hi = len(self) if end is None else np.searchsorted(self.day, self._day(end), side='right')
+        index = np.arange(lo, hi)
+        if sentiments is not None:
+            codes = self.sentiments.get_indexer(pd.Index(np.atleast_1d(sentiments))) + 1
+            index = index[np.isin(self.sentiment[index], codes[codes > 0])]
+        if accounts is not None:
+            codes = self.accounts.get_indexer(pd.Index(np.atleast_1d(accounts)))
+            index = index[np.isin(self.account[index], codes[codes >= 0])]
+        return index
+
+    @staticmethod
+    def _day(value):
+        return pd.Timestamp(value).value // NS_PER_DAY if not isinstance(value, (int, np.integer)) else int(value)
+
+    def _group(self, by, index):
+        """Selected cells, their group ids and the index of the group keys"""
+        by = [by] if isinstance(by, str) else list(by)
+        unknown = [dim for dim in by if dim not in self.DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {unknown}")
+        if 'Classification' in by:
+            # Like groupby, leave out fills without a sentiment
+            index = index[self.sentiment[index] > 0]
+
+        codes = [getattr(self, self.DIMENSIONS[dim])[index] for dim in by]
+        if not by:
+            return index, np.zeros(len(index), dtype='int64'), pd.Index([0])
+        keys, groups = np.unique(np.column_stack(codes), axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+
+        levels = []
+        for dim, column in zip(by, keys.T):
+            if dim == 'date':
+                levels.append(pd.to_datetime(column * NS_PER_DAY).rename('date'))
+            elif dim == 'Classification':
+                levels.append(pd.CategoricalIndex(self.sentiments[column - 1], categories=self.sentiments, name=dim))
+            else:
+                levels.append(pd.Index(self.accounts[column], name=dim))
+        group_index = levels[0] if len(levels) == 1 else pd.MultiIndex.from_arrays(levels)
+        return index, groups, group_index
+
+    def aggregate(self, spec, by='Classification', **filters):
+        """Equivalent of ``df.groupby(by).agg(spec)`` for sum/mean/std/count
+
+        ``by`` is any of 'date', 'Classification' and 'account' (or a list
+        of them); ``filters`` are the ``select`` arguments.
+        """
+        index, groups, group_index = self._group(by, self.select(**filters))
+        columns = {}
+        for col, aggs in spec.items():
+            if col not in self.measures:
+                continue
+            count, value_sum, m2 = merge_moments(
+                groups, len(group_index), *(self.stats[(col, stat)][index] for stat in self.STATS)
+            )
+            with np.errstate(divide='ignore', invalid='ignore'):
+                results = {
+                    'count': count.astype('int64'),
+                    'sum': value_sum,
+                    'mean': value_sum / count,
+                    'std': np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+                }
+            for agg in ([aggs] if isinstance(aggs, str) else aggs):
+                columns[(col, agg)] = results[agg]
+
+        result = pd.DataFrame(columns, index=group_index)
+        result.columns = pd.MultiIndex.from_tuples(columns.keys())
+        return result
+
+    def counts(self, by='Classification', **filters):
+        """Number of fills per group, like ``df.groupby(by).size()``"""
+        index, groups, group_index = self._group(by, self.select(**filters))
+        counts = np.bincount(groups, self.fills[index], minlength=len(group_index))
+        return pd.Series(counts.astype('int64'), index=group_index, name='fills')
+
+    def daily(self, measure='closedPnL', stat='sum', by='Classification', **filters):
+        """Daily ``stat`` of ``measure`` with one column per ``by`` value (missing as 0)"""
+        frame = self.aggregate({measure: stat}, by=['date', by], **filters)[(measure, stat)]
+        return frame.unstack(fill_value=0)
+
+    def rolling(self, window, measure='closedPnL', stat='sum', by='Classification', **filters):
+        """Rolling mean over ``window`` calendar days of the ``daily`` table
+
+        Days without fills count as 0, so the window spans calendar days
+        rather than trading days.
+        """
+        daily = self.daily(measure, stat, by, **filters)
+        if daily.empty:
+            return daily
+        calendar = pd.date_range(daily.index.min(), daily.index.max(), freq='D', name='date')
+        return daily.reindex(calendar, fill_value=0).rolling(window).mean()
+
+    def save(self, path):
+        """Write the cube's arrays and labels to a compressed ``.npz``"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {f"{col}__{stat}": values for (col, stat), values in self.stats.items()}
+        np.savez_compressed(
+            path, version=self.VERSION, day=self.day, sentiment=self.sentiment, account=self.account,
+            fills=self.fills, sentiments=np.asarray(self.sentiments, dtype=str),
+            accounts=np.asarray(self.accounts, dtype=str), measures=np.asarray(self.measures, dtype=str), **arrays
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != cls.VERSION:
+                raise ValueError(f"Unsupported sentiment cube version in {path}")
+            measures = list(data['measures'])
+            stats = {(col, stat): data[f"{col}__{stat}"] for col in measures for stat in cls.STATS}
+            return cls(data['day'], data['sentiment'], data['account'], data['sentiments'], data['accounts'],
+                       data['fills'], stats, measures)
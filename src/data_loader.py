@@ -1,18 +1,88 @@
 import pandas as pd
 import numpy as np
+import os
+import glob
+import json
+import hashlib
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    from src.instrumentation import traced
+    from src.store import MergedStore, STORE_PATH
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from instrumentation import traced
+    from store import MergedStore, STORE_PATH
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Explicit schema for the Hyperliquid fill export so every chunk parses to
+# the same dtypes; columns missing from a given export are simply ignored.
+# Account and Coin repeat millions of times, so they are interned as
+# categoricals: integer codes per row plus one copy of each string.
+TRADER_DTYPES = {
+    'Account': 'category',
+    'Coin': 'category',
+    'Execution Price': 'float64',
+    'Size Tokens': 'float64',
+    'Size USD': 'float64',
+    'Side': 'object',
+    'Timestamp IST': 'object',
+    'Start Position': 'float64',
+    'Direction': 'object',
+    'Closed PnL': 'float64',
+    'Transaction Hash': 'object',
+    'Order ID': 'Int64',
+    'Crossed': 'boolean',
+    'Fee': 'float64',
+    'Trade ID': 'float64',
+    'Timestamp': 'float64'
+}
+
+DEFAULT_CHUNKSIZE = 500_000
+
+# Bump when parsing changes so stale cache entries are rebuilt
+CACHE_VERSION = 1
+
 class DataLoader:
-    def __init__(self, trader_data_path, sentiment_data_path):
+    def __init__(self, trader_data_path, sentiment_data_path, cache_dir='data/cache', dtypes=None):
+        # A single CSV, a directory of CSV partitions or a glob pattern
         self.trader_data_path = trader_data_path
         self.sentiment_data_path = sentiment_data_path
+        self.cache_dir = cache_dir
+        # Trader dtype map, e.g. one profiled by inspect_data.py (see load_schema)
+        self.dtypes = dtypes or TRADER_DTYPES
+        
+        if self.cache_dir and pq is None:
+            print("pyarrow not installed; columnar caching disabled")
+            self.cache_dir = None
     
+    def trader_partitions(self):
+        """Trader CSV files behind ``trader_data_path``, in a stable order"""
+        path = self.trader_data_path
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, '*.csv')))
+        elif glob.has_magic(path):
+            paths = sorted(glob.glob(path))
+        else:
+            paths = [path]
+        
+        if not paths:
+            raise ValueError(f"No trader data files found at {path}")
+        return paths
+    
+    @traced
     def load_trader_data(self):
         """Load trader data with timestamp inspection"""
         try:
-            df = pd.read_csv(self.trader_data_path)
+            frames = [self.read_trader_file(path) for path in self.trader_partitions()]
+            df = concat_partitions(frames)
             print(f"\nTrader data loaded: {df.shape}")
             
             # Inspect timestamp columns
@@ -26,10 +96,60 @@ class DataLoader:
         except Exception as e:
             raise ValueError(f"Failed to load trader data: {str(e)}")
     
+    @traced
+    def read_trader_file(self, path):
+        """Parse one trader CSV with the explicit schema, via the columnar cache"""
+        return self._read_cached(
+            path,
+            lambda p: pd.read_csv(p, dtype=trader_dtypes(p, self.dtypes)),
+            schema=self.dtypes
+        )
+    
+    def iter_trader_chunks(self, chunksize=DEFAULT_CHUNKSIZE, offset=0):
+        """Stream trader data in fixed-size chunks for bounded-memory runs
+        
+        Partitions are streamed one after another. ``offset`` is a byte
+        position just past a complete row of a single-file export, used to
+        read only the fills appended since a previous run.
+        """
+        paths = self.trader_partitions()
+        if offset and len(paths) > 1:
+            raise ValueError("Resuming at a byte offset requires a single trader file")
+        
+        for path in paths:
+            yield from self._iter_file_chunks(path, chunksize, offset)
+    
+    def _iter_file_chunks(self, path, chunksize, offset):
+        if offset >= os.path.getsize(path):
+            return
+        
+        handle = open(path, 'rb')
+        try:
+            if offset:
+                header = pd.read_csv(path, nrows=0).columns.tolist()
+                handle.seek(offset)
+                reader = pd.read_csv(
+                    handle,
+                    names=header,
+                    header=None,
+                    dtype=trader_dtypes(path, self.dtypes),
+                    chunksize=chunksize
+                )
+            else:
+                reader = pd.read_csv(handle, dtype=trader_dtypes(path, self.dtypes), chunksize=chunksize)
+        except Exception as e:
+            handle.close()
+            raise ValueError(f"Failed to load trader data: {str(e)}")
+        
+        with handle, reader:
+            for chunk in reader:
+                yield chunk
+    
+    @traced
     def load_sentiment_data(self):
         """Load sentiment data"""
         try:
-            df = pd.read_csv(self.sentiment_data_path)
+            df = self._read_cached(self.sentiment_data_path, pd.read_csv)
             print(f"\nSentiment data loaded: {df.shape}")
             
             # Inspect date columns
@@ -46,4 +166,231 @@ class DataLoader:
         """Load both datasets"""
         trader_data = self.load_trader_data()
         sentiment_data = self.load_sentiment_data()
-        return trader_data, sentiment_data
\ No newline at end of file
+        return trader_data, sentiment_data
+    
+    def _read_cached(self, path, reader, schema=None):
+        """Parse ``path`` with ``reader`` or serve it from the columnar cache
+        
+        Cache entries are keyed on the source's size, mtime and content hash.
+        A matching size and mtime is trusted as-is; otherwise the file is
+        re-hashed, so a touched but unchanged file still hits the cache.
+        """
+        if not self.cache_dir:
+            return reader(path)
+        
+        name = os.path.basename(path)
+        # Partitions in different directories may share a file name
+        key = f"{name}-{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]}"
+        cache_path = os.path.join(self.cache_dir, f"{key}.parquet")
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+        
+        stat = os.stat(path)
+        fingerprint = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'version': CACHE_VERSION,
+            'schema': schema
+        }
+        
+        cached = None
+        if os.path.exists(meta_path) and os.path.exists(cache_path):
+            with open(meta_path) as f:
+                cached = json.load(f)
+        
+        if cached is not None and all(cached.get(k) == v for k, v in fingerprint.items()):
+            return pd.read_parquet(cache_path, memory_map=True)
+        
+        fingerprint['sha1'] = file_digest(path)
+        if cached is not None and cached.get('sha1') == fingerprint['sha1'] and \
+                all(cached.get(k) == fingerprint[k] for k in ('size', 'version', 'schema')):
+            self._write_meta(meta_path, fingerprint)
+            return pd.read_parquet(cache_path, memory_map=True)
+        
+        df = reader(path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df.to_parquet(cache_path, index=False)
+        self._write_meta(meta_path, fingerprint)
+        print(f"Cached parsed {name} to {cache_path}")
+        return df
+    
+    def _write_meta(self, meta_path, fingerprint):
+        with open(meta_path, 'w') as f:
+            json.dump(fingerprint, f, indent=2)
+    
+    @traced
+    def save_merged(self, df, base_path='data/processed/merged_data', fmt='parquet'):
+        """Write merged data as Parquet, or CSV when explicitly requested"""
+        path = f"{base_path}.{fmt}"
+        write_frame(df, path, fmt)
+        return path
+    
+    @traced
+    def append_merged(self, df, path=STORE_PATH, rebuild=False):
+        """Append merged data to the partitioned store at ``path``
+        
+        Only days from the store's last day on are written (see
+        ``MergedStore``); ``rebuild`` rewrites the store from ``df``.
+        Returns the finished StoreWriter, whose ``appended`` counts new rows.
+        """
+        return MergedStore(path).append(df, rebuild)
+    
+    @traced
+    def load_merged(self, path=STORE_PATH, columns=None, start=None, end=None, sentiments=None, accounts=None):
+        """Read merged data written by a previous run
+        
+        ``path`` is the partitioned store, a Parquet or CSV file, or the
+        directory of ``part-*`` files written for partitioned input.
+        ``columns`` selects columns; ``start`` and ``end`` (inclusive dates),
+        ``sentiments`` and ``accounts`` select rows. On the store, partitions
+        outside the dates or sentiments are never opened and only the
+        requested columns are read.
+        """
+        if MergedStore.exists(path):
+            return MergedStore(path).read(columns, start, end, sentiments, accounts)
+        
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, 'part-*')))
+        else:
+            paths = [path] if os.path.exists(path) else []
+        if not paths:
+            raise ValueError(f"No merged data found at {path}; run main.py first")
+        
+        # Filter columns are read too, and dropped once rows are selected
+        filters = {'date': start is not None or end is not None, 'Classification': sentiments is not None,
+                   'account': accounts is not None}
+        read_columns = None if columns is None else list(dict.fromkeys(
+            list(columns) + [col for col, used in filters.items() if used]
+        ))
+        frames = []
+        for part in paths:
+            if part.endswith('.csv'):
+                df = pd.read_csv(part, usecols=read_columns)
+                if 'date' in df.columns:
+                    df['date'] = pd.to_datetime(df['date'])
+                if 'timestamp' in df.columns:
+                    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+                for col in ('account', 'symbol', 'Classification'):
+                    if col in df.columns:
+                        df[col] = df[col].astype('category')
+            else:
+                df = pd.read_parquet(part, columns=read_columns)
+            df = filter_merged(df, start, end, sentiments, accounts)
+            frames.append(df if columns is None else df[list(columns)])
+        return concat_partitions(frames)
+    
+    def merged_writer(self, base_path='data/processed/merged_data', fmt='parquet', store_path=STORE_PATH,
+                      rebuild=False):
+        """Incremental writer for merged chunks produced by streaming runs
+        
+        Parquet chunks are appended to the partitioned store at
+        ``store_path``; CSV chunks to a single ``base_path`` file.
+        """
+        if fmt != 'csv':
+            if pq is None:
+                raise ValueError("Writing Parquet requires pyarrow; use fmt='csv'")
+            return MergedStore(store_path).writer(rebuild)
+        return MergedWriter(f"{base_path}.{fmt}", fmt)
+
+class MergedWriter:
+    """Append merged chunks to a single CSV or Parquet file"""
+    
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+        self.schema = None
+        self.chunks = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    def write(self, df):
+        if self.fmt == 'csv':
+            df.to_csv(self.path, mode='w' if self.chunks == 0 else 'a', header=(self.chunks == 0), index=False)
+        else:
+            if self.writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self.schema = table.schema
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                # Cast to the first chunk's schema so all-null chunks still line up
+                table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            self.writer.write_table(table)
+        self.chunks += 1
+    
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def trader_dtypes(path, dtypes=TRADER_DTYPES):
+    """Restrict the dtype schema to the columns present in the file header"""
+    header = pd.read_csv(path, nrows=0).columns
+    return {col: dtype for col, dtype in dtypes.items() if col in header}
+
+def load_schema(path):
+    """Trader dtype map from a schema written by inspect_data.py
+    
+    The file is the profiler's JSON report; its ``dtypes`` entry has the
+    same form as ``TRADER_DTYPES`` and can be passed as ``DataLoader(dtypes=...)``.
+    """
+    try:
+        with open(path) as f:
+            dtypes = json.load(f)['dtypes']
+        for dtype in dtypes.values():
+            pd.api.types.pandas_dtype(dtype)
+    except (OSError, KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Failed to load trader schema from {path}: {str(e)}")
+    return dtypes
+
+def filter_merged(df, start=None, end=None, sentiments=None, accounts=None):
+    """Rows of a merged frame within the dates, sentiments and accounts given"""
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= df['date'] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= df['date'] <= pd.Timestamp(end)
+    if sentiments is not None:
+        keep &= df['Classification'].isin(np.atleast_1d(sentiments))
+    if accounts is not None:
+        keep &= df['account'].isin(np.atleast_1d(accounts))
+    return df if keep.all() else df[keep]
+
+def concat_partitions(frames):
+    """Concatenate partition frames, keeping interned columns categorical
+    
+    Each partition interns its own category set; plain ``pd.concat`` would
+    fall back to object strings, so the categories are unified first.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([f[col] for f in frames if col in f]).categories
+            for f in frames:
+                if col in f:
+                    f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+def write_frame(df, path, fmt='parquet'):
+    """Write ``df`` to ``path`` as Parquet or CSV"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif pq is not None:
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError("Writing Parquet requires pyarrow; use fmt='csv'")
+
+def file_digest(path, block_size=1 << 23):
+    """SHA-1 of a file's contents, read in fixed-size blocks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
\ No newline at end of file
@@ -0,0 +1,320 @@
+import numpy as np
+import pandas as pd
+
+try:
+    from src.preprocessor import NS_PER_DAY
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from preprocessor import NS_PER_DAY
+
+EVENT_WINDOW = 7
+# Fear/greed value separating the fear and greed halves of the index
+CROSSING_LEVEL = 50
+SENTIMENT_LAGS = (1, 3, 7)
+
+def daily_readings(sentiment_df):
+    """One reading per day (the first, as in the join), sorted by day"""
+    readings = sentiment_df[[col for col in ('day', 'value', 'Classification') if col in sentiment_df.columns]]
+    return readings.dropna(subset=['day']).sort_values('day', kind='stable').drop_duplicates('day')
+
+def regime_transitions(sentiment_df, level=CROSSING_LEVEL):
+    """Days on which the fear/greed regime changes
+
+    Compares each reading with the previous one. A change of
+    Classification is a 'class' event labelled e.g. 'Fear -> Extreme Fear';
+    a move of ``value`` from below ``level`` to at least ``level`` (or
+    back) is a 'cross' event labelled 'cross above 50' / 'cross below 50'.
+    Returns one row per event with the day it takes effect.
+    """
+    readings = daily_readings(sentiment_df)
+    day = readings['day'].to_numpy(dtype='int64')
+    events = []
+
+    if 'Classification' in readings.columns:
+        label = readings['Classification'].astype(str).to_numpy()
+        changed = np.flatnonzero(label[1:] != label[:-1]) + 1
+        events.append(pd.DataFrame({
+            'day': day[changed],
+            'kind': 'class',
+            'transition': [f"{a} -> {b}" for a, b in zip(label[changed - 1], label[changed])]
+        }))
+
+    if 'value' in readings.columns:
+        above = readings['value'].to_numpy(dtype='float64') >= level
+        crossed = np.flatnonzero(above[1:] != above[:-1]) + 1
+        events.append(pd.DataFrame({
+            'day': day[crossed],
+            'kind': 'cross',
+            'transition': np.where(above[crossed], f"cross above {level:g}", f"cross below {level:g}")
+        }))
+
+    if not events:
+        raise ValueError("Sentiment data has neither Classification nor value columns")
+    events = pd.concat(events, ignore_index=True).sort_values(['day', 'kind'], kind='stable')
+    events['date'] = pd.to_datetime(events['day'] * NS_PER_DAY)
+    return events.reset_index(drop=True)
+
+def lagged_sentiment(sentiment_df, lags=SENTIMENT_LAGS):
+    """Lagged fear/greed features for every calendar day of the index
+
+    Lags are in calendar days, so a lag reaching a day without a reading is
+    NaN. ``days_in_regime`` counts days since the Classification last
+    changed. Indexed by day number, like the ``day`` column of merged data.
+    """
+    readings = daily_readings(sentiment_df)
+    first = int(readings['day'].min())
+    days = np.arange(first, int(readings['day'].max()) + 1)
+    features = pd.DataFrame(index=pd.Index(days, name='day'))
+    pos = readings['day'].to_numpy(dtype='int64') - first
+
+    if 'value' in readings.columns:
+        value = np.full(len(days), np.nan)
+        value[pos] = readings['value'].to_numpy(dtype='float64')
+        features['value'] = value
+        for lag in lags:
+            lagged = np.concatenate([np.full(min(lag, len(days)), np.nan), value[:max(len(days) - lag, 0)]])
+            features[f"value_lag{lag}"] = lagged
+            features[f"value_change_{lag}d"] = value - lagged
+
+    if 'Classification' in readings.columns:
+        label = readings['Classification'].astype(str).to_numpy()
+        start = np.zeros(len(days), dtype='int64')
+        changed = np.flatnonzero(label[1:] != label[:-1]) + 1
+        start[pos[changed]] = pos[changed]
+        # Each day counts from the latest change on or before it
+        features['days_in_regime'] = np.arange(len(days)) - np.maximum.accumulate(start)
+    return features
+
+class EventStudy:
+    """Account x day fill statistics for aligning event windows
+
+    Built from a SentimentCube, so streamed and partitioned runs get the
+    same study as in-memory ones. Days run over the traded range, padded by
+    ``2 * window`` days on each side so the window of any event within
+    ``window`` days of the traded range fits. The window around event day
+    ``d`` is days ``d - window`` to ``d + window``, so the windows of all
+    events are gathered with one integer index, and window sums are
+    differences of cumulative sums.
+
+    Only the active (account, day) cells are kept, sorted by account and
+    day; per-day totals over accounts are summed from them. Per-account
+    windows are summed over dense grids of blocks of accounts bounded by
+    ``CHUNK_CELLS``, so memory doesn't grow with accounts x days.
+    """
+
+    # Measure name -> (cube measure, stat); 'fills' is the cube's fill count
+    MEASURES = {
+        'pnl': ('closedPnL', 'sum'),
+        'volume': ('trade_value', 'sum'),
+        'wins': ('is_profitable', 'sum')
+    }
+    # Elements of the largest (accounts, days) or (accounts, events) array built at once
+    CHUNK_CELLS = 2**20
+
+    def __init__(self, cube, window=EVENT_WINDOW):
+        if not len(cube):
+            raise ValueError("Event study needs a non-empty sentiment cube")
+        self.window = window
+        self.accounts = cube.accounts
+        self.trade_start, self.trade_end = int(cube.day.min()), int(cube.day.max())
+        self.first_day = self.trade_start - 2 * window
+        self.n_days = self.trade_end + 2 * window + 1 - self.first_day
+
+        # Cells keyed by account * n_days + day column, in account/day order
+        self.keys, inverse = np.unique(cube.account * self.n_days + (cube.day - self.first_day), return_inverse=True)
+        cell = lambda weights: np.bincount(inverse, weights, minlength=len(self.keys))
+        self.cells = {'fills': cell(cube.fills)}
+        for name, (measure, stat) in self.MEASURES.items():
+            if measure in cube.measures:
+                self.cells[name] = cell(cube.stats[(measure, stat)])
+        # Padding days outside the traded range don't count towards averages
+        self.traded = np.zeros(self.n_days, dtype=bool)
+        self.traded[2 * window:self.n_days - 2 * window] = True
+
+    def grids(self, names, accounts):
+        """Dense (accounts, days) grids of the ``names`` cell measures for a range of accounts"""
+        lo, hi = np.searchsorted(self.keys, [accounts.start * self.n_days, accounts.stop * self.n_days])
+        flat = self.keys[lo:hi] - accounts.start * self.n_days
+        size = len(accounts) * self.n_days
+        return {
+            name: np.bincount(flat, self.cells[name][lo:hi], minlength=size).reshape(-1, self.n_days)
+            for name in names
+        }
+
+    def account_chunks(self, width):
+        """Ranges of accounts whose (accounts, ``width``) arrays stay within ``CHUNK_CELLS``"""
+        step = max(1, self.CHUNK_CELLS // max(width, 1))
+        return [range(lo, min(lo + step, len(self.accounts))) for lo in range(0, len(self.accounts), step)]
+
+    @property
+    def offsets(self):
+        return np.arange(-self.window, self.window + 1)
+
+    def in_range(self, events):
+        """Events whose window overlaps the traded days"""
+        day = events['day'].to_numpy(dtype='int64')
+        return events[(day >= self.trade_start - self.window) & (day <= self.trade_end + self.window)]
+
+    def columns(self, events):
+        """(events, offsets) grid columns of the windows around ``events``"""
+        return events['day'].to_numpy(dtype='int64')[:, None] - self.first_day + self.offsets
+
+    def totals(self):
+        """Per-day totals over accounts, plus the number of active accounts"""
+        day = self.keys % self.n_days
+        totals = {name: np.bincount(day, values, minlength=self.n_days) for name, values in self.cells.items()}
+        totals['active_accounts'] = np.bincount(day, self.cells['fills'] > 0, minlength=self.n_days)
+        return totals
+
+    def profile(self, events):
+        """Mean daily totals at each offset from the events, per transition
+
+        For each transition and offset: the number of events with trades
+        in range that day, the mean (over those events) of the day's total
+        PnL, volume, fills and active accounts, and the pooled win rate and
+        PnL per active account.
+        """
+        events = self.in_range(events)
+        labels, transitions = pd.factorize(events['transition'], sort=True)
+        n_offsets = len(self.offsets)
+        columns = self.columns(events)
+        covered = self.traded[columns]
+        # Flat (transition, offset) group of every gathered value
+        groups = (labels[:, None] * n_offsets + np.arange(n_offsets)).ravel()
+        total = lambda values: np.bincount(
+            groups, np.where(covered, values, 0).ravel(), minlength=len(transitions) * n_offsets
+        ).reshape(-1, n_offsets)
+
+        totals = self.totals()
+        sums = {name: total(values[columns]) for name, values in totals.items()}
+        n_events = total(np.ones(columns.shape))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = {'events': n_events.astype('int64')}
+            for name in ('pnl', 'volume', 'fills', 'active_accounts'):
+                if name in sums:
+                    result[name] = sums[name] / n_events
+            if 'wins' in sums:
+                result['win_rate'] = sums['wins'] / sums['fills']
+            if 'pnl' in sums:
+                result['pnl_per_account'] = sums['pnl'] / sums['active_accounts']
+
+        index = pd.MultiIndex.from_product([transitions, self.offsets], names=['transition', 'offset'])
+        return pd.DataFrame({name: values.ravel() for name, values in result.items()}, index=index)
+
+    def _window_sums(self, grid, columns):
+        """Sums of ``grid`` rows over the ``window`` days before and from each event day
+
+        ``columns`` are event-day columns; returns (pre, post) arrays with
+        the leading dimensions of ``grid`` and one column per event.
+        """
+        cum = np.concatenate([np.zeros(grid.shape[:-1] + (1,)), np.cumsum(grid, axis=-1)], axis=-1)
+        pre = cum[..., columns] - cum[..., columns - self.window]
+        post = cum[..., columns + self.window + 1] - cum[..., columns]
+        return pre, post
+
+    def summary(self, events):
+        """Before/after comparison of each transition's ``window``-day windows
+
+        ``pre`` covers the ``window`` days before the event, ``post`` the
+        event day and the ``window`` days after. Totals are daily means over
+        the traded days in each window. The per-account columns compare
+        each account's mean daily PnL and win rate across the two windows,
+        over (account, event) pairs with fills in both.
+        """
+        events = self.in_range(events)
+        labels, transitions = pd.factorize(events['transition'], sort=True)
+        day = events['day'].to_numpy(dtype='int64') - self.first_day
+        count = lambda values: np.bincount(labels, values, minlength=len(transitions))
+        rows = {'events': count(np.ones(len(day))).astype('int64')}
+
+        pre_days, post_days = self._window_sums(self.traded.astype('float64'), day)
+        totals = self.totals()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name in ('pnl', 'volume'):
+                if name in totals:
+                    pre, post = self._window_sums(totals[name], day)
+                    rows[f"{name}_pre"] = count(pre) / count(pre_days)
+                    rows[f"{name}_post"] = count(post) / count(post_days)
+            if 'wins' in totals:
+                wins_pre, wins_post = self._window_sums(totals['wins'], day)
+                fills_pre, fills_post = self._window_sums(totals['fills'], day)
+                rows['win_rate_pre'] = count(wins_pre) / count(fills_pre)
+                rows['win_rate_post'] = count(wins_post) / count(fills_post)
+
+            if 'pnl' in self.cells:
+                account_rows = self._account_changes(day, labels, len(transitions), pre_days, post_days)
+                pairs = account_rows.pop('pairs')
+                mean_change = account_rows['change'] / pairs
+                spread = account_rows['change_sq'] / pairs - mean_change ** 2
+                rows['account_pairs'] = pairs.astype('int64')
+                rows['account_pnl_change'] = mean_change
+                rows['account_pnl_change_t'] = mean_change / np.sqrt(np.maximum(spread, 0) / (pairs - 1))
+                rows['accounts_improved'] = account_rows['improved'] / pairs
+                if 'win_change' in account_rows:
+                    rows['account_win_rate_change'] = account_rows['win_change'] / pairs
+
+        return pd.DataFrame(rows, index=pd.Index(transitions, name='transition'))
+
+    def _account_changes(self, day, labels, n_transitions, pre_days, post_days):
+        """Per-transition sums over (account, event) pairs with fills in both windows
+
+        Sums the pairs, each pair's change in mean daily PnL (and its
+        square), the pairs whose PnL improved and, with wins, the change in
+        win rate. Accounts are taken in chunks, each with its dense grids.
+        """
+        names = [name for name in ('fills', 'pnl', 'wins') if name in self.cells]
+        sums = {key: np.zeros(n_transitions) for key in ('pairs', 'change', 'change_sq', 'improved')}
+        if 'wins' in names:
+            sums['win_change'] = np.zeros(n_transitions)
+        count = lambda values: np.bincount(labels, values, minlength=n_transitions)
+
+        for accounts in self.account_chunks(max(self.n_days, len(day))):
+            grids = self.grids(names, accounts)
+            fills_pre, fills_post = self._window_sums(grids['fills'], day)
+            pnl_pre, pnl_post = self._window_sums(grids['pnl'], day)
+            paired = (fills_pre > 0) & (fills_post > 0)
+            change = np.where(paired, pnl_post / post_days - pnl_pre / pre_days, 0)
+            sums['pairs'] += count(paired.sum(axis=0))
+            sums['change'] += count(change.sum(axis=0))
+            sums['change_sq'] += count((change ** 2).sum(axis=0))
+            sums['improved'] += count(((change > 0) & paired).sum(axis=0))
+            if 'wins' in grids:
+                wins_pre, wins_post = self._window_sums(grids['wins'], day)
+                win_change = np.where(paired, wins_post / fills_post - wins_pre / fills_pre, 0)
+                sums['win_change'] += count(win_change.sum(axis=0))
+        return sums
+
+    def lag_correlations(self, features):
+        """Correlation of daily totals with lagged-sentiment ``features``
+
+        Uses the traded days with at least one fill; ``features`` is
+        indexed by day number, as returned by ``lagged_sentiment``.
+        """
+        totals = self.totals()
+        days = np.arange(len(self.traded)) + self.first_day
+        active = totals['fills'] > 0
+        daily = pd.DataFrame({name: totals[name][active] for name in ('pnl', 'volume', 'fills') if name in totals},
+                             index=pd.Index(days[active], name='day'))
+        if 'wins' in totals:
+            daily['win_rate'] = totals['wins'][active] / totals['fills'][active]
+
+        joined = daily.join(features, how='inner')
+        if joined.empty:
+            return pd.DataFrame()
+        return joined.corr().loc[features.columns, daily.columns].dropna(how='all')
+
+def sentiment_event_study(cube, sentiment_df, window=EVENT_WINDOW, level=CROSSING_LEVEL, lags=SENTIMENT_LAGS):
+    """Event windows around fear/greed regime transitions and lagged-sentiment correlations
+
+    Returns a dict with the transition ``events``, the per-offset
+    ``profile``, the before/after ``summary`` per transition and the
+    ``lag_correlations`` of daily totals.
+    """
+    study = EventStudy(cube, window)
+    events = regime_transitions(sentiment_df, level)
+    return {
+        'events': study.in_range(events).reset_index(drop=True),
+        'profile': study.profile(events),
+        'summary': study.summary(events),
+        'lag_correlations': study.lag_correlations(lagged_sentiment(sentiment_df, lags))
+    }
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import functools
+import threading
+import pandas as pd
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        import resource
+        # ru_maxrss is a high-water mark (KiB on Linux, bytes on macOS)
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+def peak_rss():
+    """High-water mark of this process's resident set size in bytes"""
+    try:
+        import resource
+    except ImportError:
+        return current_rss()
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+# Largest peak_rss() reported back by a pool worker. Workers are started by
+# a forkserver, not this process, so RUSAGE_CHILDREN never includes them
+_worker_peak = 0
+_worker_lock = threading.Lock()
+
+def record_worker_peak(rss):
+    """Note the ``peak_rss()`` a pool worker returned with its result"""
+    global _worker_peak
+    with _worker_lock:
+        _worker_peak = max(_worker_peak, rss)
+
+def worker_peak_rss():
+    """Largest peak RSS recorded from a pool worker, in bytes (0 without workers)"""
+    return _worker_peak
+
+class RssSampler:
+    """Track the peak RSS while a block runs by polling from a thread"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+def row_count(value):
+    """Rows of a DataFrame/Series result (or the first frame of a tuple)"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple) and value and isinstance(value[0], (pd.DataFrame, pd.Series)):
+        return len(value[0])
+    return None
+
+class Span:
+    """One timed operation; ``rows`` may be set by the caller before it ends"""
+
+    def __init__(self, tracer, op, parent, rows_in=None):
+        self.tracer = tracer
+        self.op = op
+        self.parent = parent
+        self.rows_in = rows_in
+        self.rows = None
+        self.error = None
+
+    def __enter__(self):
+        self.tracer._start_profile(self.op)
+        self.started = time.time()
+        self.wall = time.perf_counter()
+        # Thread CPU time, so concurrent pipeline stages don't bill each other
+        self.cpu = time.thread_time()
+        self.rss = RssSampler().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.rss.__exit__()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self, {
+            'op': self.op,
+            'parent': self.parent,
+            'start': round(self.started, 6),
+            'wall_s': round(time.perf_counter() - self.wall, 6),
+            'cpu_s': round(time.thread_time() - self.cpu, 6),
+            'peak_rss_delta_mb': round((self.rss.peak - self.rss.start) / 2**20, 2),
+            'rss_mb': round(self.rss.peak / 2**20, 2),
+            'rows_in': self.rows_in,
+            'rows': self.rows,
+            'thread': threading.current_thread().name,
+            'error': self.error
+        })
+        return False
+
+class Tracer:
+    """Collect per-operation wall/CPU time, peak RSS delta and row counts
+
+    Disabled by default, in which case spans cost one attribute check.
+    Records go to an in-memory list and, if ``trace_path`` is set, to a
+    JSON-lines file as each operation ends. Spans nest per thread, so each
+    record names its parent operation. Peak RSS is process-wide, so spans
+    running concurrently see each other's allocations.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.trace_path = None
+        self.profile_op = None
+        self.profile_dir = 'data/outputs/profiles'
+        self._file = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, trace_path=None, profile=None, profile_dir='data/outputs/profiles'):
+        """Enable tracing; ``profile`` names an operation to run under cProfile"""
+        self.close()
+        self.enabled = True
+        self.records = []
+        self.trace_path = trace_path
+        self.profile_op = profile
+        self.profile_dir = profile_dir
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+            self._file = open(trace_path, 'w')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def span(self, op, rows_in=None):
+        if not self.enabled:
+            return NULL_SPAN
+        stack = self._stack()
+        return Span(self, op, stack[-1].op if stack else None, rows_in)
+
+    def summary(self):
+        """Records aggregated per operation, slowest first"""
+        if not self.records:
+            return pd.DataFrame()
+        records = pd.DataFrame(self.records)
+        summary = records.groupby('op').agg(
+            calls=('wall_s', 'size'),
+            wall_s=('wall_s', 'sum'),
+            cpu_s=('cpu_s', 'sum'),
+            peak_rss_delta_mb=('peak_rss_delta_mb', 'max'),
+            rows=('rows', lambda rows: rows.sum(min_count=1))
+        )
+        summary['rows'] = summary['rows'].astype('Int64')
+        return summary.sort_values('wall_s', ascending=False).round(3)
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _matches_profile(self, op):
+        return self.profile_op is not None and (op == self.profile_op or op.endswith('.' + self.profile_op))
+
+    def _start_profile(self, op):
+        self._stack().append(_Frame(op))
+        if not self._matches_profile(op):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active (e.g. a nested match)
+            return
+        self._stack()[-1].profiler = profiler
+
+    def _finish(self, span, record):
+        frame = self._stack().pop()
+        if frame.profiler is not None:
+            frame.profiler.disable()
+            self._dump_profile(span.op, frame.profiler)
+        with self._lock:
+            self.records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record) + '\n')
+                self._file.flush()
+
+    def _dump_profile(self, op, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{op}.prof")
+        profiler.dump_stats(path)
+        print(f"\nProfile of {op} saved to {path} (top 15 by cumulative time):")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+
+class _Frame:
+    def __init__(self, op):
+        self.op = op
+        self.profiler = None
+
+class _NullSpan:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+tracer = Tracer()
+
+def traced(func):
+    """Record calls of ``func`` as ``Class.method`` spans on the global tracer
+
+    Row counts come from the returned frame, and the input rows from the
+    first DataFrame argument.
+    """
+    op = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return func(*args, **kwargs)
+        rows_in = next((len(a) for a in args if isinstance(a, pd.DataFrame)), None)
+        with tracer.span(op, rows_in=rows_in) as span:
+            result = func(*args, **kwargs)
+            span.rows = row_count(result)
+        return result
+    return wrapper
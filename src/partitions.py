@@ -0,0 +1,76 @@
+import os
+import glob
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from src.data_loader import DataLoader, write_frame
+    from src.store import write_partitions
+    from src.preprocessor import DataPreprocessor
+    from src.aggregates import MergedAggregates
+    from src.instrumentation import peak_rss, record_worker_peak
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from data_loader import DataLoader, write_frame
+    from store import write_partitions
+    from preprocessor import DataPreprocessor
+    from aggregates import MergedAggregates
+    from instrumentation import peak_rss, record_worker_peak
+
+def process_partition(path, sentiment_lookup, cache_dir=None, output_path=None, fmt='parquet', compact=False,
+                      dtypes=None, store_target=None):
+    """Parse, preprocess, join and aggregate a single trader partition
+    
+    Runs in a worker process. The merged partition is written to
+    ``output_path`` if given, or into the merged store's partitions with
+    ``store_target`` (``StoreWriter.target``). Only the small aggregates,
+    the list of files written and the worker's peak RSS are sent back.
+    """
+    loader = DataLoader(path, None, cache_dir=cache_dir, dtypes=dtypes)
+    preprocessor = DataPreprocessor(compact=compact)
+    
+    df = preprocessor.preprocess_trader_data(loader.read_trader_file(path), verbose=False)
+    df, merge_stats = preprocessor.join_sentiment(df, sentiment_lookup)
+    
+    written = None
+    if store_target:
+        written = write_partitions(df, **store_target)
+    elif output_path:
+        write_frame(df, output_path, fmt)
+    return MergedAggregates().update(df, merge_stats), written, peak_rss()
+
+def process_partitions(paths, sentiment_lookup, workers=None, cache_dir=None, output_dir=None, fmt='parquet',
+                       compact=False, dtypes=None, store=None):
+    """Process trader partitions across a process pool and combine the partials
+    
+    Partials are combined in partition order, so results do not depend on
+    which worker finishes first. Merged partitions are written to
+    ``output_dir`` as ``part-NNNNN`` files, or appended through the
+    StoreWriter ``store``, which the caller closes. ``compact`` selects
+    compact preprocessing in the workers and ``dtypes`` overrides their
+    trader dtype map.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(output_dir, 'part-*')):
+            os.remove(stale)
+    
+    aggregates = MergedAggregates()
+    # The merge stage runs in a pipeline thread; forking there can deadlock on other threads' locks
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        futures = [
+            pool.submit(
+                process_partition, path, sentiment_lookup, cache_dir,
+                os.path.join(output_dir, f"part-{i:05d}.{fmt}") if output_dir else None,
+                fmt, compact, dtypes, store.target(i) if store else None
+            )
+            for i, path in enumerate(paths)
+        ]
+        for path, future in zip(paths, futures):
+            partial, written, rss = future.result()
+            record_worker_peak(rss)
+            aggregates.merge(partial)
+            if store:
+                store.add(written)
+            print(f"  {os.path.basename(path)}: {partial.rows:,} rows")
+    return aggregates
@@ -0,0 +1,244 @@
+import os
+import io
+import sys
+import glob
+import json
+import pickle
+import hashlib
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from src.instrumentation import tracer, row_count
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from instrumentation import tracer, row_count
+
+def file_fingerprint(path):
+    """Cheap identity of an input file: path, size and mtime"""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def output_fingerprint(path):
+    """Size and mtime of an output file, or of every file under an output directory
+
+    None if the output doesn't exist.
+    """
+    if os.path.isdir(path):
+        return [file_fingerprint(os.path.join(directory, name))
+                for directory, _, names in sorted(os.walk(path)) for name in sorted(names)]
+    return file_fingerprint(path) if os.path.exists(path) else None
+
+def source_fingerprint(paths):
+    """Hash of source files, so code changes invalidate memoized stages"""
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def function_source(func):
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return getattr(func, '__qualname__', repr(func))
+
+class StageOutput:
+    """``sys.stdout`` stand-in that collects each capturing thread's prints
+
+    Stages run concurrently, so their console output is buffered per
+    thread and written out in one piece when the stage finishes. Threads
+    that aren't capturing write straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, 'buffer', None) or self.stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def capture(self, func, *args):
+        """``func(*args)`` and everything it printed
+
+        On an exception the partial output is written out first.
+        """
+        self._local.buffer = io.StringIO()
+        try:
+            result = func(*args)
+        except BaseException:
+            self.stream.write(self._local.buffer.getvalue())
+            raise
+        finally:
+            buffer, self._local.buffer = self._local.buffer, None
+        return result, buffer.getvalue()
+
+class Stage:
+    def __init__(self, name, func, inputs=(), params=None, outputs=(), code=(), memoize=True, codec=None):
+        self.name = name
+        self.func = func
+        # Helper functions whose source also belongs in the fingerprint
+        self.code = [func] + list(code) + list(codec or ())
+        self.inputs = list(inputs)
+        self.params = params or {}
+        # Files the stage writes; a memo hit also requires them to be
+        # unchanged since the stage wrote them
+        self.outputs = list(outputs)
+        self.memoize = memoize
+        # (encode, decode) applied around the memo pickle, e.g. to memoize a
+        # reference to data the stage already wrote to disk
+        self.codec = codec
+
+class Pipeline:
+    """Small DAG executor with an on-disk memo store
+
+    Each stage is fingerprinted from its name, parameters, function source,
+    a shared code version and its inputs' fingerprints. Stages whose
+    fingerprint has a memo, and whose output files haven't changed since,
+    are not run; their results are only unpickled when a stage that does
+    need to run consumes them. Stages whose inputs are ready run
+    concurrently on a thread pool, and each one's console output is
+    printed in one block when it finishes.
+    """
+
+    def __init__(self, memo_dir='data/cache/stages', max_workers=4, code_version='', force=False):
+        self.memo_dir = memo_dir
+        self.max_workers = max_workers
+        self.code_version = code_version
+        self.force = force
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), params=None, outputs=(), code=(), memoize=True, codec=None):
+        for dep in inputs:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name, func, inputs, params, outputs, code, memoize, codec)
+        return self
+
+    def fingerprints(self):
+        """Fingerprint of every stage, in declaration (topological) order"""
+        fingerprints = {}
+        for name, stage in self.stages.items():
+            payload = json.dumps({
+                'name': name,
+                'params': stage.params,
+                'code': [function_source(func) for func in stage.code],
+                'code_version': self.code_version,
+                'inputs': [fingerprints[dep] for dep in stage.inputs]
+            }, sort_keys=True, default=str)
+            fingerprints[name] = hashlib.sha1(payload.encode()).hexdigest()[:16]
+        return fingerprints
+
+    def run(self, targets=None):
+        """Bring ``targets`` (default: all stages) up to date
+
+        Returns the outputs of every stage that was run or loaded from memo;
+        up-to-date stages nobody needed are left on disk.
+        """
+        targets = list(targets or self.stages)
+        fingerprints = self.fingerprints()
+        hits = {name: self._is_memoized(name, fingerprints[name]) for name in self.stages}
+
+        # Decide what to do per stage: 'skip' < 'load' < 'run'
+        rank = {'skip': 0, 'load': 1, 'run': 2}
+        actions = {}
+
+        def require(name, need_value):
+            # Unmemoized stages (e.g. raw loads) only run to feed a consumer
+            if not self.stages[name].memoize and not need_value:
+                return
+            action = 'run' if not hits[name] else ('load' if need_value else 'skip')
+            if rank[action] <= rank[actions.get(name, 'skip')] and name in actions:
+                return
+            actions[name] = action
+            if action == 'run':
+                for dep in self.stages[name].inputs:
+                    require(dep, True)
+
+        for name in targets:
+            require(name, False)
+
+        for name, action in actions.items():
+            if action == 'skip':
+                print(f"[{name}] up to date")
+
+        results = {}
+        pending = [name for name in self.stages if actions.get(name) in ('load', 'run')]
+        output = sys.stdout = StageOutput(sys.stdout)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {}
+                while pending or futures:
+                    for name in list(pending):
+                        stage = self.stages[name]
+                        if actions[name] == 'load':
+                            print(f"[{name}] served from memo")
+                            futures[pool.submit(output.capture, self._load, stage, fingerprints[name])] = name
+                            pending.remove(name)
+                        elif all(dep in results for dep in stage.inputs):
+                            args = [results[dep] for dep in stage.inputs]
+                            futures[pool.submit(output.capture, self._execute, stage, fingerprints[name], args)] = name
+                            pending.remove(name)
+
+                    if not futures:
+                        raise RuntimeError(f"Pipeline stalled with pending stages: {pending}")
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = futures.pop(future)
+                        results[name], text = future.result()
+                        output.stream.write(text)
+        finally:
+            sys.stdout = output.stream
+        return results
+
+    def _memo_path(self, name, fingerprint, ext='pkl'):
+        return os.path.join(self.memo_dir, f"{name}-{fingerprint}.{ext}")
+
+    def _is_memoized(self, name, fingerprint):
+        stage = self.stages[name]
+        if self.force or not stage.memoize:
+            return False
+        outputs_path = self._memo_path(name, fingerprint, 'outputs.json')
+        if not (os.path.exists(self._memo_path(name, fingerprint)) and os.path.exists(outputs_path)):
+            return False
+        # Outputs rewritten or deleted by anything else (e.g. --incremental) invalidate the memo
+        with open(outputs_path) as f:
+            written = json.load(f)
+        current = {path: output_fingerprint(path) for path in stage.outputs}
+        return all(fp is not None for fp in current.values()) and \
+            json.loads(json.dumps(current)) == written
+
+    def _load(self, stage, fingerprint):
+        with tracer.span(f"stage.{stage.name}.memo"), open(self._memo_path(stage.name, fingerprint), 'rb') as f:
+            memo = pickle.load(f)
+        return stage.codec[1](memo) if stage.codec else memo
+
+    def _execute(self, stage, fingerprint, args):
+        with tracer.span(f"stage.{stage.name}") as span:
+            result = stage.func(*args, **stage.params)
+            span.rows = row_count(result)
+        if stage.memoize:
+            os.makedirs(self.memo_dir, exist_ok=True)
+            # Keep only the latest memo per stage
+            for stale in glob.glob(os.path.join(self.memo_dir, f"{stage.name}-*")):
+                os.remove(stale)
+            path = self._memo_path(stage.name, fingerprint)
+            memo = stage.codec[0](result) if stage.codec else result
+            with open(f"{path}.tmp", 'wb') as f:
+                pickle.dump(memo, f, protocol=pickle.HIGHEST_PROTOCOL)
+            outputs = {output: output_fingerprint(output) for output in stage.outputs}
+            with open(self._memo_path(stage.name, fingerprint, 'outputs.json'), 'w') as f:
+                json.dump(outputs, f)
+            # The pickle goes last: without it the memo doesn't count
+            os.replace(f"{path}.tmp", path)
+        return result
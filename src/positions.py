@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+
+try:
+    from src.risk import segment_starts, segmented_cumsum
+    from src.preprocessor import NS_PER_DAY
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from risk import segment_starts, segmented_cumsum
+    from preprocessor import NS_PER_DAY
+
+# Positions smaller than this (in tokens) count as flat; cumsum round-off
+# otherwise leaves dust after a full close
+FLAT_TOLERANCE = 1e-8
+
+def asof_index(event_keys, event_times, query_keys, query_times):
+    """Index of the last event with the same key at or before each query
+
+    Events must be sorted by (key, time). Both sides are merged in one
+    lexsort, with events ordered before queries at equal times. Queries
+    without such an event get -1.
+    """
+    n_events = len(event_times)
+    keys = np.concatenate((event_keys, query_keys))
+    times = np.concatenate((event_times, query_times))
+    is_query = np.concatenate((np.zeros(n_events, dtype=bool), np.ones(len(query_times), dtype=bool)))
+    order = np.lexsort((is_query, times, keys))
+
+    last_event = np.maximum.accumulate(np.where(order < n_events, order, -1))
+    found = np.empty(len(query_times), dtype='int64')
+    queries = order >= n_events
+    found[order[queries] - n_events] = last_event[queries]
+    # An event of the previous key is no match
+    valid = found >= 0
+    valid[valid] = event_keys[found[valid]] == query_keys[valid]
+    return np.where(valid, found, -1)
+
+class PositionBook:
+    """Reconstructed position paths for every account x coin
+
+    Per-fill arrays are in book order: fills sorted by account, coin and
+    time, so each account x coin (a "segment", one row of ``keys``) is a
+    contiguous run. ``order`` maps book rows back to rows of the source
+    frame.
+
+    - segment: segment id of each fill
+    - time: fill time, ns since the epoch (UTC)
+    - signed: signed fill size in tokens (buys positive)
+    - position: position in tokens after the fill
+    - exposure: |position| x execution price after the fill (USD)
+    - held_ns: how long the post-fill position was held, until the next
+      fill of the segment or ``as_of``
+    - realized, fees: closed PnL and fee of each fill
+    - start_drift: |reported start position - reconstructed| per fill
+    """
+
+    def __init__(self, keys, order, segment, time, signed, position, exposure, held_ns,
+                 realized, fees, start_drift, as_of):
+        self.keys = keys
+        self.order = order
+        self.segment = segment
+        self.time = time
+        self.signed = signed
+        self.position = position
+        self.exposure = exposure
+        self.held_ns = held_ns
+        self.realized = realized
+        self.fees = fees
+        self.start_drift = start_drift
+        self.as_of = as_of
+
+    def __len__(self):
+        return len(self.time)
+
+    def segment_bounds(self):
+        """Book index of the first and last fill of every segment"""
+        starts = np.flatnonzero(np.r_[True, self.segment[1:] != self.segment[:-1]])
+        return starts, np.append(starts[1:], len(self.segment)) - 1
+
+    def holding_periods(self):
+        """Open and close times of every round trip, as a compact frame
+
+        A round trip runs from the fill that takes a segment off flat to the
+        fill that returns it to flat or flips its sign (which also opens the
+        next one). Trips still open at ``as_of`` have a NaT ``close_time``.
+        """
+        before = self.position - self.signed
+        flat_before = np.abs(before) < FLAT_TOLERANCE
+        flat_after = np.abs(self.position) < FLAT_TOLERANCE
+        flips = ~flat_before & ~flat_after & (np.sign(before) != np.sign(self.position))
+        opens = np.flatnonzero((flat_before & ~flat_after) | flips)
+        closes = np.flatnonzero((~flat_before & flat_after) | flips)
+        # A segment that starts mid-position (reported start_position) has a
+        # close without an open; drop closes that precede every open
+        open_seg, close_seg = self.segment[opens], self.segment[closes]
+        first_open = np.full(len(self.keys), np.iinfo('int64').max)
+        np.minimum.at(first_open, open_seg, opens)
+        closes = closes[closes > first_open[close_seg]]
+        close_seg = self.segment[closes]
+
+        # Opens and closes alternate within a segment, so the k-th close of
+        # a segment pairs with its k-th open
+        open_rank = np.arange(len(opens)) - np.searchsorted(open_seg, open_seg)
+        close_rank = np.arange(len(closes)) - np.searchsorted(close_seg, close_seg)
+        close_time = np.full(len(opens), np.iinfo('int64').min)
+        close_time[np.searchsorted(open_seg, close_seg) + close_rank] = self.time[closes]
+
+        trips = pd.DataFrame({
+            'segment': open_seg,
+            'trip': open_rank,
+            'open_time': pd.to_datetime(self.time[opens], utc=True),
+            'close_time': pd.to_datetime(close_time, utc=True)
+        })
+        trips['holding_hours'] = (trips['close_time'] - trips['open_time']).dt.total_seconds() / 3600
+        return trips
+
+    def segments(self):
+        """One row per account x coin: exposure, holding and PnL breakdown
+
+        ``avg_exposure`` and ``time_in_market`` are time-weighted over the
+        window from the segment's first fill to ``as_of``.
+        """
+        n = len(self.keys)
+        starts, ends = self.segment_bounds()
+        window = (self.as_of - self.time[starts]).astype('float64')
+        exposure_ns = np.bincount(self.segment, self.exposure * self.held_ns, minlength=n)
+        open_ns = np.bincount(self.segment, np.where(self.position != 0, self.held_ns, 0), minlength=n)
+        trips = self.holding_periods().dropna(subset=['close_time'])
+
+        summary = self.keys.copy()
+        summary['fills'] = np.bincount(self.segment, minlength=n)
+        summary['first_fill'] = pd.to_datetime(self.time[starts], utc=True)
+        summary['last_fill'] = pd.to_datetime(self.time[ends], utc=True)
+        summary['final_position'] = self.position[ends]
+        summary['max_abs_position'] = np.maximum.reduceat(np.abs(self.position), starts)
+        summary['max_exposure'] = np.maximum.reduceat(self.exposure, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            summary['avg_exposure'] = exposure_ns / window
+            summary['time_in_market'] = open_ns / window
+        summary['round_trips'] = np.bincount(trips['segment'], minlength=n)
+        summary['avg_holding_hours'] = trips.groupby('segment')['holding_hours'].mean().reindex(range(n)).to_numpy()
+        summary['realized_pnl'] = np.bincount(self.segment, self.realized, minlength=n)
+        summary['fees'] = np.bincount(self.segment, self.fees, minlength=n)
+        summary['net_pnl'] = summary['realized_pnl'] - summary['fees']
+        summary['start_position_drift'] = np.maximum.reduceat(self.start_drift, starts)
+        return summary.round(6)
+
+    def by_account(self):
+        """Account-level exposure and PnL breakdown across all coins
+
+        ``avg_exposure`` is the total USD exposure over all coins, averaged
+        over the time from the account's first fill to ``as_of``.
+        """
+        seg = self.segments()
+        seg['exposure_ns'] = seg['avg_exposure'].fillna(0) * (self.as_of - seg['first_fill'].astype('int64'))
+        accounts = seg.groupby('account', observed=True).agg(
+            coins=('coin', 'size'),
+            first_fill=('first_fill', 'min'),
+            exposure_ns=('exposure_ns', 'sum'),
+            round_trips=('round_trips', 'sum'),
+            realized_pnl=('realized_pnl', 'sum'),
+            fees=('fees', 'sum'),
+            net_pnl=('net_pnl', 'sum')
+        )
+        window = (self.as_of - accounts['first_fill'].astype('int64')).replace(0, np.nan)
+        accounts['avg_exposure'] = accounts.pop('exposure_ns') / window
+        return accounts.reset_index().round(6)
+
+    def daily_exposure(self):
+        """Time-weighted USD exposure per account and UTC day
+
+        Account exposure is piecewise constant between fills of any of its
+        coins, so its running integral is evaluated at day boundaries with
+        one as-of lookup. There is a row for every day from the account's
+        first fill to ``as_of`` (accounts x days rows), ready to join on the
+        daily sentiment by ``day``.
+        """
+        # Change in account exposure at each fill (first fills start from 0)
+        previous = np.concatenate(([0.0], self.exposure[:-1]))
+        previous[self.segment_bounds()[0]] = 0.0
+        account_codes = self.keys['account'].cat.codes.to_numpy()[self.segment]
+
+        order = np.lexsort((self.time, account_codes))
+        acct, times = account_codes[order], self.time[order]
+        acct_starts = segment_starts(acct)
+        rate = segmented_cumsum((self.exposure - previous)[order], acct_starts)
+        # Exposure-ns accumulated up to each event, restarting per account
+        gaps = np.diff(times, prepend=times[:1]).astype('float64')
+        step = np.concatenate(([0.0], rate[:-1])) * gaps
+        integral = segmented_cumsum(np.where(acct_starts == np.arange(len(acct)), 0.0, step), acct_starts)
+
+        first = np.flatnonzero(acct_starts == np.arange(len(acct)))
+        first_time = times[first]
+        first_day = first_time // NS_PER_DAY
+        n_days = self.as_of // NS_PER_DAY - first_day + 1
+        grid = np.repeat(np.arange(len(first)), n_days)
+        grid_day = first_day[grid] + np.arange(n_days.sum()) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+
+        day_start = np.maximum(grid_day * NS_PER_DAY, first_time[grid])
+        day_end = np.maximum(np.minimum((grid_day + 1) * NS_PER_DAY, self.as_of), day_start)
+        bounds = np.concatenate((day_start, day_end))
+        idx = asof_index(acct, times, np.tile(acct[first][grid], 2), bounds)
+        at_bounds = integral[idx] + rate[idx] * (bounds - times[idx])
+        exposure_ns = at_bounds[len(grid):] - at_bounds[:len(grid)]
+
+        return pd.DataFrame({
+            'account': pd.Categorical.from_codes(acct[first][grid], categories=self.keys['account'].cat.categories),
+            'day': grid_day.astype('int32'),
+            'avg_exposure': exposure_ns / NS_PER_DAY
+        })
+
+def build_position_book(df, as_of=None):
+    """Rebuild every account x coin position path from a merged fill frame
+
+    Fills are lexsorted by account, coin and time once; positions are then a
+    segmented cumulative sum of signed sizes, anchored at each segment's
+    first reported ``start_position`` so exports that begin mid-position
+    still give absolute positions. ``as_of`` (default: the last fill) ends
+    the holding time of final positions.
+    """
+    coin_col = 'symbol' if 'symbol' in df.columns else 'coin'
+    required = ['account', coin_col, 'side', 'size', 'execution_price', 'timestamp']
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for position reconstruction: {missing}")
+    if df.empty:
+        raise ValueError("No fills to reconstruct positions from")
+
+    account = df['account'].astype('category')
+    coin = df[coin_col].astype('category')
+    n_coins = max(len(coin.cat.categories), 1)
+    key = account.cat.codes.to_numpy().astype('int64') * n_coins + coin.cat.codes.to_numpy()
+    time = df['timestamp'].astype('int64').to_numpy()
+
+    order = np.lexsort((time, key))
+    key, time = key[order], time[order]
+    column = lambda name: df[name].to_numpy(dtype='float64')[order] if name in df.columns else np.zeros(len(order))
+
+    side = df['side'].astype('category')
+    buy_codes = np.flatnonzero(side.cat.categories.str.upper() == 'BUY')
+    buy = np.isin(side.cat.codes.to_numpy()[order], buy_codes)
+    size = column('size')
+    signed = np.where(buy, size, -size)
+
+    starts = segment_starts(key)
+    is_start = starts == np.arange(len(key))
+    segment = np.cumsum(is_start) - 1
+    reported = column('start_position')
+
+    position = reported[starts] + segmented_cumsum(signed, starts)
+    position[np.abs(position) < FLAT_TOLERANCE] = 0.0
+    start_drift = np.abs(position - signed - reported) if 'start_position' in df.columns else np.zeros(len(key))
+
+    as_of = int(time.max()) if as_of is None else pd.Timestamp(as_of).value
+    last = np.append(is_start[1:], True)
+    held_ns = np.where(last, as_of, np.append(time[1:], as_of)) - time
+
+    unique_keys = key[is_start]
+    keys = pd.DataFrame({
+        'account': pd.Categorical.from_codes(unique_keys // n_coins, categories=account.cat.categories),
+        'coin': pd.Categorical.from_codes(unique_keys % n_coins, categories=coin.cat.categories)
+    })
+    return PositionBook(keys, order, segment, time, signed, position,
+                        np.abs(position) * column('execution_price'), held_ns,
+                        column('closedPnL'), column('fee'), start_drift, as_of)
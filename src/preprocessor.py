@@ -3,48 +3,173 @@ import numpy as np
 import pytz
 from datetime import datetime
 
+try:
+    from src.instrumentation import traced
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from instrumentation import traced
+
+NS_PER_DAY = 86_400 * 10**9
+# Day number of missing timestamps; rows carrying it are dropped in preprocessing
+MISSING_DAY = -1
+
+# India has used a fixed UTC+05:30 offset with no DST since 1945
+IST_OFFSET = pd.Timedelta(hours=5, minutes=30)
+IST_FORMAT = '%d-%m-%Y %H:%M'
+
+def parse_ist_timestamps(values, fmt=IST_FORMAT):
+    """Parse IST wall-clock strings to UTC timestamps
+    
+    Fill exports repeat the same minute-resolution string many times, so
+    each distinct string is parsed once and the result is scattered back
+    through the factorization codes. Missing values become NaT.
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = (pd.to_datetime(uniques, format=fmt) - IST_OFFSET).asi8
+    # Code -1 (missing) indexes the trailing NaT
+    parsed = np.append(parsed, pd.NaT.value)
+    utc = pd.DatetimeIndex(parsed[codes].view('datetime64[ns]')).tz_localize('UTC')
+    return pd.Series(utc, index=values.index)
+
+def day_number(timestamps):
+    """Whole days since the Unix epoch (UTC) for a datetime Series
+    
+    NaT becomes ``MISSING_DAY`` instead of its int64 sentinel divided down
+    to a day hundreds of years off.
+    """
+    days = timestamps.astype('int64') // NS_PER_DAY
+    return days.where(timestamps.notna(), MISSING_DAY).astype('int32')
+
+def day_to_date(days):
+    """Midnight datetime64 values for integer day numbers; NaT for ``MISSING_DAY``"""
+    values = days.astype('int64') * NS_PER_DAY
+    values = values.where(days != MISSING_DAY, pd.NaT.value)
+    return pd.Series(values, index=days.index).astype('datetime64[ns]')
+
+def drop_missing_days(df, what):
+    """Drop rows whose timestamp is missing, reporting how many there were"""
+    missing = (df['day'] == MISSING_DAY).to_numpy()
+    if missing.any():
+        print(f"Dropping {int(missing.sum()):,} {what} without a timestamp")
+        df.drop(index=df.index[missing], inplace=True)
+    return df
+
+# Columns preprocessing derives from others. Compact preprocessing leaves
+# them out and ``with_derived`` adds them where an analysis needs them.
+DERIVED_COLUMNS = {
+    'abs_pnl': lambda df: df['closedPnL'].abs() if 'closedPnL' in df.columns else None,
+    'trade_value': lambda df: df['size_usd'] if 'size_usd' in df.columns else (
+        df['size'] * df['execution_price'] if {'size', 'execution_price'} <= set(df.columns) else None
+    )
+}
+
+# Dtypes compact preprocessing converts to; every value survives the conversion.
+# The merged store keeps the regular dtypes (see ``store.canonical_table``).
+COMPACT_DTYPES = {
+    'timestamp_ist': 'category',
+    'side': 'category',
+    'direction': 'category',
+    'sentiment_score': 'float32'
+}
+
+def with_derived(df, columns):
+    """``df`` with any derived ``columns`` it lacks, computed on demand
+    
+    Returns ``df`` itself when nothing is missing; otherwise a shallow copy
+    that shares the existing columns' data, so ``df`` is left unchanged.
+    """
+    missing = [col for col in columns if col in DERIVED_COLUMNS and col not in df.columns]
+    if not missing:
+        return df
+    
+    view = df.copy(deep=False)
+    for col in missing:
+        values = DERIVED_COLUMNS[col](view)
+        if values is not None:
+            view[col] = values
+    return view
+
+def compact_dtypes(df):
+    """Convert ``COMPACT_DTYPES`` columns of ``df`` in place"""
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns and df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+class SentimentLookup:
+    """Dense day-indexed sentiment arrays for vectorized joins
+    
+    Covers every day between the first and last sentiment reading, so the
+    join for a trade is a single array index. Days without a reading (and
+    duplicate readings after the first) map to no match.
+    """
+    
+    def __init__(self, sentiment_df):
+        days = sentiment_df['day'].to_numpy(dtype='int64')
+        classes = pd.Categorical(sentiment_df['Classification'])
+        self.categories = classes.categories
+        self.first_day = int(days.min())
+        
+        span = int(days.max()) - self.first_day + 1
+        self.matched = np.zeros(span, dtype=bool)
+        self.codes = np.full(span, -1, dtype=classes.codes.dtype)
+        self.scores = np.full(span, np.nan)
+        
+        # Assign in reverse so the first reading of a day wins
+        idx = days[::-1] - self.first_day
+        self.matched[idx] = True
+        self.codes[idx] = classes.codes[::-1]
+        self.scores[idx] = sentiment_df['sentiment_score'].to_numpy(dtype='float64')[::-1]
+    
+    def positions(self, days):
+        """Lookup positions for ``days``, with -1 where no reading exists"""
+        pos = np.asarray(days, dtype='int64') - self.first_day
+        in_range = (pos >= 0) & (pos < len(self.matched))
+        pos = np.where(in_range, pos, 0)
+        return np.where(in_range & self.matched[pos], pos, -1)
+
 class DataPreprocessor:
-    def __init__(self):
-        pass
+    def __init__(self, compact=False):
+        # Compact mode drops consumed raw columns, converts dtypes and leaves
+        # derived columns to ``with_derived``, to cut peak memory
+        self.compact = compact
     
-    def preprocess_trader_data(self, df):
+    @traced
+    def preprocess_trader_data(self, df, verbose=True):
         """Preprocess trader data with correct date parsing"""
         # Standardize column names
         df.columns = df.columns.str.replace(' ', '_').str.lower()
         
-        print("\nRaw timestamp samples:")
-        if 'timestamp_ist' in df.columns:
-            print(df['timestamp_ist'].head(3))
+        if verbose:
+            print("\nRaw timestamp samples:")
+            if 'timestamp_ist' in df.columns:
+                print(df['timestamp_ist'].head(3))
         
-        # Handle IST timestamp parsing
-        if 'timestamp_ist' in df.columns:
+        # Handle IST timestamp parsing, falling back to the epoch (ms) column
+        if 'timestamp_ist' in df.columns or 'timestamp' in df.columns:
             try:
-                # Parse with dayfirst=True for DD-MM-YYYY format
-                df['timestamp'] = pd.to_datetime(
-                    df['timestamp_ist'],
-                    dayfirst=True,
-                    format='%d-%m-%Y %H:%M'
-                )
-                # Convert IST to UTC
-                df['timestamp'] = df['timestamp'].dt.tz_localize('Asia/Kolkata').dt.tz_convert('UTC')
-                df['date'] = df['timestamp'].dt.date
+                df['timestamp'] = self._parse_trade_timestamps(df)
+                df['day'] = day_number(df['timestamp'])
+                df['date'] = day_to_date(df['day'])
             except Exception as e:
                 print(f"Date parsing error: {e}")
                 raise ValueError("Failed to parse timestamps. Check date format in raw data.")
+            # Day lookups index dense arrays, so undated fills can't be kept
+            drop_missing_days(df, 'fills')
         
-        # Handle missing values
-        numeric_columns = df.select_dtypes(include=[np.number]).columns
-        df[numeric_columns] = df[numeric_columns].fillna(0)
+        # Intern repeated identifiers (already categorical when loaded via DataLoader)
+        for col in ('account', 'coin'):
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        
+        # Handle missing values, column by column so complete columns aren't copied
+        for col in df.select_dtypes(include=[np.number]).columns:
+            if df[col].hasnans:
+                df[col] = df[col].fillna(0)
         
         # Create additional features
         if 'closed_pnl' in df.columns:
             df['is_profitable'] = df['closed_pnl'] > 0
-            df['abs_pnl'] = abs(df['closed_pnl'])
-        
-        if 'size_usd' in df.columns:
-            df['trade_value'] = df['size_usd']
-        elif 'size_tokens' in df.columns and 'execution_price' in df.columns:
-            df['trade_value'] = df['size_tokens'] * df['execution_price']
         
         # Standardize column names
         column_mapping = {
@@ -58,11 +183,33 @@ class DataPreprocessor:
         }
         
         existing_mapping = {k: v for k, v in column_mapping.items() if k in df.columns}
-        df = df.rename(columns=existing_mapping)
+        df.rename(columns=existing_mapping, inplace=True)
+        
+        if self.compact:
+            compact_dtypes(df)
+        else:
+            for col, derive in DERIVED_COLUMNS.items():
+                values = derive(df)
+                if values is not None:
+                    df[col] = values
         
-        print(f"\nTrader date range: {df['date'].min()} to {df['date'].max()}")
+        if verbose:
+            print(f"\nTrader date range: {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}")
         return df
     
+    def _parse_trade_timestamps(self, df):
+        """UTC trade times from ``timestamp_ist``, else the numeric epoch column"""
+        has_epoch = 'timestamp' in df.columns and pd.api.types.is_numeric_dtype(df['timestamp'])
+        if 'timestamp_ist' in df.columns:
+            try:
+                return parse_ist_timestamps(df['timestamp_ist'])
+            except ValueError as e:
+                if not has_epoch:
+                    raise
+                print(f"IST timestamp parsing failed ({e}); using epoch timestamps")
+        return pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+    
+    @traced
     def preprocess_sentiment_data(self, df):
         """Preprocess sentiment data with epoch time handling"""
         df.columns = df.columns.str.replace(' ', '_').str.lower()
@@ -71,9 +218,11 @@ class DataPreprocessor:
         if 'timestamp' in df.columns:
             try:
                 df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-                df['date'] = df['timestamp'].dt.date
+                df['day'] = day_number(df['timestamp'])
+                df['date'] = day_to_date(df['day'])
             except:
                 raise ValueError("Failed to convert sentiment timestamps")
+            drop_missing_days(df, 'sentiment readings')
         
         # Create numerical sentiment score
         if 'classification' in df.columns:
@@ -87,32 +236,56 @@ class DataPreprocessor:
             df['Classification'] = df['classification'].str.strip().str.title()
             df['sentiment_score'] = df['Classification'].map(sentiment_map).fillna(0)
         
-        print(f"\nSentiment date range: {df['date'].min()} to {df['date'].max()}")
+        print(f"\nSentiment date range: {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}")
         return df
     
-    def merge_datasets(self, trader_df, sentiment_df):
-        """Merge datasets with validation"""
+    @traced
+    def merge_datasets(self, trader_df, sentiment_df, copy=False):
+        """Merge datasets with validation
+        
+        The raw frames are preprocessed in place unless ``copy=True``.
+        """
         print("\nPreprocessing trader data...")
-        trader_df = self.preprocess_trader_data(trader_df.copy())
+        trader_df = self.preprocess_trader_data(trader_df.copy() if copy else trader_df)
         
         print("\nPreprocessing sentiment data...")
-        sentiment_df = self.preprocess_sentiment_data(sentiment_df.copy())
-        
-        merged_df = pd.merge(
-            trader_df,
-            sentiment_df[['date', 'Classification', 'sentiment_score']],
-            on='date',
-            how='left',
-            indicator=True
-        )
+        sentiment_df = self.preprocess_sentiment_data(sentiment_df.copy() if copy else sentiment_df)
         
-        merge_stats = merged_df['_merge'].value_counts()
+        merged_df, merge_stats = self.join_sentiment(trader_df, sentiment_df)
         print("\nMerge results:")
         print(merge_stats)
         
         if merge_stats.get('both', 0) == 0:
             raise ValueError("No dates matched between datasets")
         
-        merged_df = merged_df.drop(columns='_merge')
         print(f"\nFinal merged data shape: {merged_df.shape}")
-        return merged_df
\ No newline at end of file
+        return merged_df
+    
+    @traced
+    def join_sentiment(self, trader_df, sentiment):
+        """Attach daily sentiment to already preprocessed trades
+        
+        ``sentiment`` is a preprocessed sentiment frame or a prebuilt
+        SentimentLookup (reused across chunks). Columns are added to
+        ``trader_df`` in place by indexing the lookup arrays with integer day
+        numbers. Returns the frame and ``_merge``-style match counts, so
+        chunked callers can accumulate statistics across chunks.
+        """
+        lookup = sentiment if isinstance(sentiment, SentimentLookup) else SentimentLookup(sentiment)
+        pos = lookup.positions(trader_df['day'].to_numpy())
+        matched = pos >= 0
+        
+        trader_df['Classification'] = pd.Categorical.from_codes(
+            np.where(matched, lookup.codes[pos], -1), categories=lookup.categories
+        )
+        trader_df['sentiment_score'] = np.where(matched, lookup.scores[pos], np.nan)
+        if self.compact:
+            compact_dtypes(trader_df)
+        
+        n_matched = int(matched.sum())
+        merge_stats = pd.Series(
+            {'both': n_matched, 'left_only': len(trader_df) - n_matched, 'right_only': 0},
+            name='count'
+        )
+        merge_stats.index.name = '_merge'
+        return trader_df, merge_stats
@@ -0,0 +1,257 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+try:
+    from src.sketches import QuantileSketch, HyperLogLog, ReservoirSample
+    from src.preprocessor import parse_ist_timestamps, day_number, IST_OFFSET, NS_PER_DAY, MISSING_DAY
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from sketches import QuantileSketch, HyperLogLog, ReservoirSample
+    from preprocessor import parse_ist_timestamps, day_number, IST_OFFSET, NS_PER_DAY, MISSING_DAY
+
+SCHEMA_PATH = 'data/processed/trader_schema.json'
+PROFILE_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+SAMPLE_SIZE = 10_000
+# Smaller than the loader's chunks: the parser is faster on chunks that
+# stay in cache, and profiling memory is bounded by one chunk
+PROFILE_CHUNKSIZE = 100_000
+# String columns with at most this share of distinct values are interned
+CATEGORY_RATIO = 0.05
+
+class ColumnProfile:
+    """Exact counts and mergeable sketches of one CSV column
+
+    Each chunk's inferred dtype is recorded as a kind (int, float, bool,
+    string or empty), so the column's dtype can be resolved once the whole
+    file has been seen. Numeric columns keep a quantile sketch, string
+    columns a distinct-count sketch.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.kinds = set()
+        self.sketch = QuantileSketch()
+        self.distinct = HyperLogLog()
+
+    def update(self, values):
+        self.count += len(values)
+        if values.dtype == object:
+            # One hash pass gives the nulls and the distinct values
+            codes, uniques = pd.factorize(values)
+            nulls = int(np.count_nonzero(codes < 0))
+            kind = object_kind(uniques)
+            if kind == 'string':
+                self.distinct.update_distinct(uniques)
+        else:
+            nulls = int(values.isna().sum())
+            kind = numeric_kind(values, nulls)
+            if kind in ('int', 'float'):
+                self.sketch.update(values.to_numpy(dtype='float64', na_value=np.nan))
+        self.nulls += nulls
+        self.kinds.add(kind)
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.kinds |= other.kinds
+        self.sketch.merge(other.sketch)
+        self.distinct.merge(other.distinct)
+        return self
+
+    @property
+    def dtype(self):
+        """Loader dtype that parses every chunk seen so far"""
+        kinds = self.kinds - {'empty'}
+        if 'string' in kinds:
+            non_null = self.count - self.nulls
+            return 'category' if self.distinct.count() <= CATEGORY_RATIO * non_null else 'object'
+        if kinds == {'bool'}:
+            return 'boolean'
+        if kinds == {'int'}:
+            # Nullable, so files with missing values parse to the same dtype
+            return 'Int64'
+        if kinds <= {'int', 'float'} and kinds:
+            return 'float64'
+        return 'object'
+
+    def summary(self, quantiles=PROFILE_QUANTILES):
+        summary = {'dtype': self.dtype, 'count': self.count, 'nulls': self.nulls}
+        if self.sketch.count:
+            summary.update(min=self.sketch.min, max=self.sketch.max, mean=self.sketch.mean)
+            summary['quantiles'] = {
+                f"p{round(q * 100):g}": float(v) for q, v in zip(quantiles, self.sketch.quantile(quantiles))
+            }
+        if 'string' in self.kinds:
+            summary['distinct'] = self.distinct.count()
+        return summary
+
+def numeric_kind(values, nulls):
+    """Kind of a non-object chunk column as parsed by ``pd.read_csv``"""
+    if nulls == len(values):
+        return 'empty'
+    if pd.api.types.is_bool_dtype(values):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(values):
+        return 'int'
+    # Missing values turn integer columns into floats
+    present = values.dropna()
+    return 'int' if nulls and (present == np.floor(present)).all() else 'float'
+
+def object_kind(uniques):
+    """Kind of an object chunk column from its distinct non-null values"""
+    if not len(uniques):
+        return 'empty'
+    if all(isinstance(value, bool) for value in uniques):
+        # Missing values turn boolean columns into objects
+        return 'bool'
+    return 'string'
+
+class TraderProfile:
+    """Streaming profile of a trader fill export
+
+    Holds a ColumnProfile per column, a uniform row sample and the number
+    of fills per UTC day. Profiles of separate chunks or partitions merge,
+    so a file is profiled in one pass with memory bounded by the chunk size.
+    """
+
+    def __init__(self, sample_size=SAMPLE_SIZE, seed=0):
+        self.columns = {}
+        self.rows = 0
+        self.sample = ReservoirSample(sample_size, seed)
+        self.day_counts = pd.Series(dtype='int64')
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for name in chunk.columns:
+            self.columns.setdefault(name, ColumnProfile(name)).update(chunk[name])
+        self.sample.update(chunk)
+
+        days = trade_days(chunk)
+        if days is not None:
+            self.day_counts = self.day_counts.add(days.value_counts(), fill_value=0).astype('int64')
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        for name, column in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(column)
+            else:
+                self.columns[name] = column
+        self.day_counts = self.day_counts.add(other.day_counts, fill_value=0).astype('int64')
+        return self
+
+    def dtypes(self):
+        """Dtype map in the form of ``data_loader.TRADER_DTYPES``"""
+        return {name: column.dtype for name, column in self.columns.items()}
+
+    def coverage(self, sentiment_days):
+        """Trade days and fills with and without a sentiment reading
+
+        ``sentiment_days`` are the integer day numbers of the sentiment file.
+        """
+        if self.day_counts.empty:
+            return {}
+        days = self.day_counts.index.to_numpy(dtype='int64')
+        fills = self.day_counts.to_numpy()
+        sentiment_days = np.unique(np.asarray(sentiment_days, dtype='int64'))
+        matched = np.isin(days, sentiment_days)
+        missing = days[~matched]
+        return {
+            'trade_start': day_label(days.min()),
+            'trade_end': day_label(days.max()),
+            'sentiment_start': day_label(sentiment_days.min()) if len(sentiment_days) else None,
+            'sentiment_end': day_label(sentiment_days.max()) if len(sentiment_days) else None,
+            'trade_days': len(days),
+            'trade_days_without_sentiment': len(missing),
+            'fills_without_sentiment': int(fills[~matched].sum()),
+            'matched_fill_share': float(fills[matched].sum() / fills.sum()),
+            'missing_days': [day_label(day) for day in missing[:20]]
+        }
+
+def trade_days(chunk):
+    """UTC day numbers of a raw chunk's fills, as the preprocessor derives them"""
+    if 'Timestamp IST' in chunk.columns:
+        try:
+            return ist_days(chunk['Timestamp IST'].dropna())
+        except ValueError:
+            pass
+    if 'Timestamp' in chunk.columns and pd.api.types.is_numeric_dtype(chunk['Timestamp']):
+        return day_number(pd.to_datetime(chunk['Timestamp'].dropna(), unit='ms', utc=True))
+    return None
+
+def ist_days(values):
+    """UTC day numbers of ``IST_FORMAT`` strings
+
+    Only the day matters here, so the fixed-width digits of each distinct
+    string are decoded with array arithmetic instead of ``strptime``, and
+    fills before 05:30 IST are moved to the previous UTC day. Strings not
+    in the exact zero-padded format fall back to ``parse_ist_timestamps``.
+    """
+    codes, uniques = pd.factorize(values)
+    # One extra byte shows whether a string is longer than 16 characters
+    chars = np.asarray(uniques, dtype='S17').view('uint8').reshape(-1, 17).astype('int64')
+    digits = chars[:, [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15]] - ord('0')
+    layout = (chars[:, [2, 5, 10, 13, 16]] == [ord('-'), ord('-'), ord(' '), ord(':'), 0]).all()
+    if not layout or digits.min(initial=0) < 0 or digits.max(initial=0) > 9:
+        return day_number(parse_ist_timestamps(values))
+
+    day, month, year, hour, minute = (
+        digits[:, 0] * 10 + digits[:, 1],
+        digits[:, 2] * 10 + digits[:, 3],
+        digits[:, 4:8] @ [1000, 100, 10, 1],
+        digits[:, 8] * 10 + digits[:, 9],
+        digits[:, 10] * 10 + digits[:, 11]
+    )
+    month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    month_days = (month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')
+    if ((month < 1) | (month > 12) | (day < 1) | (day > month_days.astype('int64')) |
+            (hour > 23) | (minute > 59)).any():
+        return day_number(parse_ist_timestamps(values))
+
+    days = month_start.astype('datetime64[D]').astype('int64') + day - 1
+    days -= hour * 60 + minute < IST_OFFSET // pd.Timedelta(minutes=1)
+    return pd.Series(days[codes].astype('int32'), index=values.index)
+
+def day_label(day):
+    return f"{pd.Timestamp(int(day), unit='D'):%Y-%m-%d}"
+
+def sentiment_days(path):
+    """Day numbers of the readings in a fear/greed index CSV"""
+    sentiment = pd.read_csv(path, usecols=['timestamp'])
+    days = day_number(pd.to_datetime(sentiment['timestamp'], unit='s')).to_numpy()
+    return days[days != MISSING_DAY]
+
+def profile_trader_data(path, sentiment_path=None, chunksize=PROFILE_CHUNKSIZE, sample_size=SAMPLE_SIZE, seed=0):
+    """Profile a trader CSV in one streaming pass
+
+    Returns the TraderProfile and a JSON-ready report: row count, per-column
+    dtype, nulls, distinct count or min/max/mean and quantiles, and date
+    coverage against the sentiment file if given.
+    """
+    profile = TraderProfile(sample_size, seed)
+    with pd.read_csv(path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            profile.update(chunk)
+
+    report = {
+        'source': path,
+        'rows': profile.rows,
+        'columns': {name: column.summary() for name, column in profile.columns.items()},
+        'dtypes': profile.dtypes()
+    }
+    if sentiment_path:
+        report['coverage'] = profile.coverage(sentiment_days(sentiment_path))
+    return profile, report
+
+def write_schema(report, path=SCHEMA_PATH):
+    """Write a profile report; its ``dtypes`` are read back by ``data_loader.load_schema``"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+DAYS_PER_YEAR = 365
+ROLLING_WINDOWS = (7, 30)
+WORST_WINDOW = 30
+
+def segment_starts(keys):
+    """Index of the first row of each row's run of equal ``keys`` (sorted input)"""
+    n = len(keys)
+    first = np.ones(n, dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return np.maximum.accumulate(np.where(first, np.arange(n), 0))
+
+def segmented_cumsum(values, starts):
+    """Cumulative sum that restarts at every segment start"""
+    total = np.cumsum(values)
+    before = np.concatenate(([0.0], total))[starts]
+    return total - before
+
+def trader_risk_metrics(df, as_of_day=None):
+    """Time-series risk metrics per account from merged fills
+
+    One stable sort by account and time, then segmented cumulative ops on
+    the sorted arrays; no per-account Python loops. Returns one row per
+    account with:
+
+    - max_drawdown: largest fall of cumulative closed PnL from its running
+      peak (the peak starts at 0)
+    - pnl_7d / pnl_30d: closed PnL over the 7 / 30 days up to ``as_of_day``
+      (default: the last day in ``df``)
+    - worst_30d_pnl: lowest rolling PnL over WORST_WINDOW days, for windows ending on the
+      account's trading days
+    - max_win_streak / max_loss_streak: longest runs of consecutive winning
+      / losing fills (fills with zero closed PnL are skipped)
+    - daily_sharpe: annualized mean/std of daily PnL over the account's
+      active calendar days, days without fills counting as 0
+    """
+    if df.empty:
+        raise ValueError("No fills to compute risk metrics from")
+
+    accounts = df['account']
+    if not isinstance(accounts.dtype, pd.CategoricalDtype):
+        accounts = accounts.astype('category')
+    codes = accounts.cat.codes.to_numpy()
+    pnl = df['closedPnL'].to_numpy(dtype='float64')
+    days = df['day'].to_numpy(dtype='int64')
+    times = df['timestamp'].astype('int64').to_numpy() if 'timestamp' in df.columns else days
+    as_of_day = int(days.max()) if as_of_day is None else as_of_day
+
+    # Fills without an account (code -1) are left out, as groupby('account') does
+    known = codes >= 0
+    if not known.all():
+        codes, pnl, days, times = codes[known], pnl[known], days[known], times[known]
+        if not len(codes):
+            raise ValueError("No fills with an account to compute risk metrics from")
+
+    order = np.lexsort((times, codes))
+    codes, pnl, days = codes[order], pnl[order], days[order]
+    starts = segment_starts(codes)
+    present = np.unique(codes)
+    metrics = pd.DataFrame(index=pd.Index(accounts.cat.categories[present], name='account'))
+
+    # Drawdown from the running peak of cumulative PnL
+    cum = segmented_cumsum(pnl, starts)
+    peak = np.maximum(pd.Series(cum).groupby(codes).cummax().to_numpy(), 0.0)
+    metrics['max_drawdown'] = pd.Series(peak - cum).groupby(codes).max().to_numpy()
+
+    # Daily PnL per account; rows stay sorted by (account, day)
+    day_first = np.ones(len(codes), dtype=bool)
+    day_first[1:] = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    day_index = np.flatnonzero(day_first)
+    daily_codes, daily_days = codes[day_index], days[day_index]
+    daily_pnl = np.add.reduceat(pnl, day_index) if len(day_index) else np.array([])
+    daily_starts = segment_starts(daily_codes)
+
+    daily_total = np.cumsum(daily_pnl)
+    padded_total = np.concatenate(([0.0], daily_total))
+    # Key each daily row by account then day, so one searchsorted finds
+    # every window start; windows never reach back past the account's rows
+    span = int(daily_days.max() - daily_days.min()) + WORST_WINDOW + 1
+    key = daily_codes.astype('int64') * span + (daily_days - daily_days.min())
+    for window in ROLLING_WINDOWS:
+        recent = np.where(daily_days > as_of_day - window, daily_pnl, 0.0)
+        metrics[f"pnl_{window}d"] = np.bincount(daily_codes, recent, minlength=codes.max() + 1)[present]
+    first_in_window = np.maximum(np.searchsorted(key, key - WORST_WINDOW, side='right'), daily_starts)
+    rolling = daily_total - padded_total[first_in_window]
+    metrics[f"worst_{WORST_WINDOW}d_pnl"] = pd.Series(rolling).groupby(daily_codes).min().to_numpy()
+
+    # Run-length encode win/loss outcomes of fills with non-zero PnL
+    decided = pnl != 0
+    outcome, outcome_codes = np.sign(pnl[decided]), codes[decided]
+    run_first = np.ones(len(outcome), dtype=bool)
+    run_first[1:] = (outcome[1:] != outcome[:-1]) | (outcome_codes[1:] != outcome_codes[:-1])
+    run_index = np.flatnonzero(run_first)
+    runs = pd.DataFrame({
+        'code': outcome_codes[run_index],
+        'outcome': outcome[run_index],
+        'length': np.diff(np.append(run_index, len(outcome)))
+    })
+    longest = runs.groupby(['code', 'outcome'])['length'].max().unstack()
+    longest = longest.reindex(index=present, columns=[1.0, -1.0]).fillna(0).astype('int64')
+    metrics['max_win_streak'] = longest[1.0].to_numpy()
+    metrics['max_loss_streak'] = longest[-1.0].to_numpy()
+
+    # Sharpe of daily PnL with zero-PnL days filled in analytically
+    first_day = pd.Series(daily_days).groupby(daily_codes).min().to_numpy()
+    last_day = pd.Series(daily_days).groupby(daily_codes).max().to_numpy()
+    n_days = (last_day - first_day + 1).astype('float64')
+    total = np.bincount(daily_codes, daily_pnl)[present]
+    total_sq = np.bincount(daily_codes, daily_pnl ** 2)[present]
+    mean = total / n_days
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (total_sq - n_days * mean ** 2) / (n_days - 1)
+        std = np.sqrt(np.where(var > 0, var, np.nan))
+        metrics['daily_sharpe'] = mean / std * np.sqrt(DAYS_PER_YEAR)
+
+    return metrics.round(4).reset_index()
@@ -0,0 +1,236 @@
+import os
+import json
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+import pandas as pd
+
+try:
+    from src.data_loader import DataLoader
+    from src.analyzer import TradingAnalyzer
+    from src.clustering import ClusterModel
+    from src.cube import SentimentCube, CUBE_PATH
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from data_loader import DataLoader
+    from analyzer import TradingAnalyzer
+    from clustering import ClusterModel
+    from cube import SentimentCube, CUBE_PATH
+
+DEFAULT_CACHE_SIZE = 256
+
+class LRUCache:
+    """Thread-safe mapping that keeps the ``maxsize`` most recently used entries"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Cached value for ``key``, computing and storing it on a miss
+
+        ``compute`` runs outside the lock, so a slow query doesn't block
+        requests for other keys; two concurrent misses on the same key both
+        compute it and the later result is kept.
+        """
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+def records(frame):
+    """JSON-ready records of ``frame``, with aggregated columns flattened to ``col_agg``"""
+    frame = frame.copy()
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame.columns = ['_'.join(map(str, col)) for col in frame.columns]
+    if frame.index.name is not None or isinstance(frame.index, pd.MultiIndex):
+        frame = frame.reset_index()
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+class AnalyticsService:
+    """Merged fills, trader metrics, clusters and the sentiment cube, loaded once
+
+    Queries run ``TradingAnalyzer`` operations against the in-memory data
+    and return JSON-ready results, which are kept in an LRU cache keyed on
+    the query and its arguments.
+    """
+
+    def __init__(self, merged_path, metrics_path='data/outputs/trader_metrics.csv',
+                 cluster_model_path='data/processed/cluster_model.json', cube_path=CUBE_PATH,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.analyzer = TradingAnalyzer()
+        self.cache = LRUCache(cache_size)
+
+        print(f"Loading merged data from {merged_path}...")
+        self.merged = DataLoader(None, None, cache_dir=None).load_merged(merged_path)
+        # Row positions per account, so per-account queries never scan all fills
+        self.account_rows = self.merged.groupby('account', observed=True).indices
+
+        if os.path.exists(metrics_path):
+            self.trader_metrics = pd.read_csv(metrics_path)
+        else:
+            print(f"{metrics_path} not found; calculating trader metrics")
+            self.trader_metrics = self.analyzer.calculate_trader_metrics(self.merged)
+        self.trader_metrics['account'] = self.trader_metrics['account'].astype(str)
+
+        if os.path.exists(cluster_model_path):
+            model = ClusterModel.load(cluster_model_path)
+            self.trader_metrics['cluster'] = model.assign(self.trader_metrics)
+        else:
+            print(f"{cluster_model_path} not found; clustering traders")
+            self.trader_metrics = self.analyzer.cluster_traders(self.trader_metrics)
+        self.trader_metrics = self.trader_metrics.set_index('account')
+
+        self.cube = None
+        if os.path.exists(cube_path):
+            try:
+                self.cube = SentimentCube.load(cube_path)
+            except ValueError as e:
+                print(f"{e}; rebuilding the cube")
+        if self.cube is None:
+            self.cube = self.analyzer.build_sentiment_cube(self.merged)
+        print(f"Loaded {len(self.merged):,} fills, {len(self.trader_metrics):,} traders, {len(self.cube):,} cube cells")
+
+    def cached(self, name, compute, *args):
+        return self.cache.get_or_compute((name,) + args, lambda: compute(*args))
+
+    def health(self):
+        return {
+            'fills': len(self.merged),
+            'traders': len(self.trader_metrics),
+            'cube_cells': len(self.cube),
+            'cache': self.cache.stats()
+        }
+
+    def trader(self, account, start=None, end=None):
+        """Metrics and cluster of one account, recomputed over ``start``..``end`` if given"""
+        return self.cached('trader', self._trader, account, start, end)
+
+    def _trader(self, account, start, end):
+        if account not in self.trader_metrics.index:
+            raise KeyError(f"Unknown account {account}")
+        cluster = int(self.trader_metrics.at[account, 'cluster'])
+        if start is None and end is None:
+            return {'account': account, 'cluster': cluster, 'metrics': records(self.trader_metrics.loc[[account]].reset_index(drop=True))[0]}
+
+        fills = self.merged.iloc[self.account_rows[account]]
+        dates = fills['date']
+        in_range = pd.Series(True, index=fills.index)
+        if start is not None:
+            in_range &= dates >= pd.Timestamp(start)
+        if end is not None:
+            in_range &= dates <= pd.Timestamp(end)
+        if not in_range.any():
+            return {'account': account, 'cluster': cluster, 'start': start, 'end': end, 'metrics': None}
+        metrics = self.analyzer.calculate_trader_metrics(fills[in_range])
+        return {'account': account, 'cluster': cluster, 'start': start, 'end': end,
+                'metrics': records(metrics.drop(columns='account'))[0]}
+
+    def sentiment(self, start=None, end=None, classes=None):
+        """Sentiment performance table, optionally for a date range and subset of classes"""
+        return self.cached('sentiment', self._sentiment, start, end, classes)
+
+    def _sentiment(self, start, end, classes):
+        performance = self.analyzer.sentiment_performance_from_cube(
+            self.cube, start=start, end=end, sentiments=None if classes is None else list(classes)
+        )
+        return {'start': start, 'end': end, 'performance': records(performance)}
+
+    def clusters(self):
+        """Trader count and mean features per cluster"""
+        return self.cached('clusters', self._clusters)
+
+    def _clusters(self):
+        features = [col for col in self.analyzer.CLUSTER_FEATURES if col in self.trader_metrics.columns]
+        summary = self.trader_metrics.groupby('cluster')[features].mean()
+        summary.insert(0, 'traders', self.trader_metrics.groupby('cluster').size())
+        return {'clusters': records(summary)}
+
+    def cluster_members(self, cluster):
+        """Accounts assigned to ``cluster``"""
+        return self.cached('cluster_members', self._cluster_members, cluster)
+
+    def _cluster_members(self, cluster):
+        members = self.trader_metrics.index[self.trader_metrics['cluster'] == cluster]
+        if members.empty:
+            raise KeyError(f"Unknown cluster {cluster}")
+        return {'cluster': cluster, 'accounts': members.tolist()}
+
+class AnalyticsRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over an AnalyticsService
+
+    GET /health
+    GET /traders/<account>[?start=YYYY-MM-DD&end=YYYY-MM-DD]
+    GET /sentiment[?start=...&end=...&classes=Fear,Greed]
+    GET /clusters
+    GET /clusters/<n>
+    """
+
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            self.send_json(200, self.route(parts, query))
+        except KeyError as e:
+            self.send_json(404, {'error': str(e.args[0]) if e.args else 'Not found'})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            # Anything else is a server-side failure; the client still gets a JSON answer
+            self.log_error("Error answering %s: %r", self.path, e)
+            traceback.print_exc()
+            self.send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def route(self, parts, query):
+        start, end = query.get('start'), query.get('end')
+        if parts == ['health']:
+            return self.service.health()
+        if len(parts) == 2 and parts[0] == 'traders':
+            return self.service.trader(parts[1], start, end)
+        if parts == ['sentiment']:
+            classes = tuple(query['classes'].split(',')) if 'classes' in query else None
+            return self.service.sentiment(start, end, classes)
+        if parts == ['clusters']:
+            return self.service.clusters()
+        if len(parts) == 2 and parts[0] == 'clusters':
+            try:
+                cluster = int(parts[1])
+            except ValueError:
+                raise ValueError(f"Cluster must be an integer, got {parts[1]!r}")
+            return self.service.cluster_members(cluster)
+        raise KeyError(f"No endpoint at /{'/'.join(parts)}")
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def make_server(service, host='127.0.0.1', port=8050):
+    """Threaded HTTP server answering requests from ``service``, one thread per request"""
+    handler = type('Handler', (AnalyticsRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
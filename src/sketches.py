@@ -0,0 +1,263 @@
+import numpy as np
+import pandas as pd
+
+class QuantileSketch:
+    """Mergeable relative-error quantile sketch (DDSketch)
+
+    Values are counted in logarithmic buckets whose bounds grow by a factor
+    ``gamma = (1 + accuracy) / (1 - accuracy)``, positive and negative values
+    separately, so every quantile is estimated to within ``accuracy`` of the
+    true value in relative terms. Magnitudes below ``min_value`` count as
+    zero, and at most ``max_buckets`` buckets are kept per sign by folding
+    the smallest magnitudes together, so memory is bounded regardless of
+    the number of values. Sketches merge by adding bucket counts, so chunks
+    and partitions can be sketched independently and combined.
+    """
+
+    def __init__(self, accuracy=0.01, min_value=1e-9, max_buckets=2048):
+        self.accuracy = accuracy
+        self.min_value = min_value
+        self.max_buckets = max_buckets
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = np.log(self.gamma)
+        # Bucket counts for keys offset, offset + 1, ... per sign
+        self.positive, self.positive_offset = np.zeros(0, dtype='int64'), 0
+        self.negative, self.negative_offset = np.zeros(0, dtype='int64'), 0
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Add an array of values; NaNs are ignored"""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        magnitude = np.abs(values)
+        nonzero = magnitude >= self.min_value
+        self.zeros += int(len(values) - nonzero.sum())
+        keys = self.key(magnitude[nonzero])
+        negative = values[nonzero] < 0
+        self.positive, self.positive_offset = self._collapse(
+            *_add_keys(self.positive, self.positive_offset, keys[~negative])
+        )
+        self.negative, self.negative_offset = self._collapse(
+            *_add_keys(self.negative, self.negative_offset, keys[negative])
+        )
+        return self
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one"""
+        if other.gamma != self.gamma or other.min_value != self.min_value:
+            raise ValueError("Only sketches with the same accuracy and min_value can be merged")
+        self.positive, self.positive_offset = self._collapse(
+            *_add_counts(self.positive, self.positive_offset, other.positive, other.positive_offset)
+        )
+        self.negative, self.negative_offset = self._collapse(
+            *_add_counts(self.negative, self.negative_offset, other.negative, other.negative_offset)
+        )
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _collapse(self, counts, offset):
+        """Fold the lowest buckets into one so at most ``max_buckets`` remain"""
+        excess = len(counts) - self.max_buckets
+        if excess <= 0:
+            return counts, offset
+        collapsed = counts[excess:].copy()
+        collapsed[0] += counts[:excess].sum()
+        return collapsed, offset + excess
+
+    def key(self, magnitude):
+        """Bucket keys of positive magnitudes: bucket k holds (gamma^(k-1), gamma^k]"""
+        return np.ceil(np.log(magnitude) / self._log_gamma).astype('int64')
+
+    def value(self, keys):
+        """Representative magnitude of buckets, within ``accuracy`` of every value in them"""
+        return 2 * np.power(self.gamma, keys.astype('float64')) / (self.gamma + 1)
+
+    def buckets(self):
+        """(values, counts) of the non-empty buckets in ascending order of value"""
+        neg_keys = self.negative_offset + np.flatnonzero(self.negative)
+        pos_keys = self.positive_offset + np.flatnonzero(self.positive)
+        values = np.concatenate([-self.value(neg_keys[::-1]), [0.0], self.value(pos_keys)])
+        counts = np.concatenate([
+            self.negative[neg_keys[::-1] - self.negative_offset],
+            [self.zeros],
+            self.positive[pos_keys - self.positive_offset]
+        ])
+        return values, counts
+
+    def quantile(self, q):
+        """Estimated ``q`` quantile(s); exact at 0 and 1, NaN when empty"""
+        q = np.asarray(q, dtype='float64')
+        if not self.count:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        values, counts = self.buckets()
+        rank = q * (self.count - 1)
+        position = np.searchsorted(np.cumsum(counts), rank, side='right')
+        estimate = np.clip(values[np.minimum(position, len(values) - 1)], self.min, self.max)
+        return estimate if q.ndim else float(estimate)
+
+    def tail_mean(self, q):
+        """Estimated mean of the lowest ``q`` fraction of values (expected shortfall)
+
+        Buckets below the ``q`` quantile count in full at their
+        representative value, plus as much of the quantile's own bucket as
+        makes up ``q * count`` values.
+        """
+        if not self.count:
+            return np.nan
+        values, counts = self.buckets()
+        values = np.clip(values, self.min, self.max)
+        take = max(q * self.count, 1)
+        weights = np.clip(take - (np.cumsum(counts) - counts), 0, counts)
+        return float(values @ weights / take)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else np.nan
+
+    def __len__(self):
+        return len(self.positive) + len(self.negative) + 1
+
+def _add_keys(counts, offset, keys):
+    if not len(keys):
+        return counts, offset
+    low = int(keys.min())
+    return _add_counts(counts, offset, np.bincount(keys - low), low)
+
+def _add_counts(counts, offset, other, other_offset):
+    """Sum two dense count arrays that start at different keys"""
+    if not len(other):
+        return counts, offset
+    if not len(counts):
+        return other.astype('int64'), other_offset
+    low = min(offset, other_offset)
+    high = max(offset + len(counts), other_offset + len(other))
+    total = np.zeros(high - low, dtype='int64')
+    total[offset - low:offset - low + len(counts)] += counts
+    total[other_offset - low:other_offset - low + len(other)] += other
+    return total, low
+
+class HyperLogLog:
+    """Mergeable approximate distinct counter
+
+    ``2 ** precision`` one-byte registers; the standard error of ``count()``
+    is about ``1.04 / sqrt(2 ** precision)`` (0.8% at the default 14).
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype='uint8')
+
+    def update(self, values):
+        """Add the values of an array or Series; nulls are ignored
+
+        Repeated values cannot change a register, so only each chunk's
+        distinct values are hashed.
+        """
+        return self.update_distinct(pd.unique(pd.Series(values).dropna()))
+
+    def update_distinct(self, uniques):
+        """Add values already known to be distinct and non-null"""
+        if not len(uniques):
+            return self
+        hashes = pd.util.hash_array(np.asarray(uniques, dtype=object))
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype('int64')
+        rank = width - _bit_length(hashes & np.uint64((1 << width) - 1)) + 1
+
+        # Sorted (index, rank) keys: the last write to a register is its largest rank
+        keys = np.unique(index * 64 + rank)
+        index, rank = keys // 64, (keys % 64).astype('uint8')
+        self.registers[index] = np.maximum(self.registers[index], rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Only HyperLogLogs with the same precision can be merged")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype('int64')))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+def _bit_length(values):
+    """Bit length of each uint64, by binary search over shifts"""
+    values = values.copy()
+    length = np.zeros(len(values), dtype='int64')
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift)
+        has_high = high > 0
+        values = np.where(has_high, high, values)
+        length += has_high * shift
+    return length + (values > 0)
+
+class ReservoirSample:
+    """Uniform fixed-size row sample of a stream of frames (Algorithm R)
+
+    Row ``t`` of the stream replaces slot ``j ~ U[0, t]`` when ``j < size``.
+    The draws don't depend on the sample, so a whole chunk is placed at once
+    (the last row drawn for a slot wins, as it would row by row), and only
+    the rows currently in the sample are kept.
+    """
+
+    def __init__(self, size=10_000, seed=0):
+        self.size = size
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.slot_piece = np.full(size, -1, dtype='int64')
+        self.slot_row = np.zeros(size, dtype='int64')
+        self.pieces = {}
+
+    def update(self, df):
+        n = len(df)
+        positions = self.seen + np.arange(n)
+        slots = np.where(positions < self.size, positions, self.rng.integers(0, positions + 1))
+        self.seen += n
+
+        chosen = np.full(self.size, -1, dtype='int64')
+        taken = slots < self.size
+        chosen[slots[taken]] = np.arange(n)[taken]
+        filled = np.flatnonzero(chosen >= 0)
+        if not len(filled):
+            return self
+
+        piece = max(self.pieces, default=-1) + 1
+        self.pieces[piece] = df.iloc[chosen[filled]]
+        self.slot_piece[filled] = piece
+        self.slot_row[filled] = np.arange(len(filled))
+        # Drop pieces whose rows have all been replaced
+        self.pieces = {p: rows for p, rows in self.pieces.items() if (self.slot_piece == p).any()}
+        return self
+
+    def frame(self):
+        """The sampled rows in slot order"""
+        frames = []
+        for piece, rows in self.pieces.items():
+            slots = np.flatnonzero(self.slot_piece == piece)
+            frames.append(rows.iloc[self.slot_row[slots]].set_axis(slots))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames).sort_index().reset_index(drop=True)
@@ -0,0 +1,382 @@
+import os
+import json
+import operator
+import functools
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = pq = ds = None
+
+try:
+    from src.preprocessor import NS_PER_DAY, DERIVED_COLUMNS, with_derived
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from preprocessor import NS_PER_DAY, DERIVED_COLUMNS, with_derived
+
+STORE_PATH = 'data/processed/merged_store'
+MANIFEST = '_manifest.json'
+# Hive's directory name for rows whose partition value is null
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+# Rows are sorted by account within a file, so with row groups well below
+# the file size, row-group statistics let account filters skip data
+ROW_GROUP_SIZE = 16_384
+
+class MergedStore:
+    """Append-only, Hive-partitioned Parquet store of merged fills
+
+    Files live under ``month=YYYY-MM/Classification=<class>/`` (each day has
+    a single sentiment class), and ``_manifest.json`` lists every file with
+    its partition, day range and row count. Readers only open the files
+    whose partition and day range can match a query, and only the
+    requested columns.
+
+    Appends never rewrite history: only rows from the store's last day on
+    are written. That last day may have been cut short by the export, so
+    it is always kept in files of its own and replaced when new rows for
+    it arrive.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=STORE_PATH):
+        if pq is None:
+            raise ValueError("The merged store requires pyarrow")
+        self.path = path
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        path = os.path.join(self.path, MANIFEST)
+        if not os.path.exists(path):
+            return {'version': self.VERSION, 'columns': [], 'categories': [], 'sessions': 0, 'files': []}
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != self.VERSION:
+            raise ValueError(f"Unsupported merged store version in {self.path}")
+        return manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, MANIFEST)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        # Readers see either the old or the new file list, never a partial one
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def exists(path=STORE_PATH):
+        return os.path.exists(os.path.join(path, MANIFEST))
+
+    @property
+    def files(self):
+        return self.manifest['files']
+
+    @property
+    def columns(self):
+        return self.manifest['columns'] + ['Classification']
+
+    @property
+    def rows(self):
+        return sum(entry['rows'] for entry in self.files)
+
+    @property
+    def last_day(self):
+        return max((entry['max_day'] for entry in self.files), default=None)
+
+    def schema(self):
+        """Arrow schema shared by every stored file (partition columns excluded)"""
+        if not self.files:
+            return None
+        return pq.read_schema(os.path.join(self.path, self.files[0]['path']))
+
+    def writer(self, rebuild=False):
+        """StoreWriter for one append session; ``rebuild`` replaces all stored data"""
+        return StoreWriter(self, rebuild)
+
+    def append(self, df, rebuild=False):
+        """Append merged fills in one session; returns the StoreWriter with its counts"""
+        with self.writer(rebuild) as writer:
+            writer.write(df)
+        return writer
+
+    def select(self, start=None, end=None, sentiments=None):
+        """Manifest entries of the files that can hold rows of the query"""
+        start = None if start is None else day_of(start)
+        end = None if end is None else day_of(end)
+        if sentiments is not None:
+            sentiments = set(np.atleast_1d(sentiments))
+        return [
+            entry for entry in self.files
+            if (start is None or entry['max_day'] >= start)
+            and (end is None or entry['min_day'] <= end)
+            and (sentiments is None or entry['Classification'] in sentiments)
+        ]
+
+    def read(self, columns=None, start=None, end=None, sentiments=None, accounts=None):
+        """Merged fills matching the filters, with only ``columns``
+
+        ``start`` and ``end`` are inclusive dates (or day numbers),
+        ``sentiments`` and ``accounts`` lists of values. Files that cannot
+        match are skipped using the manifest; day and account filters are
+        pushed down to Parquet row groups. Rows come in partition order
+        (month, class, account) rather than time order.
+        """
+        columns = self.columns if columns is None else list(columns)
+        unknown = [col for col in columns if col not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown merged store columns: {unknown}")
+
+        entries = self.select(start, end, sentiments)
+        if not entries:
+            return self._empty(columns)
+
+        dataset = ds.dataset(
+            [os.path.join(self.path, entry['path']) for entry in entries], format='parquet',
+            schema=self.schema().append(pa.field('Classification', pa.string())),
+            partitioning=ds.partitioning(pa.schema([('Classification', pa.string())]), flavor='hive'),
+            partition_base_dir=self.path
+        )
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field('day') >= day_of(start))
+        if end is not None:
+            conditions.append(ds.field('day') <= day_of(end))
+        if accounts is not None:
+            # An OR of equalities, since ``isin`` isn't checked against statistics
+            matches = [ds.field('account') == str(account) for account in np.atleast_1d(accounts)]
+            conditions.append(functools.reduce(operator.or_, matches))
+        condition = functools.reduce(operator.and_, conditions) if conditions else None
+        return self._restore(dataset.to_table(columns=columns, filter=condition).to_pandas())
+
+    def _empty(self, columns):
+        schema = self.schema()
+        df = schema.empty_table().to_pandas() if schema is not None else pd.DataFrame()
+        return self._restore(df.assign(Classification=pd.Series(dtype='object'))[columns])
+
+    def _restore(self, df):
+        """Categoricals with the same categories as the frames that were stored"""
+        if 'Classification' in df.columns:
+            df['Classification'] = pd.Categorical(df['Classification'], categories=self.manifest['categories'])
+        for col in ('account', 'symbol'):
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        return df
+
+def day_of(value):
+    """Day number of a date, or the value itself if already a day number"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return pd.Timestamp(value).value // NS_PER_DAY
+
+def month_label(day):
+    return f"{pd.Timestamp(int(day) * NS_PER_DAY):%Y-%m}"
+
+class StoreWriter:
+    """One append session of a MergedStore
+
+    ``write`` can be called once per chunk, with days in any order; rows
+    before the store's last day are dropped. Files are written as chunks
+    arrive and only become visible to readers when ``close`` commits them
+    to the manifest. Partitioned runs write files in worker processes with
+    ``write_partitions(df, **writer.target(i))`` and pass the results to
+    ``add``.
+    """
+
+    def __init__(self, store, rebuild=False):
+        self.store = store
+        self.path = store.path
+        self.rebuild = rebuild or not store.files
+        self.session = store.manifest['sessions'] + 1
+        # The last stored day is open: rows for it are written again
+        self.start = None if self.rebuild else store.last_day
+        self.schema = None if self.rebuild else store.schema()
+        self.categories = [] if self.rebuild else list(store.manifest['categories'])
+        self.entries = []
+        self.parts = 0
+        self.appended = 0
+
+    def target(self, part):
+        """Picklable ``write_partitions`` arguments for writer ``part``"""
+        return {'root': self.path, 'tag': f"{self.session:05d}-{part:05d}", 'start': self.start, 'schema': self.schema}
+
+    def write(self, df):
+        if self.schema is not None and not matches_schema(df, self.schema):
+            if self.entries or self.rebuild:
+                raise ValueError("Merged chunks have inconsistent columns")
+            # New columns or dtypes (e.g. after --memory-budget): history can't be appended to
+            print("Merged data columns changed since the store was written; rebuilding it")
+            self.rebuild, self.start, self.schema = True, None, None
+        self.parts += 1
+        self.add(write_partitions(df, **self.target(self.parts)))
+
+    def add(self, written):
+        """Record the files and sentiment categories returned by ``write_partitions``"""
+        entries, schema, categories = written
+        if self.schema is None:
+            # Later chunks are cast to the first one's schema, so all-null chunks line up
+            self.schema = schema
+        self.categories += [c for c in categories if c not in self.categories]
+        self.entries += entries
+
+    def close(self):
+        """Commit the session's files to the manifest"""
+        manifest = self.store.manifest
+        entries = self._split_last_day(self.entries)
+        open_day = self.start
+        open_rows = lambda files: sum(e['rows'] for e in files if e['min_day'] == e['max_day'] == open_day)
+
+        written = sum(e['rows'] for e in entries)
+        if self.rebuild:
+            removed, kept = manifest['files'], []
+            self.appended = written
+        elif entries and all(e['max_day'] == open_day for e in entries) and open_rows(entries) == open_rows(manifest['files']):
+            # Nothing after the open day, which is unchanged: keep the stored files
+            removed, kept, entries = entries, manifest['files'], []
+            self.appended = 0
+        elif any(e['min_day'] == open_day for e in entries):
+            # The open day was rewritten in full; drop its previous files
+            removed = [e for e in manifest['files'] if e['min_day'] == e['max_day'] == open_day]
+            kept = [e for e in manifest['files'] if e not in removed]
+            self.appended = written - open_rows(removed)
+        else:
+            removed, kept = [], manifest['files']
+            self.appended = written
+
+        if entries or self.rebuild:
+            manifest.update(
+                columns=list(self.schema.names) if self.schema is not None else [],
+                categories=self.categories, sessions=self.session,
+                files=sorted(kept + entries, key=lambda e: (e['month'], e['Classification'] or '', e['path']))
+            )
+            self.store._save_manifest()
+        for entry in removed:
+            os.remove(os.path.join(self.path, entry['path']))
+        if self.rebuild:
+            self._remove_unlisted()
+
+    def _split_last_day(self, entries):
+        """Move the session's last day out of files that also hold earlier days"""
+        if not entries:
+            return entries
+        last = max(entry['max_day'] for entry in entries)
+        result = []
+        for entry in entries:
+            if entry['min_day'] == entry['max_day'] or entry['max_day'] != last:
+                result.append(entry)
+                continue
+            path = os.path.join(self.path, entry['path'])
+            table = pq.read_table(path)
+            is_last = table['day'].to_numpy() == last
+            os.remove(path)
+            for suffix, mask in (('a', ~is_last), ('b', is_last)):
+                rows = table.filter(pa.array(mask))
+                days = rows['day'].to_numpy()
+                part = dict(entry, path=entry['path'].replace('.parquet', f"{suffix}.parquet"),
+                            min_day=int(days.min()), max_day=int(days.max()), rows=rows.num_rows)
+                pq.write_table(rows, os.path.join(self.path, part['path']), row_group_size=ROW_GROUP_SIZE)
+                result.append(part)
+        return result
+
+    def _remove_unlisted(self):
+        """Delete Parquet files the manifest doesn't list, e.g. left by a failed session"""
+        listed = {os.path.normpath(entry['path']) for entry in self.store.files}
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                path = os.path.relpath(os.path.join(directory, name), self.path)
+                if name.endswith('.parquet') and os.path.normpath(path) not in listed:
+                    os.remove(os.path.join(self.path, path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # A failed session leaves the manifest, and so the store, unchanged
+        if exc_type is None:
+            self.close()
+
+def canonical_type(arrow_type):
+    """Storage type of a column: dictionaries as their values, floats as float64"""
+    if pa.types.is_dictionary(arrow_type):
+        return canonical_type(arrow_type.value_type)
+    if pa.types.is_floating(arrow_type):
+        return pa.float64()
+    return arrow_type
+
+def canonical_table(frame, schema=None):
+    """Arrow table of ``frame`` in the store's canonical types
+
+    Compact frames (``--memory-budget``) get their derived columns back and
+    categoricals and float32 columns widened, so toggling the budget
+    writes the same schema instead of forcing a rebuild. Categoricals are
+    stored as plain strings either way, which also lets Arrow prune row
+    groups by account (it doesn't for dictionary-typed columns). With
+    ``schema``, columns are ordered and cast to it.
+    """
+    table = pa.Table.from_pandas(with_derived(frame, list(DERIVED_COLUMNS)), preserve_index=False)
+    if schema is not None:
+        return table.select(schema.names).cast(schema)
+    fields = [pa.field(field.name, canonical_type(field.type)) for field in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+def matches_schema(df, schema):
+    """Whether ``df`` (without Classification) has the columns of ``schema``, in the same canonical types"""
+    fields = canonical_table(df.head(0).drop(columns=['Classification'], errors='ignore')).schema
+    types = {field.name: canonical_type(field.type) for field in schema}
+    if sorted(fields.names) != sorted(types):
+        return False
+    # Empty object columns have no inferred type yet; they cast to any
+    return all(pa.types.is_null(field.type) or field.type == types[field.name] for field in fields)
+
+def write_partitions(df, root, tag, start=None, schema=None):
+    """Write the rows of merged fills ``df`` from day ``start`` on into partition files
+
+    Rows are grouped by month and sentiment class and sorted by account
+    within each file, keeping their order otherwise. Returns the manifest
+    entries of the files written, the Arrow schema and the sentiment
+    categories. Runs in worker processes for partitioned input.
+    """
+    if schema is not None and not matches_schema(df, schema):
+        raise ValueError("Merged data columns differ from the merged store; rebuild it with --rebuild-store")
+    if 'Classification' in df.columns:
+        sentiment = pd.Categorical(df['Classification'])
+    else:
+        sentiment = pd.Categorical(np.full(len(df), np.nan))
+    categories = [str(c) for c in sentiment.categories]
+    frame = df.drop(columns=['Classification'], errors='ignore')
+    if start is not None:
+        keep = df['day'].to_numpy() >= start
+        frame, sentiment = frame[keep], sentiment[keep]
+    table = canonical_table(frame, schema)
+    if not len(frame):
+        return [], table.schema, categories
+
+    day = frame['day'].to_numpy(dtype='int64')
+    month = (day * NS_PER_DAY).astype('datetime64[ns]').astype('datetime64[M]').astype('int64')
+    account = frame['account'].astype('category').cat.codes.to_numpy() if 'account' in frame.columns else day * 0
+    order = np.lexsort((account, sentiment.codes, month))
+    key = month[order] * (len(categories) + 1) + sentiment.codes[order]
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1, [len(order)]))
+    table = table.take(pa.array(order))
+
+    entries = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        code = sentiment.codes[order[lo]]
+        label = None if code < 0 else categories[code]
+        days = day[order[lo:hi]]
+        directory = os.path.join(
+            f"month={month_label(days[0])}",
+            f"Classification={NULL_PARTITION if label is None else quote(label, safe='')}"
+        )
+        path = os.path.join(directory, f"part-{tag}-{len(entries):04d}.parquet")
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        pq.write_table(table.slice(lo, hi - lo), os.path.join(root, path), row_group_size=ROW_GROUP_SIZE)
+        entries.append({
+            'path': path, 'month': month_label(days[0]), 'Classification': label,
+            'min_day': int(days.min()), 'max_day': int(days.max()), 'rows': int(hi - lo)
+        })
+    return entries, table.schema, categories
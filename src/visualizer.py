@@ -1,104 +1,378 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+import numpy as np
 import pandas as pd
 import os
+import json
+import hashlib
+import inspect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-class DataVisualizer:
-    def __init__(self):
+try:
+    from src.instrumentation import traced, peak_rss, record_worker_peak
+except ImportError:
+    # Notebooks put src/ itself on sys.path
+    from instrumentation import traced, peak_rss, record_worker_peak
+
+# Per-plot hashes of the last rendered inputs, kept next to the PNGs
+PLOT_MANIFEST = '.plot_hashes.json'
+KDE_GRID = 512
+# Above this many traders the cluster plot is drawn as a density image
+DENSITY_THRESHOLD = 50_000
+DENSITY_BINS = (400, 300)
+# Density plots cover this central quantile range, so a few extreme
+# accounts don't squeeze everyone else into a handful of pixels
+DENSITY_QUANTILES = (0.001, 0.999)
+
+_plotting = None
+
+def plotting():
+    """``matplotlib.pyplot`` and ``seaborn``, imported and styled on first use
+
+    Importing them takes longer than loading and aggregating a small
+    export, so nothing imports them until a figure is drawn. Every
+    ``render_*`` calls this, which also styles worker processes.
+    """
+    global _plotting
+    if _plotting is None:
+        import matplotlib
+        # Render to files only; no display needed, and safe in worker processes
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         # Updated style setting for newer Seaborn versions
         try:
             sns.set_theme(style='whitegrid')
         except:
             plt.style.use('ggplot')
-        self.output_dir = 'data/outputs'
+        _plotting = plt, sns
+    return _plotting
+
+def binned_kde(values, grid_size=KDE_GRID):
+    """Gaussian KDE evaluated from a fine histogram instead of the raw points
+
+    Values are binned once onto ``grid_size`` grid points, then the counts
+    are convolved with the kernel sampled on the same grid, so the cost no
+    longer grows with the number of points times grid size. Uses Scott's
+    bandwidth like seaborn's default. Returns grid points and density over
+    the data range, or None when the values have no spread.
+    """
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    if len(values) < 2 or values.std() == 0:
+        return None
+
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5)
+    centers, step = np.linspace(values.min() - 3 * bandwidth, values.max() + 3 * bandwidth, grid_size, retstep=True)
+    # Linear binning: split each point between its two nearest grid points,
+    # which keeps lattice data (e.g. trade counts) from aliasing into ripples
+    position = (values - centers[0]) / step
+    left = np.minimum(np.floor(position).astype('int64'), grid_size - 2)
+    right_share = position - left
+    counts = (np.bincount(left, 1 - right_share, minlength=grid_size)
+              + np.bincount(left + 1, right_share, minlength=grid_size))
+
+    half_width = min(int(np.ceil(4 * bandwidth / step)), grid_size - 1)
+    offsets = np.arange(-half_width, half_width + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    density = np.convolve(counts, kernel, mode='same') / len(values)
+
+    # Like seaborn's histplot KDE, only draw it over the observed range
+    inside = (centers >= values.min()) & (centers <= values.max())
+    return centers[inside], density[inside]
+
+def hist_with_kde(ax, values, bins):
+    """Count histogram with a binned KDE scaled to the same counts"""
+    values = pd.Series(values).dropna().to_numpy(dtype='float64')
+    counts, edges = np.histogram(values, bins=bins)
+    ax.stairs(counts, edges, fill=True, color='C0', alpha=0.5)
+    kde = binned_kde(values)
+    if kde is not None:
+        grid, density = kde
+        ax.plot(grid, density * len(values) * (edges[1] - edges[0]), color='C0')
+    ax.set_ylabel('Count')
+
+def render_sentiment_distribution(counts, path):
+    plt, sns = plotting()
+    plt.figure(figsize=(10, 6))
+    counts.plot(kind='bar', color=sns.color_palette("viridis"))
+    plt.title('Market Sentiment Distribution')
+    plt.xlabel('Sentiment Class')
+    plt.ylabel('Count')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+def render_trader_performance(metrics, path):
+    plt, _ = plotting()
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+
+    for ax, (col, bins, title) in zip(axes, [
+        ('total_pnl', 50, 'Profit Distribution'),
+        ('win_rate', 20, 'Win Rate Distribution'),
+        ('trade_count', 50, 'Trade Count Distribution')
+    ]):
+        hist_with_kde(ax, metrics[col], bins)
+        ax.set_xlabel(col)
+        ax.set_title(title)
+
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close(fig)
+
+def render_correlation_heatmap(corr, path):
+    plt, sns = plotting()
+    plt.figure(figsize=(12, 8))
+    sns.heatmap(corr, annot=True, fmt=".2f", cmap='coolwarm', center=0)
+    plt.title('Feature Correlation Heatmap')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+def render_cluster_analysis(metrics, path):
+    plt, sns = plotting()
+    plt.figure(figsize=(10, 6))
+    sns.scatterplot(
+        data=metrics,
+        x='total_pnl',
+        y='win_rate',
+        hue='cluster',
+        palette='viridis',
+        size='trade_count',
+        sizes=(20, 200),
+        alpha=0.7
+    )
+    plt.title('Trader Clusters by Performance')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+def density_grid(x, y, groups, n_groups, bins=DENSITY_BINS, ranges=None):
+    """Point counts per group on a 2-D grid, shape (n_groups, y bins, x bins)
+
+    One ``bincount`` over flattened (group, y, x) cell ids; points outside
+    ``ranges`` ((x_min, x_max), (y_min, y_max); default: data range) are
+    dropped.
+    """
+    n_x, n_y = bins
+    (x_min, x_max), (y_min, y_max) = ranges or ((np.nanmin(x), np.nanmax(x)), (np.nanmin(y), np.nanmax(y)))
+    # Scale to [0, bins]; the top edge belongs to the last cell
+    fx = (x - x_min) / ((x_max - x_min) or 1) * n_x
+    fy = (y - y_min) / ((y_max - y_min) or 1) * n_y
+    inside = (fx >= 0) & (fx <= n_x) & (fy >= 0) & (fy <= n_y)
+    ix = np.minimum(fx[inside].astype('int64'), n_x - 1)
+    iy = np.minimum(fy[inside].astype('int64'), n_y - 1)
+    cells = (groups[inside] * n_y + iy) * n_x + ix
+    return np.bincount(cells, minlength=n_groups * n_y * n_x).reshape(n_groups, n_y, n_x)
+
+def rasterize(counts, colors):
+    """RGBA image from per-group counts: count-weighted mix of group colors,
+    opacity by log density"""
+    total = counts.sum(axis=0)
+    rgb = np.tensordot(counts, np.asarray(colors)[:, :3], axes=(0, 0)) / np.maximum(total, 1)[..., None]
+    alpha = np.log1p(total) / max(np.log1p(total.max()), 1e-12)
+    return np.dstack((rgb, alpha))
+
+def render_cluster_density(metrics, path):
+    plt, sns = plotting()
+    from matplotlib.patches import Patch
+    x = metrics['total_pnl'].to_numpy(dtype='float64')
+    y = metrics['win_rate'].to_numpy(dtype='float64')
+    labels, groups = np.unique(metrics['cluster'].to_numpy(), return_inverse=True)
+    ranges = tuple(tuple(np.nanquantile(v, DENSITY_QUANTILES)) for v in (x, y))
+    counts = density_grid(x, y, groups, len(labels), DENSITY_BINS, ranges)
+    colors = sns.color_palette('viridis', len(labels))
+
+    plt.figure(figsize=(10, 6))
+    plt.imshow(rasterize(counts, colors), origin='lower', aspect='auto', interpolation='nearest',
+               extent=(*ranges[0], *ranges[1]))
+    handles = [Patch(color=color, label=str(label)) for label, color in zip(labels, colors)]
+    plt.legend(handles=handles, title='cluster')
+    plt.grid(False)
+    low, high = (f"{q * 100:g}" for q in DENSITY_QUANTILES)
+    plt.xlabel(f"total_pnl ({low}-{high}th percentile)")
+    plt.ylabel('win_rate')
+    plt.title(f"Trader Clusters by Performance ({len(metrics):,} traders, density)")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+def render_code(render):
+    """Source of ``render`` and of every module function and constant it uses
+
+    Helpers are followed through the names their code (and nested code,
+    such as comprehensions) refers to, so editing e.g. ``binned_kde`` or
+    ``KDE_GRID`` changes the hash of every plot drawn with it.
+    """
+    sources, pending = {}, [render]
+    while pending:
+        func = pending.pop()
+        if func.__name__ in sources:
+            continue
+        # Defaults are evaluated once, so constants used as defaults count by value
+        sources[func.__name__] = f"{inspect.getsource(func)}{func.__defaults__!r}"
+        codes = [func.__code__]
+        while codes:
+            code = codes.pop()
+            codes.extend(const for const in code.co_consts if inspect.iscode(const))
+            for name in code.co_names:
+                value = globals().get(name)
+                if inspect.isfunction(value) and value.__module__ == __name__:
+                    pending.append(value)
+                elif isinstance(value, (int, float, str, tuple)) and name not in sources:
+                    sources[name] = repr(value)
+    return '\n'.join(f"{name}: {source}" for name, source in sorted(sources.items()))
+
+def plot_hash(render, data):
+    """Content hash of a plot's input data and the code that draws it"""
+    digest = hashlib.sha1(render_code(render).encode())
+    labels = list(data.columns) if isinstance(data, pd.DataFrame) else data.name
+    digest.update(repr((list(data.index.names), labels)).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def render_job(render, data, path):
+    """Worker entry point: draw one figure to ``path``; returns the worker's peak RSS"""
+    render(data, path)
+    return peak_rss()
+
+class DataVisualizer:
+    """Builds the plot inputs; figures are drawn by the module-level ``render_*`` functions
+
+    A figure is only redrawn when the hash of its input data or drawing code
+    differs from the last render, and pending figures are drawn
+    concurrently on a process pool of up to ``workers`` processes. Above
+    ``density_threshold`` traders, the cluster scatter becomes a binned
+    density image whose cost hardly depends on the trader count.
+    """
+
+    def __init__(self, output_dir='data/outputs', workers=None, density_threshold=DENSITY_THRESHOLD):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.density_threshold = density_threshold
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def plot_sentiment_distribution(self, data):
-        """Plot distribution of sentiment classifications"""
-        if 'Classification' not in data.columns:
+    def _sentiment_distribution_job(self, data):
+        if isinstance(data, pd.Series):
+            counts = data
+        elif data is not None and 'Classification' in data.columns:
+            counts = data['Classification'].value_counts()
+            counts = counts[counts > 0]
+        else:
             print("No sentiment data available for visualization")
-            return
-        
-        plt.figure(figsize=(10, 6))
-        data['Classification'].value_counts().plot(kind='bar', color=sns.color_palette("viridis"))
-        plt.title('Market Sentiment Distribution')
-        plt.xlabel('Sentiment Class')
-        plt.ylabel('Count')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(f'{self.output_dir}/sentiment_distribution.png')
-        plt.close()
+            return None
+        return render_sentiment_distribution, counts, 'sentiment_distribution.png'
 
-    def plot_trader_performance(self, metrics):
-        """Visualize trader performance metrics"""
+    def _trader_performance_job(self, metrics):
         required_cols = ['total_pnl', 'win_rate', 'trade_count']
         if not all(col in metrics.columns for col in required_cols):
             print("Missing required columns for trader performance plot")
-            return
-        
-        fig, axes = plt.subplots(1, 3, figsize=(18, 5))
-        
-        sns.histplot(data=metrics, x='total_pnl', ax=axes[0], bins=50, kde=True)
-        axes[0].set_title('Profit Distribution')
-        
-        sns.histplot(data=metrics, x='win_rate', ax=axes[1], bins=20, kde=True)
-        axes[1].set_title('Win Rate Distribution')
-        
-        sns.histplot(data=metrics, x='trade_count', ax=axes[2], bins=50, kde=True)
-        axes[2].set_title('Trade Count Distribution')
-        
-        plt.tight_layout()
-        plt.savefig(f'{self.output_dir}/trader_performance.png')
-        plt.close()
-
-    def plot_correlation_heatmap(self, data):
-        """Generate correlation heatmap"""
-        numeric_cols = data.select_dtypes(include=['float64', 'int64']).columns
-        if len(numeric_cols) < 2:
+            return None
+        return render_trader_performance, metrics[required_cols], 'trader_performance.png'
+
+    def _correlation_heatmap_job(self, corr):
+        if corr is None or len(corr.columns) < 2:
             print("Not enough numeric columns for correlation")
-            return
-        
-        plt.figure(figsize=(12, 8))
-        corr = data[numeric_cols].corr()
-        sns.heatmap(corr, annot=True, fmt=".2f", cmap='coolwarm', center=0)
-        plt.title('Feature Correlation Heatmap')
-        plt.tight_layout()
-        plt.savefig(f'{self.output_dir}/correlation_heatmap.png')
-        plt.close()
+            return None
+        return render_correlation_heatmap, corr, 'correlation_heatmap.png'
 
-    def plot_cluster_analysis(self, metrics):
-        """Visualize trader clusters if available"""
+    def _cluster_analysis_job(self, metrics):
         if 'cluster' not in metrics.columns:
             print("No cluster data available")
-            return
-        
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(
-            data=metrics,
-            x='total_pnl',
-            y='win_rate',
-            hue='cluster',
-            palette='viridis',
-            size='trade_count',
-            sizes=(20, 200),
-            alpha=0.7
-        )
-        plt.title('Trader Clusters by Performance')
-        plt.tight_layout()
-        plt.savefig(f'{self.output_dir}/cluster_analysis.png')
-        plt.close()
-
-    def generate_all_visualizations(self, merged_data, trader_metrics, correlation_matrix=None):
+            return None
+        render = render_cluster_density if len(metrics) > self.density_threshold else render_cluster_analysis
+        return render, metrics[['total_pnl', 'win_rate', 'trade_count', 'cluster']], 'cluster_analysis.png'
+
+    @traced
+    def plot_sentiment_distribution(self, data):
+        """Plot distribution of sentiment classifications
+
+        Accepts the merged frame or precomputed per-class counts (streaming runs).
+        """
+        return self.render([self._sentiment_distribution_job(data)])
+
+    @traced
+    def plot_trader_performance(self, metrics):
+        """Visualize trader performance metrics"""
+        return self.render([self._trader_performance_job(metrics)])
+
+    @traced
+    def plot_correlation_heatmap(self, corr):
+        """Generate correlation heatmap from a precomputed correlation matrix"""
+        return self.render([self._correlation_heatmap_job(corr)])
+
+    @traced
+    def plot_cluster_analysis(self, metrics):
+        """Visualize trader clusters if available"""
+        return self.render([self._cluster_analysis_job(metrics)])
+
+    @traced
+    def render(self, jobs):
+        """Draw the figures whose inputs changed since their last render
+
+        ``jobs`` are (render function, data, file name) tuples; None entries
+        (plots without usable input) are ignored. Returns False if any
+        figure failed to draw.
+        """
+        manifest_path = os.path.join(self.output_dir, PLOT_MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+        pending = []
+        for render, data, name in filter(None, jobs):
+            path = os.path.join(self.output_dir, name)
+            digest = plot_hash(render, data)
+            if manifest.get(name) == digest and os.path.exists(path):
+                print(f"  {name} unchanged; skipped")
+            else:
+                pending.append((render, data, path, name, digest))
+
+        workers = min(len(pending), self.workers or os.cpu_count() or 1)
+        success = True
+        if workers > 1:
+            # Pipeline stages call this from threads, and forking a process
+            # while other threads hold locks can deadlock the child
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+                futures = [pool.submit(render_job, render, data, path) for render, data, path, _, _ in pending]
+                results = [(future.exception(), job) for future, job in zip(futures, pending)]
+            for future in futures:
+                if future.exception() is None:
+                    record_worker_peak(future.result())
+        else:
+            results = []
+            for job in pending:
+                try:
+                    render_job(*job[:3])
+                    results.append((None, job))
+                except Exception as e:
+                    results.append((e, job))
+
+        for error, (_, _, _, name, digest) in results:
+            if error is None:
+                manifest[name] = digest
+            else:
+                print(f"Failed to render {name}: {error}")
+                manifest.pop(name, None)
+                success = False
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return success
+
+    @traced
+    def generate_all_visualizations(self, merged_data, trader_metrics, correlation_matrix=None, sentiment_counts=None):
         """Generate all visualizations"""
         try:
-            self.plot_sentiment_distribution(merged_data)
-            self.plot_trader_performance(trader_metrics)
-            
+            jobs = [
+                self._sentiment_distribution_job(merged_data if merged_data is not None else sentiment_counts),
+                self._trader_performance_job(trader_metrics)
+            ]
             if correlation_matrix is not None:
-                self.plot_correlation_heatmap(correlation_matrix)
-            
-            self.plot_cluster_analysis(trader_metrics)
-            return True
+                jobs.append(self._correlation_heatmap_job(correlation_matrix))
+            jobs.append(self._cluster_analysis_job(trader_metrics))
+            return self.render(jobs)
         except Exception as e:
             print(f"Visualization error: {str(e)}")
-            return False
\ No newline at end of file
+            return False